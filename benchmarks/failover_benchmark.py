@@ -0,0 +1,177 @@
+"""
+Fault-injection benchmark of leader failure detection and failover.
+
+Starts --brokers brokers on loopback ports (no Docker) and injects faults
+into the elected leader while polling every live broker's /get_leader:
+    pause   freezes the leader with SIGSTOP for each of --pauses seconds, like a
+            GC pause, then resumes it; reports whether any follower suspected
+            the leader and whether the leader or term changed (an election).
+            Short pauses must do neither; a leader that resumes while the
+            election is still asking it keeps its role
+    kill    kills the leader with SIGKILL, --kills times on a fresh cluster each;
+            reports the time until the first broker suspects it (detection)
+            and until all live brokers agree on a new live leader (failover)
+
+Detection settings are passed through the environment, e.g.
+HEARTBEAT_INTERVAL=0.1 PHI_THRESHOLD=8 PHI_ACCEPTABLE_PAUSE=0.3.
+
+Results are printed (or written with --output) as JSON. The run fails (exit
+status 1, with the violations on stderr) if a kill is detected later than
+--max-detection-ms or failed over later than --max-failover-ms, or if a pause
+of at most --max-quiet-pause seconds made a follower suspect the leader or
+caused an election.
+
+Usage (from the repository root):
+    python benchmarks/failover_benchmark.py [--brokers 3] [--pauses 0.1 0.2 0.3 0.5 1.0 5.0]
+        [--kills 3] [--scenarios pause kill] [--max-detection-ms 1000] [--max-failover-ms 2000]
+        [--max-quiet-pause 0.3] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import requests
+
+from cluster import LocalCluster
+
+DETECTION_SETTINGS = ["HEARTBEAT_INTERVAL", "PHI_THRESHOLD", "PHI_ACCEPTABLE_PAUSE", "PHI_MIN_STD",
+                      "ELECTION_MESSAGE_TIMEOUT", "ELECTION_ANNOUNCE_WAIT"]
+
+
+def leader_views(cluster, exclude=()):
+    """
+    Returns:
+        dict: broker ID -> (leader ID, term) reported by every live broker that answered.
+    """
+    views = {}
+    for broker_id, url in cluster.urls.items():
+        if broker_id in cluster.processes and broker_id not in exclude:
+            try:
+                data = requests.get(f"{url}/get_leader", timeout=0.5).json()
+                views[broker_id] = (data.get("leader_id"), data.get("term"))
+            except (requests.RequestException, ValueError):
+                pass
+    return views
+
+
+def wait_for_heartbeats(cluster, leader, timeout=10.0):
+    """
+    Waits until every follower has accepted the leader and its term.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        views = leader_views(cluster)
+        if len(views) == len(cluster.processes) and len(set(views.values())) == 1 and \
+                next(iter(views.values()))[0] == leader:
+            return next(iter(views.values()))[1]
+        time.sleep(0.1)
+    raise TimeoutError(f"Brokers do not agree on leader {leader}: {leader_views(cluster)}")
+
+
+def run_pauses(args, env):
+    results = []
+    with LocalCluster(args.brokers, base_port=args.base_port, env=env) as cluster:
+        leader = cluster.leader()
+        term = wait_for_heartbeats(cluster, leader)
+        for pause in args.pauses:
+            suspected = False
+            cluster.pause(leader)
+            resume_at = time.monotonic() + pause
+            while time.monotonic() < resume_at:
+                suspected |= any(view[0] != leader for view in leader_views(cluster, exclude=[leader]).values())
+                time.sleep(0.02)
+            cluster.resume(leader)
+            settle_until = time.monotonic() + args.settle
+            while time.monotonic() < settle_until:
+                suspected |= any(view[0] != leader for view in leader_views(cluster, exclude=[leader]).values())
+                time.sleep(0.05)
+            views = leader_views(cluster)
+            election = any(view != (leader, term) for view in views.values())
+            results.append({"pause_s": pause, "suspected": suspected, "election": election,
+                            "views": {str(b): v for b, v in views.items()}})
+            if election:
+                # The pause outlasted the detector; continue from the new leader
+                leader = cluster.leader()
+                term = wait_for_heartbeats(cluster, leader)
+    return results
+
+
+def run_kill(args, env, trial):
+    with LocalCluster(args.brokers, base_port=args.base_port + 20 * (trial + 1), env=env) as cluster:
+        leader = cluster.leader()
+        wait_for_heartbeats(cluster, leader)
+        time.sleep(1)                           # Let the detectors learn the heartbeat interval
+        killed_at = time.monotonic()
+        cluster.kill(leader)
+
+        detected = failover = None
+        deadline = killed_at + 30
+        while time.monotonic() < deadline and failover is None:
+            views = leader_views(cluster)
+            now = time.monotonic() - killed_at
+            leaders = {leader_id for leader_id, _ in views.values()}
+            if detected is None and any(leader_id != leader for leader_id in leaders):
+                detected = now
+            if len(views) == len(cluster.processes) and len(leaders) == 1 and leaders <= set(cluster.processes):
+                failover = now
+            time.sleep(0.02)
+        return {
+            "killed_broker": leader,
+            "new_leader": next(iter(leaders)) if failover is not None else None,
+            "detection_ms": round(detected * 1000) if detected is not None else None,
+            "failover_ms": round(failover * 1000) if failover is not None else None,
+        }
+
+
+def check(report, args):
+    """
+    Returns:
+        list: Descriptions of every result that misses its target.
+    """
+    failures = []
+    for result in report.get("pause", []):
+        if result["pause_s"] <= args.max_quiet_pause and (result["suspected"] or result["election"]):
+            failures.append(f"A {result['pause_s']}s pause was suspected (election: {result['election']})")
+    for result in report.get("kill", []):
+        for name, limit in (("detection_ms", args.max_detection_ms), ("failover_ms", args.max_failover_ms)):
+            if result[name] is None or result[name] > limit:
+                failures.append(f"Kill of broker {result['killed_broker']}: {name} {result[name]} over {limit}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--brokers", type=int, default=3)
+    parser.add_argument("--pauses", type=float, nargs="+", default=[0.1, 0.2, 0.3, 0.5, 1.0, 5.0],
+                        help="Leader pause lengths in seconds")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to watch for an election after a pause")
+    parser.add_argument("--kills", type=int, default=3)
+    parser.add_argument("--scenarios", nargs="+", default=["pause", "kill"], choices=["pause", "kill"])
+    parser.add_argument("--server-mode", default="threaded", choices=["threaded", "asgi"])
+    parser.add_argument("--base-port", type=int, default=5800)
+    parser.add_argument("--max-detection-ms", type=float, default=1000, help="Target time to suspect a killed leader")
+    parser.add_argument("--max-failover-ms", type=float, default=2000, help="Target time to agree on a new leader")
+    parser.add_argument("--max-quiet-pause", type=float, default=0.3,
+                        help="Pauses up to this many seconds must not be suspected")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    env = {"SERVER_MODE": args.server_mode, "CONSOLE_LOG_LEVEL": "warning"}
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "detection": {name: os.environ[name] for name in DETECTION_SETTINGS if name in os.environ},
+    }
+    if "pause" in args.scenarios:
+        report["pause"] = run_pauses(args, env)
+    if "kill" in args.scenarios:
+        report["kill"] = [run_kill(args, env, trial) for trial in range(args.kills)]
+    report["failures"] = check(report, args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["failures"]:
+        print("\n".join(["❌ Failover targets missed:"] + report["failures"]), file=sys.stderr)
+        sys.exit(1)
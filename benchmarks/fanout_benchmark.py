@@ -0,0 +1,60 @@
+"""
+Micro-benchmark: cost of fanning one message out to N SSE client queues.
+
+Compares the previous per-client `jsonify(message).get_data()` encoding with
+the encode-once shared frame used by the broker dispatcher.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/fanout_benchmark.py
+"""
+import queue
+import timeit
+
+from flask import Flask, jsonify
+
+from utils.fanout import encode_sse_frame, fan_out
+
+CLIENT_COUNTS = [10, 100, 1000]
+REPEAT = 5
+
+MESSAGE = {
+    "topic": "air_quality",
+    "data": {
+        "pm2_5": 41.7,
+        "pm10": 88.2,
+        "carbon_monoxide": 0.62,
+        "location": "Downtown",
+        "timestamp": 1718000000.0,
+        "lamport_ts": 42,
+    },
+    "priority": 0,
+}
+
+app = Flask(__name__)
+
+
+def per_client_encode(message, client_queues):
+    """Previous behaviour: one Flask Response per subscriber."""
+    with app.app_context():
+        for q in client_queues:
+            q.put(f"data: {jsonify(message).get_data(as_text=True)}\n\n")
+
+
+def encode_once(message, client_queues):
+    """Current behaviour: one shared frame for all subscribers."""
+    fan_out(encode_sse_frame(message), client_queues)
+
+
+def bench(fn, clients):
+    queues = [queue.SimpleQueue() for _ in range(clients)]
+    number = max(1, 2000 // clients)
+    best = min(timeit.repeat(lambda: fn(MESSAGE, queues), number=number, repeat=REPEAT))
+    return best / number * 1e6  # microseconds per message
+
+
+if __name__ == "__main__":
+    print(f"{'clients':>8} {'per-client µs':>15} {'encode-once µs':>15} {'speedup':>8}")
+    for clients in CLIENT_COUNTS:
+        old = bench(per_client_encode, clients)
+        new = bench(encode_once, clients)
+        print(f"{clients:>8} {old:>15.1f} {new:>15.1f} {old / new:>7.1f}x")
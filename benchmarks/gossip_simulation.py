@@ -0,0 +1,208 @@
+"""
+Simulation of subscriber gossip: rounds until every broker has the same view.
+
+Runs --brokers brokers in one process, each with the real SubscriberGossip
+replica, and replaces HTTP with direct calls (messages still go through a JSON
+round-trip, so byte counts match the wire). Every round each broker exchanges
+push-pull messages with --fanout peers picked at random, in random order, and
+each request or reply is lost with probability --drop. With --anti-entropy N,
+every Nth round each broker also compares Merkle digests with a random peer.
+
+Each trial starts from a settled cluster where every broker has --subscribers
+subscribers. Per scenario and cluster size, reports rounds to convergence
+(mean, p95, max over --trials) and gossip bytes sent per broker per round:
+    single   one broker gets one new subscriber
+    churn    every broker gets --churn random subscribes/unsubscribes at once
+
+Results are printed (or written with --output) as JSON. The run fails (exit
+status 1, with the misses on stderr) if any trial has not converged after
+--max-rounds rounds.
+
+Usage (from the repository root):
+    python benchmarks/gossip_simulation.py [--brokers 3 10 50] [--fanout 3] [--drop 0.1]
+        [--trials 10] [--subscribers 10] [--churn 5] [--anti-entropy 0] [--max-rounds 50]
+        [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gossip import SubscriberGossip  # noqa: E402
+
+TOPICS = ["traffic", "air_quality", "weather"]
+
+
+def wire(message):
+    encoded = json.dumps(message)
+    return json.loads(encoded), len(encoded)
+
+
+class SimulatedCluster:
+    def __init__(self, size, fanout, drop, rng):
+        self.names = [f"broker{i}:5000" for i in range(1, size + 1)]
+        self.nodes = {name: SubscriberGossip(i) for i, name in enumerate(self.names, 1)}
+        self.fanout = fanout
+        self.drop = drop
+        self.rng = rng
+
+    def exchange(self, src, dst, drop=None):
+        """
+        One push-pull exchange, as start_gossip_thread and /gossip perform it.
+
+        Returns:
+            int: Bytes sent in both directions.
+        """
+        drop = self.drop if drop is None else drop
+        payload = self.nodes[src].payload_for(dst)
+        payload["from"] = src
+        payload, sent = wire(payload)
+        if self.rng.random() < drop:
+            return sent                             # Request lost
+        reply, received = wire(self.nodes[dst].receive(payload, src))
+        if self.rng.random() < drop:
+            return sent + received                  # Reply lost
+        self.nodes[src].receive_reply(dst, payload, reply)
+        return sent + received
+
+    def anti_entropy(self, src, dst):
+        """
+        One anti-entropy exchange, as start_anti_entropy_thread and /gossip/digest
+        and /gossip/reconcile perform it.
+
+        Returns:
+            int: Bytes sent in both directions.
+        """
+        request, total = wire({"from": src, "buckets": self.nodes[src].digest_buckets()})
+        reply, size = wire({"leaves": self.nodes[dst].compare_buckets(request["buckets"])})
+        total += size
+        topics = sorted(self.nodes[src].differing_topics(reply["leaves"]))
+        if topics:
+            request, size = wire({"from": src, "topics": topics, "state": self.nodes[src].topic_state(topics)})
+            self.nodes[dst].reconcile(topics, request["state"])
+            reply, more = wire({"state": self.nodes[dst].topic_state(topics)})
+            self.nodes[src].reconcile(topics, reply["state"])
+            total += size + more
+        return total
+
+    def round(self, anti_entropy=False):
+        total = 0
+        order = list(self.names)
+        self.rng.shuffle(order)
+        for src in order:
+            peers = [name for name in self.names if name != src]
+            for dst in self.rng.sample(peers, min(self.fanout, len(peers))):
+                total += self.exchange(src, dst)
+            if anti_entropy:
+                total += self.anti_entropy(src, self.rng.choice(peers))
+        return total
+
+    def settle(self):
+        """
+        Lets every pair exchange twice without loss, as a long-running cluster
+        would have: every broker knows every peer and the delta buffers are empty.
+        """
+        for _ in range(2):
+            for src in self.names:
+                for dst in self.names:
+                    if src != dst:
+                        self.exchange(src, dst, drop=0)
+
+    def converged(self):
+        views = [node.snapshot() for node in self.nodes.values()]
+        return all(view == views[0] for view in views[1:])
+
+    def random_change(self, node):
+        topic = self.rng.choice(TOPICS)
+        client = f"10.0.{self.rng.randint(0, 3)}.{self.rng.randint(1, 50)}"
+        if self.rng.random() < 0.6:
+            node.add(topic, client)
+        else:
+            node.remove(topic, client)
+
+
+def run_trial(size, scenario, args, rng):
+    """
+    Returns:
+        tuple: (rounds to convergence, bytes per broker per round); the rounds
+        are None if the cluster has not converged after args.max_rounds
+    """
+    cluster = SimulatedCluster(size, args.fanout, args.drop, rng)
+
+    # Warm up: give every broker some subscribers and let the cluster settle
+    for node in cluster.nodes.values():
+        for _ in range(args.subscribers):
+            node.add(rng.choice(TOPICS), f"10.1.{rng.randint(0, 255)}.{rng.randint(1, 254)}")
+    cluster.settle()
+
+    if scenario == "single":
+        rng.choice(list(cluster.nodes.values())).add("traffic", "192.168.0.1")
+    else:
+        for node in cluster.nodes.values():
+            for _ in range(args.churn):
+                cluster.random_change(node)
+
+    rounds, sent = 0, 0
+    while not cluster.converged() and rounds < args.max_rounds:
+        rounds += 1
+        sent += cluster.round(anti_entropy=args.anti_entropy > 0 and rounds % args.anti_entropy == 0)
+    return rounds if cluster.converged() else None, sent / (size * max(rounds, 1))
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "mean": round(sum(values) / len(values), 2),
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--brokers", type=int, nargs="+", default=[3, 10, 50])
+    parser.add_argument("--fanout", type=int, default=3, help="Peers contacted per broker per round")
+    parser.add_argument("--drop", type=float, default=0.1, help="Probability that a request or reply is lost")
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--subscribers", type=int, default=10, help="Subscribers per broker before the change")
+    parser.add_argument("--churn", type=int, default=5, help="Changes per broker in the churn scenario")
+    parser.add_argument("--scenarios", nargs="+", default=["single", "churn"], choices=["single", "churn"])
+    parser.add_argument("--anti-entropy", type=int, default=0,
+                        help="Every N rounds each broker also reconciles digests with a random peer (0: never)")
+    parser.add_argument("--max-rounds", type=int, default=50,
+                        help="Fail if a trial has not converged after this many rounds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results, failures = [], []
+    for scenario in args.scenarios:
+        for size in args.brokers:
+            trials = [run_trial(size, scenario, args, rng) for _ in range(args.trials)]
+            converged = [rounds for rounds, _ in trials if rounds is not None]
+            if len(converged) < len(trials):
+                failures.append(f"{scenario} with {size} brokers: {len(trials) - len(converged)} of "
+                                f"{len(trials)} trials not converged after {args.max_rounds} rounds")
+            results.append({
+                "scenario": scenario,
+                "brokers": size,
+                "rounds_to_convergence": summarize(converged) if converged else None,
+                "bytes_per_broker_round": round(sum(b for _, b in trials) / len(trials)),
+            })
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+        "failures": failures,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if failures:
+        print("\n".join(["❌ Gossip did not converge:"] + failures), file=sys.stderr)
+        sys.exit(1)
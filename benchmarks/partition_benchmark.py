@@ -0,0 +1,76 @@
+"""
+Benchmark: aggregate publish throughput versus cluster size.
+
+Starts clusters of increasing size, spreads --topics topics over the brokers
+with the partition map and publishes each message straight to its topic's
+owner from several threads. With topic partitioning every broker ingests its
+own share, so throughput should grow with the number of brokers (given
+enough CPU cores for the broker processes).
+
+Usage (from the repository root):
+    python benchmarks/partition_benchmark.py [--sizes 1 2 3] [--messages 3000] [--threads 12]
+"""
+import argparse
+import json
+import threading
+import time
+
+import requests
+
+from cluster import LocalCluster
+
+
+def run(size, topics, messages, threads):
+    with LocalCluster(size) as cluster:
+        cluster.leader()
+        time.sleep(3)  # Let the coordinator publish the first partition map
+        any_url = next(iter(cluster.urls.values()))
+        owners = {
+            topic: cluster.urls[requests.get(f"{any_url}/partitions/{topic}", timeout=2).json()["owner"]]
+            for topic in topics
+        }
+
+        errors = [0]
+        lock = threading.Lock()
+        per_thread = messages // threads
+
+        def worker(n):
+            session = requests.Session()
+            for i in range(per_thread):
+                topic = topics[(n + i) % len(topics)]
+                res = session.post(f"{owners[topic]}/publish", json={"topic": topic, "data": {"i": i}}, timeout=10)
+                if res.status_code != 200:
+                    with lock:
+                        errors[0] += 1
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+    per_broker = {}
+    for url in owners.values():
+        per_broker[url] = per_broker.get(url, 0) + 1
+    return {
+        "brokers": size,
+        "messages": per_thread * threads,
+        "errors": errors[0],
+        "topics_per_broker": sorted(per_broker.values()),
+        "throughput_msg_s": round(per_thread * threads / elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--topics", type=int, default=24)
+    parser.add_argument("--messages", type=int, default=3000)
+    parser.add_argument("--threads", type=int, default=12)
+    args = parser.parse_args()
+
+    topics = [f"bench_{i}" for i in range(args.topics)]
+    results = [run(size, topics, args.messages, args.threads) for size in args.sizes]
+    print(json.dumps(results, indent=2))
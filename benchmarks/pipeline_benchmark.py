@@ -0,0 +1,294 @@
+"""
+End-to-end benchmark of the pub/sub pipeline: publishers -> brokers -> SSE consumers.
+
+Starts --brokers brokers on loopback ports (no Docker), attaches --consumers
+SSE consumers spread over the three topics, and drives the traffic,
+air_quality and weather publishers at --rate messages per second each, with
+payloads shaped like theirs and padded to --payload-bytes. Publishers and
+consumers find each topic's owner through /partitions/<topic> like the real
+ones, and re-resolve it on errors; consumers resume with Last-Event-ID.
+
+Reports publish throughput, delivery ratio and p50/p95/p99 publish-to-delivery
+latency per scenario:
+    steady       no faults
+    leader_kill  the elected leader is killed halfway through the run; the
+                 result also covers messages sent after the kill, the longest
+                 delivery gap and messages never delivered
+
+Results are printed (or written with --output) as JSON, to compare runs.
+
+Usage (from the repository root):
+    python benchmarks/pipeline_benchmark.py [--brokers 3] [--consumers 6] [--rate 50]
+        [--duration 20] [--payload-bytes 256] [--scenarios steady leader_kill] [--output results.json]
+"""
+import argparse
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from cluster import LocalCluster, ROOT
+
+TOPICS = ["traffic", "air_quality", "weather"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+def ms(value):
+    return round(value * 1000, 2) if value is not None else None
+
+
+def make_payload(topic, seq, payload_bytes):
+    """
+    Builds a message shaped like the one the topic's publisher sends, padded
+    so its JSON encoding is about `payload_bytes` long.
+    """
+    if topic == "traffic":
+        congestion = random.choice(["low", "medium", "high"])
+        data = {"congestion": congestion, "accident_reported": random.choice([True, False]), "location": "Main St"}
+        priority = {"low": 2, "medium": 1, "high": 0}[congestion]
+    elif topic == "air_quality":
+        data = {"pm10": round(random.uniform(10, 120), 1), "carbon_monoxide": round(random.uniform(0, 8), 2),
+                "ozone": round(random.uniform(20, 200), 1)}
+        priority = 0 if data["pm10"] > 80 else 2
+    else:
+        data = {"temperature": str(random.randint(-5, 35)), "humidity": str(random.randint(20, 100)),
+                "description": random.choice(["Sunny", "Partly cloudy", "Light rain", "Overcast"])}
+        priority = 0 if data["description"] in ("Light rain", "Overcast") else 2
+    data.update({"timestamp": time.time(), "lamport_ts": seq, "seq": seq, "sent": 0.0})
+    message = {"topic": topic, "data": data, "priority": priority}
+    padding = payload_bytes - len(json.dumps(message))
+    if padding > 0:
+        data["padding"] = "x" * padding
+    return message
+
+
+class OwnerLookup:
+    def __init__(self, cluster):
+        """
+        Resolves topic owners through /partitions/<topic> on any live broker.
+        """
+        self.cluster = cluster
+        self.owners = {}
+
+    def url(self, topic, refresh=False):
+        if not refresh and topic in self.owners:
+            return self.owners[topic]
+        for broker_id, url in self.cluster.urls.items():
+            if broker_id not in self.cluster.processes:
+                continue
+            try:
+                owner_url = requests.get(f"{url}/partitions/{topic}", timeout=1).json().get("owner_url")
+                if owner_url:
+                    self.owners[topic] = owner_url
+                    return owner_url
+            except Exception:
+                pass
+        return None
+
+
+def publisher(topic, rate, payload_bytes, stop, lookup, sent):
+    """
+    Publishes at a fixed rate (open loop: a slow response does not lower the
+    offered load) and records (seq, send time, accepted) for every message.
+    """
+    session = requests.Session()
+    interval = 1.0 / rate
+    next_send = time.perf_counter()
+    seq = 0
+    while not stop.is_set():
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        next_send += interval
+        message = make_payload(topic, seq, payload_bytes)
+        message["data"]["sent"] = time.time()
+        accepted = False
+        url = lookup.url(topic)
+        try:
+            accepted = url is not None and session.post(f"{url}/publish", json=message, timeout=5).status_code == 200
+        except requests.RequestException:
+            pass
+        if not accepted:
+            lookup.url(topic, refresh=True)
+        sent.append((topic, seq, message["data"]["sent"], accepted))
+        seq += 1
+
+
+def consumer(topic, stop, lookup, deliveries):
+    """
+    Reads a topic's SSE stream, reconnecting to the current owner with
+    Last-Event-ID when the stream breaks, and records (topic, seq, sent, received).
+    """
+    session = requests.Session()
+    last_id = None
+    while not stop.is_set():
+        url = lookup.url(topic)
+        if url is None:
+            time.sleep(0.2)
+            continue
+        headers = {"Last-Event-ID": last_id} if last_id is not None else {}
+        try:
+            with session.get(f"{url}/stream/{topic}", headers=headers, stream=True, timeout=(2, 3)) as res:
+                if res.status_code != 200:
+                    lookup.url(topic, refresh=True)
+                    time.sleep(0.2)
+                    continue
+                for line in res.iter_lines():
+                    if line.startswith(b"id: "):
+                        last_id = line[4:].decode()
+                    elif line.startswith(b"data: "):
+                        data = json.loads(line[6:])["data"]
+                        deliveries.append((topic, data["seq"], data["sent"], time.time()))
+                    if stop.is_set():
+                        return
+        except (requests.RequestException, ValueError):
+            lookup.url(topic, refresh=True)
+
+
+def wait_for_consumers(cluster, expected, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        connected = 0
+        for broker_id, url in cluster.urls.items():
+            if broker_id in cluster.processes:
+                try:
+                    stats = requests.get(f"{url}/sse_stats", timeout=1).json()
+                    connected += sum(topic_stats["clients"] for topic_stats in stats.values())
+                except Exception:
+                    pass
+        if connected >= expected:
+            return
+        time.sleep(0.2)
+    raise TimeoutError(f"Only {connected}/{expected} consumers connected")
+
+
+def summarize(sent, deliveries, consumers_per_topic, elapsed, since=None):
+    """
+    Aggregates one scenario; with `since`, only messages sent after that time count.
+    """
+    if since is not None:
+        sent = [s for s in sent if s[2] >= since]
+        deliveries = [d for d in deliveries if d[2] >= since]
+    accepted = [s for s in sent if s[3]]
+    expected = sum(consumers_per_topic[topic] for topic, _, _, _ in accepted)
+    latencies = [received - sent_at for _, _, sent_at, received in deliveries]
+    delivered_keys = {(topic, seq) for topic, seq, _, _ in deliveries}
+    return {
+        "published": len(sent),
+        "accepted": len(accepted),
+        "publish_errors": len(sent) - len(accepted),
+        "publish_throughput_msg_s": round(len(accepted) / elapsed, 1),
+        "deliveries": len(deliveries),
+        "expected_deliveries": expected,
+        "delivery_ratio": round(len(deliveries) / expected, 4) if expected else None,
+        "undelivered_messages": sum(1 for topic, seq, _, _ in accepted if (topic, seq) not in delivered_keys),
+        "delivery_throughput_msg_s": round(len(deliveries) / elapsed, 1),
+        "latency_p50_ms": ms(percentile(latencies, 0.50)),
+        "latency_p95_ms": ms(percentile(latencies, 0.95)),
+        "latency_p99_ms": ms(percentile(latencies, 0.99)),
+        "latency_max_ms": ms(max(latencies)) if latencies else None,
+    }
+
+
+def longest_gap(deliveries):
+    """
+    Longest time between consecutive deliveries of the same topic, in receipt order.
+    """
+    received = defaultdict(list)
+    for topic, _, _, at in deliveries:
+        received[topic].append(at)
+    gaps = [b - a for times in received.values() for a, b in zip(sorted(times), sorted(times)[1:])]
+    return max(gaps) if gaps else None
+
+
+def run_scenario(name, args):
+    env = {"SERVER_MODE": args.server_mode, "CONSOLE_LOG_LEVEL": "warning"}
+    with LocalCluster(args.brokers, base_port=args.base_port, env=env) as cluster:
+        leader = cluster.leader()
+        time.sleep(args.brokers * 0.5)      # Let the coordinator publish the map of live brokers
+        lookup = OwnerLookup(cluster)
+        publishing, consuming = threading.Event(), threading.Event()     # Set to stop each side
+        sent, deliveries = [], []           # list.append is thread-safe
+        consumers_per_topic = defaultdict(int)
+
+        consumers = []
+        for i in range(args.consumers):
+            topic = TOPICS[i % len(TOPICS)]
+            consumers_per_topic[topic] += 1
+            consumers.append(threading.Thread(target=consumer, args=(topic, consuming, lookup, deliveries), daemon=True))
+        for t in consumers:
+            t.start()
+        wait_for_consumers(cluster, args.consumers)
+
+        publishers = [
+            threading.Thread(target=publisher, args=(topic, args.rate, args.payload_bytes, publishing, lookup, sent),
+                             daemon=True)
+            for topic in TOPICS
+        ]
+        start = time.time()
+        for t in publishers:
+            t.start()
+
+        killed_at = None
+        if name == "leader_kill":
+            time.sleep(args.duration / 2)
+            killed_at = time.time()
+            cluster.kill(leader)
+            time.sleep(args.duration / 2)
+        else:
+            time.sleep(args.duration)
+        publishing.set()
+        for t in publishers:
+            t.join()
+        elapsed = time.time() - start
+        time.sleep(args.drain)              # Let in-flight messages reach the consumers
+        consuming.set()
+
+    sent, deliveries = list(sent), list(deliveries)
+    result = {"scenario": name, "duration_s": round(elapsed, 2),
+              **summarize(sent, deliveries, consumers_per_topic, elapsed)}
+    if killed_at is not None:
+        result["killed_broker"] = leader
+        result["after_kill"] = summarize(sent, deliveries, consumers_per_topic, start + elapsed - killed_at, killed_at)
+        result["longest_delivery_gap_ms"] = ms(longest_gap(deliveries))
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--brokers", type=int, default=3)
+    parser.add_argument("--consumers", type=int, default=6, help="SSE consumers, spread over the three topics")
+    parser.add_argument("--rate", type=float, default=50, help="Messages per second per publisher")
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of publishing per scenario")
+    parser.add_argument("--drain", type=float, default=3, help="Seconds to wait for deliveries after publishing")
+    parser.add_argument("--scenarios", nargs="+", default=["steady", "leader_kill"], choices=["steady", "leader_kill"])
+    parser.add_argument("--server-mode", default="threaded", choices=["threaded", "asgi"])
+    parser.add_argument("--base-port", type=int, default=5600)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": [run_scenario(name, args) for name in args.scenarios],
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
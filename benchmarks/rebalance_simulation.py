@@ -0,0 +1,103 @@
+"""
+Simulation of topic movement when brokers join or leave the hash ring.
+
+Places --topics topics on the real HashRing of each cluster size, then adds
+one broker and, separately, removes one, and measures the fraction of topics
+whose owner changed. Consistent hashing should move only about 1/N of them:
+1/(N+1) when a broker joins N brokers, 1/N when one of N leaves, and only to
+the broker that joined or away from the one that left.
+
+Results are printed (or written with --output) as JSON. The run fails (exit
+status 1, with the violations on stderr) if a topic moves between two brokers
+that did not change, or if the moved fraction exceeds the expected one by
+more than --tolerance (relative).
+
+Usage (from the repository root):
+    python benchmarks/rebalance_simulation.py [--brokers 3 5 10 50] [--topics 10000] [--vnodes 64]
+        [--tolerance 0.5] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.partitioning import HashRing  # noqa: E402
+
+
+def owners(brokers, topics, vnodes):
+    ring = HashRing(brokers, vnodes)
+    return {topic: ring.owner(topic) for topic in topics}
+
+
+def rebalance(before, after, changed):
+    """
+    Returns:
+        tuple: (fraction of topics that moved, topics that moved between
+        brokers other than `changed`)
+    """
+    moved = [topic for topic in before if before[topic] != after[topic]]
+    stray = [topic for topic in moved if changed not in (before[topic], after[topic])]
+    return len(moved) / len(before), stray
+
+
+def run(size, args):
+    topics = [f"topic-{i}" for i in range(args.topics)]
+    brokers = list(range(1, size + 1))
+    base = owners(brokers, topics, args.vnodes)
+    results = []
+    for scenario, changed, new_brokers, expected in (
+        ("join", size + 1, brokers + [size + 1], 1 / (size + 1)),
+        ("leave", size, brokers[:-1], 1 / size),
+    ):
+        moved, stray = rebalance(base, owners(new_brokers, topics, args.vnodes), changed)
+        results.append({
+            "scenario": scenario,
+            "brokers": size,
+            "moved_fraction": round(moved, 4),
+            "expected_fraction": round(expected, 4),
+            "stray_moves": len(stray),
+        })
+    return results
+
+
+def check(results, args):
+    """
+    Returns:
+        list: Descriptions of every result that misses its bound.
+    """
+    failures = []
+    for result in results:
+        label = f"{result['scenario']} with {result['brokers']} brokers"
+        if result["stray_moves"]:
+            failures.append(f"{label}: {result['stray_moves']} topics moved between unchanged brokers")
+        limit = result["expected_fraction"] * (1 + args.tolerance)
+        if result["moved_fraction"] > limit:
+            failures.append(f"{label}: moved {result['moved_fraction']:.2%} of topics, over {limit:.2%}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--brokers", type=int, nargs="+", default=[3, 5, 10, 50])
+    parser.add_argument("--topics", type=int, default=10000)
+    parser.add_argument("--vnodes", type=int, default=64, help="Virtual nodes per broker")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed relative excess of the moved fraction over the expected one")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = [result for size in args.brokers for result in run(size, args)]
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+        "failures": check(results, args),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["failures"]:
+        print("\n".join(["❌ Rebalance bounds missed:"] + report["failures"]), file=sys.stderr)
+        sys.exit(1)
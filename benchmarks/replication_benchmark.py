@@ -0,0 +1,75 @@
+"""
+Benchmark: publish throughput and latency versus replication ack level.
+
+Starts a 3-broker cluster on loopback ports with one topic per ack level
+(REPLICATION_TOPIC_ACKS) and publishes to the leader from several threads.
+
+Usage (from the repository root):
+    python benchmarks/replication_benchmark.py [--messages 2000] [--threads 8]
+"""
+import argparse
+import json
+import threading
+import time
+
+import requests
+
+from cluster import LocalCluster
+
+LEVELS = ["none", "one", "all"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+def run_level(leader_url, level, messages, threads):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = messages // threads
+
+    def worker():
+        session = requests.Session()
+        local = []
+        for i in range(per_thread):
+            message = {"topic": f"bench_{level}", "data": {"i": i, "timestamp": time.time()}}
+            start = time.perf_counter()
+            res = session.post(f"{leader_url}/publish", json=message, timeout=10)
+            local.append(time.perf_counter() - start)
+            if res.status_code != 200:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "acks": level,
+        "messages": len(latencies),
+        "errors": errors[0],
+        "throughput_msg_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    env = {"REPLICATION_TOPIC_ACKS": ",".join(f"bench_{level}={level}" for level in LEVELS)}
+    with LocalCluster(3, env=env) as cluster:
+        leader_url = cluster.urls[cluster.leader()]
+        time.sleep(2)  # Let followers report their positions so they count as in sync
+        results = [run_level(leader_url, level, args.messages, args.threads) for level in LEVELS]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,126 @@
+"""
+Load test: idle SSE connections per GB and fan-out latency, threaded vs asgi mode.
+
+For each SERVER_MODE it starts a single broker, opens --connections idle
+SSE streams from one asyncio client, and reads the broker's resident memory
+and thread count from /proc (Linux only). It then publishes --messages
+messages and measures, for every delivery, the time from publish to receipt
+by each client.
+
+The client runs on the same machine, so with few cores the latencies include
+its own parsing time; compare the modes relative to each other.
+
+Usage (from the repository root):
+    python benchmarks/sse_connections_benchmark.py [--connections 2000] [--modes threaded asgi]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import requests
+
+from cluster import LocalCluster
+
+TOPIC = "bench"
+
+
+def proc_status(pid):
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.strip()
+    return int(status["VmRSS"].split()[0]) * 1024, int(status["Threads"])
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+async def open_stream(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /stream/{TOPIC} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    await writer.drain()
+    return reader, writer  # The threaded server only sends headers with the first event
+
+
+async def read_events(reader, count, latencies):
+    buffer = b""
+    received = 0
+    while received < count:
+        chunk = await reader.read(65536)
+        if not chunk:
+            return
+        buffer += chunk
+        while b"\n\n" in buffer:
+            frame, buffer = buffer.split(b"\n\n", 1)
+            for line in frame.split(b"\n"):
+                if b"data: " in line:
+                    message = json.loads(line[line.index(b"data: ") + 6:])
+                    latencies.append(time.time() - message["data"]["sent"])
+                    received += 1
+
+
+async def run_mode(mode, connections, messages, connect_batch):
+    with LocalCluster(1, base_port=5500, env={"SERVER_MODE": mode}) as cluster:
+        cluster.leader()
+        url = cluster.urls[1]
+        port = int(url.rsplit(":", 1)[1])
+        pid = cluster.processes[1].pid
+        time.sleep(1)
+        rss_before, threads_before = proc_status(pid)
+
+        streams = []
+        start = time.perf_counter()
+        for i in range(0, connections, connect_batch):
+            batch = min(connect_batch, connections - i)
+            streams += await asyncio.gather(*(open_stream(port) for _ in range(batch)))
+        while requests.get(f"{url}/sse_stats", timeout=30).json().get(TOPIC, {}).get("clients", 0) < connections:
+            await asyncio.sleep(0.5)
+        connect_s = time.perf_counter() - start
+        await asyncio.sleep(2)
+        rss_after, threads_after = proc_status(pid)
+
+        latencies = []
+        readers = [asyncio.ensure_future(read_events(reader, messages, latencies)) for reader, _ in streams]
+        session = requests.Session()
+        loop = asyncio.get_running_loop()
+        for i in range(messages):
+            message = {"topic": TOPIC, "data": {"i": i, "sent": time.time()}}
+            await loop.run_in_executor(None, lambda: session.post(f"{url}/publish", json=message, timeout=30))
+            await asyncio.sleep(0.5)
+        await asyncio.wait(readers, timeout=60)
+        for _, writer in streams:
+            writer.close()
+
+    per_connection = (rss_after - rss_before) / connections
+    return {
+        "mode": mode,
+        "connections": connections,
+        "connect_s": round(connect_s, 2),
+        "broker_threads": threads_after,
+        "rss_mb": round(rss_after / 2 ** 20, 1),
+        "kb_per_connection": round(per_connection / 1024, 1),
+        "connections_per_gb": int(2 ** 30 / per_connection) if per_connection > 0 else None,
+        "deliveries": f"{len(latencies)}/{connections * messages}",
+        "fanout_p50_ms": round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        "fanout_p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        "fanout_max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--connect-batch", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["threaded", "asgi"])
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run_mode(mode, args.connections, args.messages, args.connect_batch))
+        for mode in args.modes
+    ]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,98 @@
+"""
+Benchmark: SSE bytes on the wire with delta encoding and stream compression.
+
+Replays a synthetic hour of weather and air_quality messages (one a minute,
+values drifting slowly like the real feeds) through the same encoders the
+broker uses for /stream/<topic>, and reports the bytes each option sends:
+  plain              full JSON frames (the default)
+  deflate_per_frame  each frame compressed on its own, for comparison
+  deflate            ?compress=deflate (one context per connection)
+  delta              ?delta=1
+  delta_deflate      ?delta=1&compress=deflate
+
+Usage (from the repository root):
+    python benchmarks/stream_bandwidth_benchmark.py [--messages 60]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.fanout import encode_sse_frame
+from utils.stream_codecs import DeflateStream, DeltaEncoder
+
+
+def weather_messages(count):
+    temperature, humidity = 14, 80
+    for i in range(count):
+        temperature += random.choice([0, 0, 0, 1, -1])
+        humidity += random.choice([0, 0, 1, -1])
+        yield {
+            "topic": "weather",
+            "data": {
+                "temperature": str(temperature),
+                "humidity": str(humidity),
+                "description": "Light rain shower" if humidity > 80 else "Partly cloudy",
+                "timestamp": time.time() + 60 * i,
+                "lamport_ts": i,
+            },
+            "priority": 2,
+        }
+
+
+def air_quality_messages(count):
+    pm10, co, ozone = 23.4, 187.0, 61.0
+    for i in range(count):
+        pm10 = round(pm10 + random.uniform(-0.5, 0.5), 1)
+        if i % 5 == 0:
+            co = round(co + random.uniform(-2, 2), 1)
+        yield {
+            "topic": "air_quality",
+            "data": {
+                "timestamp": time.time() + 60 * i,
+                "pm10": pm10,
+                "carbon_monoxide": co,
+                "ozone": ozone,
+                "lamport_ts": i,
+            },
+            "priority": 2,
+        }
+
+
+def measure(messages):
+    plain = [encode_sse_frame(message, offset) for offset, message in enumerate(messages)]
+    delta_encoder = DeltaEncoder()
+    delta = [delta_encoder.encode(offset, message) for offset, message in enumerate(messages)]
+    deflate, delta_deflate = DeflateStream(), DeflateStream()
+    sizes = {
+        "plain": sum(map(len, plain)),
+        "deflate_per_frame": sum(len(zlib.compress(frame)) for frame in plain),
+        "deflate": sum(len(deflate.compress(frame)) for frame in plain),
+        "delta": sum(map(len, delta)),
+        "delta_deflate": sum(len(delta_deflate.compress(frame)) for frame in delta),
+    }
+    return {
+        "messages": len(messages),
+        "bytes": sizes,
+        "bytes_per_message": {name: round(size / len(messages), 1) for name, size in sizes.items()},
+        "ratio_vs_plain": {name: round(size / sizes["plain"], 3) for name, size in sizes.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = {
+        "weather": measure(list(weather_messages(args.messages))),
+        "air_quality": measure(list(air_quality_messages(args.messages))),
+    }
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,94 @@
+"""
+Benchmark: bytes per message and encode/decode CPU, JSON vs MessagePack.
+
+Uses one representative message of each topic the publishers send
+(traffic, weather, air_quality) and measures:
+  - the JSON body a publisher POSTs and the SSE frame a subscriber receives
+  - the MessagePack body and the binary stream frame ([offset, message])
+  - the time to encode and decode each of them
+
+Usage (from the repository root):
+    python benchmarks/wire_format_benchmark.py [--iterations 100000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.fanout import encode_sse_frame
+from utils.wire import encode_msgpack_frame, pack, unpack
+
+OFFSET = 123456
+
+PAYLOADS = {
+    "traffic": {
+        "topic": "traffic",
+        "data": {
+            "congestion": "high",
+            "accident_reported": True,
+            "location": "Main St",
+            "timestamp": time.time(),
+            "lamport_ts": 4821,
+        },
+        "priority": 0,
+    },
+    "weather": {
+        "topic": "weather",
+        "data": {
+            "temperature": "14",
+            "humidity": "82",
+            "description": "Light rain shower",
+            "timestamp": time.time(),
+            "lamport_ts": 977,
+        },
+        "priority": 0,
+    },
+    "air_quality": {
+        "topic": "air_quality",
+        "data": {
+            "timestamp": time.time(),
+            "pm10": 23.4,
+            "carbon_monoxide": 187.0,
+            "ozone": 61.0,
+            "lamport_ts": 1503,
+        },
+        "priority": 2,
+    },
+}
+
+
+def micros(fn, iterations):
+    return round(timeit.timeit(fn, number=iterations) / iterations * 1e6, 2)
+
+
+def measure(message, iterations):
+    json_body = json.dumps(message).encode("utf-8")
+    sse_frame = encode_sse_frame(message, OFFSET)
+    msgpack_body = pack(message)
+    msgpack_frame = encode_msgpack_frame(message, OFFSET)
+    return {
+        "json_bytes": len(json_body),
+        "sse_frame_bytes": len(sse_frame),
+        "msgpack_bytes": len(msgpack_body),
+        "msgpack_frame_bytes": len(msgpack_frame),
+        "size_ratio": round(len(msgpack_frame) / len(sse_frame), 2),
+        "json_encode_us": micros(lambda: json.dumps(message), iterations),
+        "json_decode_us": micros(lambda: json.loads(json_body), iterations),
+        "sse_encode_us": micros(lambda: encode_sse_frame(message, OFFSET), iterations),
+        "msgpack_encode_us": micros(lambda: pack(message), iterations),
+        "msgpack_decode_us": micros(lambda: unpack(msgpack_body), iterations),
+        "msgpack_frame_encode_us": micros(lambda: encode_msgpack_frame(message, OFFSET), iterations),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {topic: measure(message, args.iterations) for topic, message in PAYLOADS.items()}
+    print(json.dumps(results, indent=2))
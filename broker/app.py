@@ -1,74 +1,590 @@
 from flask import Flask, request, jsonify, Response, stream_with_context
-import requests
-from collections import defaultdict, deque
 import threading
 import time
 import random
 import os
-import queue
+import json
+import logging
+import asyncio
 from utils.leader_election import LeaderElection
-from utils.gossip import receive_gossip, start_gossip_thread
+from utils.failure_detector import PhiAccrualDetector
+from utils.gossip import (
+    SubscriberGossip, receive_gossip, receive_digest, receive_reconcile, start_gossip_thread, start_anti_entropy_thread,
+    webhook_member, parse_webhook_member
+)
+from utils.dispatcher import PriorityDispatcher
+from utils.fanout import encode_sse_frame, fan_out
+from utils.commit_log import CommitLog, CLEANUP_POLICIES
+from utils.webhook import WebhookDelivery, validate_url
+from utils.forwarder import LeaderForwarder
+from utils.partitioning import PartitionMap, PartitionCoordinator, partition_key
+from utils.replication import (
+    Replicator, CatchUp, PublishAck, apply_replicated, log_positions, fetch_entries, ACK_NONE, ACK_ONE, ACK_LEVELS
+)
+from utils.client_buffer import ClientBuffer, DROP_OLDEST, POLICIES
+from utils.wire import SSE, MSGPACK, is_msgpack, unpack, stream_encoding, encode_msgpack_frame
+from utils.stream_codecs import DEFLATE, DeltaEncoder, DeflateStream
+from utils.async_sse import AsgiBroker, AsyncClientBuffer, LoopWaker, wsgi_environ
+from utils.topic_config import parse_topic_settings
+from utils.filters import compile_filter
+from utils.topic_registry import TopicRegistry
+from utils.topic_trie import TopicTrie, validate_pattern, validate_topic, is_wildcard
+from utils.metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.logger import get_logger, set_level, levels as log_levels, LEVELS as LOG_LEVELS
 
 app = Flask(__name__)
 
 # --- Broker Configuration ---
 BROKER_ID = int(os.environ.get("BROKER_ID", "1"))
 CURRENT_LEADER = None
+BROKER_PORT = int(os.environ.get("BROKER_PORT", "5001"))
+BROKER_URLS = {
+    1: "http://broker:5001",
+    2: "http://broker2:5001",
+    3: "http://broker3:5001"
+}
+if os.environ.get("BROKER_PEERS"):
+    # e.g. "1=http://127.0.0.1:5101,2=http://127.0.0.1:5102" to run brokers outside docker
+    BROKER_URLS = {
+        int(broker_id): url
+        for broker_id, _, url in (item.partition("=") for item in os.environ["BROKER_PEERS"].split(","))
+    }
+
+# --- Console Logging Configuration ---
+# Levels can also be changed at runtime through POST /log_levels
+CONSOLE_LOG_LEVEL = os.environ.get("CONSOLE_LOG_LEVEL", "info")          # debug | info | warning | error
+CONSOLE_LOG_SUBSYSTEMS = parse_topic_settings(                            # e.g. "gossip=debug,publish=debug"
+    os.environ.get("CONSOLE_LOG_SUBSYSTEMS"), tuple(LOG_LEVELS), "console log level"
+)
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "false").lower() == "true"     # Werkzeug's per-request log (synchronous)
+log = get_logger("broker")
+if CONSOLE_LOG_LEVEL not in LOG_LEVELS:
+    log.warning("⚠️ Unknown CONSOLE_LOG_LEVEL '%s', using info", CONSOLE_LOG_LEVEL)
+    CONSOLE_LOG_LEVEL = "info"
+set_level(CONSOLE_LOG_LEVEL)
+for subsystem, level in CONSOLE_LOG_SUBSYSTEMS.items():
+    set_level(level, subsystem)
+publish_log = get_logger("publish")
+sse_log = get_logger("sse")
+gossip_log = get_logger("gossip")
+election_log = get_logger("election")
+# Werkzeug writes a line to stderr for every request, heartbeats and
+# replication included, on the request thread; keep only its warnings
+logging.getLogger("werkzeug").setLevel(logging.INFO if ACCESS_LOG else logging.WARNING)
+
+# --- Server Configuration ---
+SERVER_MODE = os.environ.get("SERVER_MODE", "threaded")              # threaded (Flask dev server) | asgi (uvicorn)
+ASGI_WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", "32"))  # Threads serving non-stream requests in asgi mode
+ASGI_BACKLOG = int(os.environ.get("ASGI_BACKLOG", "4096"))          # Pending connections the socket queues
+
+# --- Partitioning Configuration ---
+PARTITION_VNODES = int(os.environ.get("PARTITION_VNODES", "64"))              # Ring points per broker
+PARTITION_CHECK_INTERVAL = float(os.environ.get("PARTITION_CHECK_INTERVAL", "2"))  # Coordinator liveness checks
+PARTITION_CATCH_UP_WAIT = float(os.environ.get("PARTITION_CATCH_UP_WAIT", "5"))    # Seconds a publish waits while its new owner catches up
+
+# --- Forwarding Configuration ---
+FORWARD_SENDERS = int(os.environ.get("FORWARD_SENDERS", "4"))       # Forwarded batches in flight per broker
+FORWARD_MAX_BATCH = int(os.environ.get("FORWARD_MAX_BATCH", "100"))  # Messages coalesced per forwarded request
+PUBLISH_REDIRECT = os.environ.get("PUBLISH_REDIRECT", "false").lower() == "true"  # Answer 307 instead of proxying
+
+# --- SSE Backpressure Configuration ---
+SSE_BUFFER_SIZE = int(os.environ.get("SSE_BUFFER_SIZE", "100"))                 # Frames buffered per client
+SSE_DEFAULT_POLICY = os.environ.get("SSE_SLOW_CONSUMER_POLICY", DROP_OLDEST)    # drop_oldest | coalesce | disconnect
+SSE_TOPIC_POLICIES = parse_topic_settings(                                       # e.g. "traffic=disconnect"
+    os.environ.get("SSE_TOPIC_POLICIES"), POLICIES, "SSE policy"
+)
+if SSE_DEFAULT_POLICY not in POLICIES:
+    log.warning("⚠️ Unknown SSE_SLOW_CONSUMER_POLICY '%s', using %s", SSE_DEFAULT_POLICY, DROP_OLDEST)
+    SSE_DEFAULT_POLICY = DROP_OLDEST
+
+# --- Commit Log Configuration ---
+LOG_DIR = os.environ.get("LOG_DIR", f"data/broker{BROKER_ID}")                      # Per-topic segment files
+LOG_SEGMENT_BYTES = int(os.environ.get("LOG_SEGMENT_BYTES", str(1024 * 1024)))     # Size-based rollover
+LOG_SEGMENT_MS = int(os.environ.get("LOG_SEGMENT_MS", "3600000"))                  # Time-based rollover
+LOG_RETENTION_BYTES = int(os.environ.get("LOG_RETENTION_BYTES", str(64 * 1024 * 1024)))
+LOG_RETENTION_MS = int(os.environ.get("LOG_RETENTION_MS", str(7 * 24 * 3600 * 1000)))
+LOG_FSYNC = os.environ.get("LOG_FSYNC", "false").lower() == "true"
+LOG_TOPIC_KEYS = parse_topic_settings(                                               # Message key field per topic
+    os.environ.get("LOG_TOPIC_KEYS", "traffic=data.location"), None, "topic key"
+)
+LOG_TOPIC_CLEANUP = parse_topic_settings(                                            # e.g. "traffic=compact"
+    os.environ.get("LOG_TOPIC_CLEANUP"), CLEANUP_POLICIES, "log cleanup policy"
+)
+LOG_VIEW_LIMIT = 1000                                                                # Default page size of /logs/<topic>
+LOG_VIEW_MAX_LIMIT = 10000                                                           # Largest page size of /logs/<topic>
+
+# --- Replication Configuration ---
+REPLICATION_ACKS = os.environ.get("REPLICATION_ACKS", ACK_NONE)                      # none | one | all
+REPLICATION_TOPIC_ACKS = parse_topic_settings(                                       # e.g. "traffic=all"
+    os.environ.get("REPLICATION_TOPIC_ACKS"), ACK_LEVELS, "replication acks"
+)
+REPLICATION_ACK_TIMEOUT = float(os.environ.get("REPLICATION_ACK_TIMEOUT", "5"))      # Seconds /publish waits for acks
+REPLICATION_MAX_BATCH = int(os.environ.get("REPLICATION_MAX_BATCH", "500"))          # Log entries per replication request
+if REPLICATION_ACKS not in ACK_LEVELS:
+    log.warning("⚠️ Unknown REPLICATION_ACKS '%s', using %s", REPLICATION_ACKS, ACK_NONE)
+    REPLICATION_ACKS = ACK_NONE
+
+# --- Webhook Delivery Configuration ---
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "8"))                      # Shared delivery worker pool
+WEBHOOK_BATCH_SIZE = int(os.environ.get("WEBHOOK_BATCH_SIZE", "1"))                # Default messages per POST
+WEBHOOK_MAX_CONCURRENCY = int(os.environ.get("WEBHOOK_MAX_CONCURRENCY", "2"))      # Concurrent POSTs per URL
+WEBHOOK_MAX_RETRIES = int(os.environ.get("WEBHOOK_MAX_RETRIES", "5"))
+WEBHOOK_TIMEOUT = float(os.environ.get("WEBHOOK_TIMEOUT", "3"))
+WEBHOOK_BREAKER_THRESHOLD = int(os.environ.get("WEBHOOK_BREAKER_THRESHOLD", "5"))  # Failures that open the circuit
+WEBHOOK_BREAKER_COOLDOWN = float(os.environ.get("WEBHOOK_BREAKER_COOLDOWN", "30"))
+
+# --- Leader Failure Detection Configuration ---
+HEARTBEAT_INTERVAL = float(os.environ.get("HEARTBEAT_INTERVAL", "0.1"))        # Seconds between leader heartbeats
+PHI_THRESHOLD = float(os.environ.get("PHI_THRESHOLD", "8"))                    # Suspicion level that starts an election
+PHI_ACCEPTABLE_PAUSE = float(os.environ.get("PHI_ACCEPTABLE_PAUSE", "0.3"))    # Seconds of leader silence tolerated (GC pauses)
+PHI_MIN_STD = float(os.environ.get("PHI_MIN_STD", "0.05"))                     # Floor on heartbeat jitter, in seconds
+PHI_WINDOW = int(os.environ.get("PHI_WINDOW", "100"))                          # Heartbeat intervals remembered
+ELECTION_MESSAGE_TIMEOUT = float(os.environ.get("ELECTION_MESSAGE_TIMEOUT", "1"))  # Seconds to wait for election replies
+ELECTION_ANNOUNCE_WAIT = float(os.environ.get("ELECTION_ANNOUNCE_WAIT", "3"))  # Seconds to wait for a higher broker's announcement
+
+# --- Gossip Configuration ---
+GOSSIP_FANOUT = int(os.environ.get("GOSSIP_FANOUT", "3"))                      # Random peers contacted per round
+GOSSIP_MIN_INTERVAL = float(os.environ.get("GOSSIP_MIN_INTERVAL", "1"))        # Seconds between rounds while subscriptions change
+GOSSIP_MAX_INTERVAL = float(os.environ.get("GOSSIP_MAX_INTERVAL", "10"))       # Seconds between rounds of a quiet cluster
+GOSSIP_TIMEOUT = float(os.environ.get("GOSSIP_TIMEOUT", "2"))                  # Seconds to wait for a peer's reply
+GOSSIP_RELAY_SENDS = int(os.environ.get("GOSSIP_RELAY_SENDS", "6"))           # Messages a delta learned from a peer is relayed in
+ANTI_ENTROPY_INTERVAL = float(os.environ.get("ANTI_ENTROPY_INTERVAL", "30"))   # Seconds between digest comparisons with a random peer
+ANTI_ENTROPY_BUCKETS = int(os.environ.get("ANTI_ENTROPY_BUCKETS", "64"))       # Buckets of the per-topic hash tree
 
 # --- State Management ---
-subscriptions = defaultdict(list)
-unsubscribed = defaultdict(set)
-sse_clients = defaultdict(list)                      # Active SSE queues per topic
-sse_subscribers = defaultdict(set)                  # Subscribed client IPs per topic
-sse_unsubscribed = defaultdict(set)                 # Recently unsubscribed clients per topic
-message_queues = defaultdict(lambda: {"high": deque(), "low": deque()})
-logs = defaultdict(list)                            # Topic-wise message logs
+# Per-topic state (SSE clients, webhook URLs) lives in a
+# registry with striped locks; client and webhook lists are copy-on-write
+# tuples, so fan-out and routing read a stable snapshot without locking.
+# Webhook subscriptions are gossiped with the subscriber set, so every broker
+# knows them and whichever broker owns a topic delivers its messages.
+topic_registry = TopicRegistry(stripes=64)
+subscriber_gossip = SubscriberGossip(                # Subscribed clients per topic, replicated as deltas
+    BROKER_ID, relay_sends=GOSSIP_RELAY_SENDS, digest_buckets=ANTI_ENTROPY_BUCKETS,
+    on_change=lambda topic: sync_webhooks(topic)
+)
+webhook_sync_lock = threading.Lock()
+webhook_routes = TopicTrie()                        # Pattern index of webhook URLs used for routing
+webhooks = WebhookDelivery(                         # Asynchronous webhook delivery engine
+    workers=WEBHOOK_WORKERS,
+    batch_size=WEBHOOK_BATCH_SIZE,
+    max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+    max_retries=WEBHOOK_MAX_RETRIES,
+    breaker_threshold=WEBHOOK_BREAKER_THRESHOLD,
+    breaker_cooldown=WEBHOOK_BREAKER_COOLDOWN,
+    timeout=WEBHOOK_TIMEOUT
+)
+commit_log = CommitLog(                             # Topic-wise durable message logs
+    LOG_DIR,
+    segment_bytes=LOG_SEGMENT_BYTES,
+    segment_ms=LOG_SEGMENT_MS,
+    retention_bytes=LOG_RETENTION_BYTES,
+    retention_ms=LOG_RETENTION_MS,
+    fsync=LOG_FSYNC,
+    topic_keys=LOG_TOPIC_KEYS,
+    topic_cleanup=LOG_TOPIC_CLEANUP
+)
+
+# --- Metrics ---
+# Hot paths only record into per-thread cells (see utils/metrics.py); queue
+# depths and SSE client state are read from the broker's own structures when
+# /metrics is scraped.
+metrics = MetricsRegistry()
+published_total = metrics.counter(
+    "broker_messages_published_total", "Messages appended and dispatched, per topic", ["topic"]
+)
+fanout_seconds = metrics.histogram(
+    "broker_fanout_seconds", "Time to hand one message to every matching SSE client and webhook", ["topic"]
+)
+forward_seconds = metrics.histogram(
+    "broker_forward_seconds", "Round trip of a batch forwarded to the broker owning its topics", ["leader"]
+)
+forwarded_total = metrics.counter(
+    "broker_forwarded_messages_total", "Messages forwarded to the broker owning their topic", ["leader"]
+)
+gossip_round_seconds = metrics.histogram("broker_gossip_round_seconds", "Duration of one gossip round")
+anti_entropy_topics = metrics.counter("broker_anti_entropy_topics_total", "Topics whose subscribers differed from a peer's")
+elections_total = metrics.counter("broker_elections_total", "Elections started by this broker", ["outcome"])
+election_seconds = metrics.histogram("broker_election_seconds", "Duration of elections started by this broker")
+
+
+def on_forward_batch(leader_url, size, seconds):
+    forward_seconds.labels(leader_url).observe(seconds)
+    forwarded_total.labels(leader_url).inc(size)
+
+
+def on_election(seconds, won):
+    elections_total.labels("won" if won else "lost").inc()
+    election_seconds.observe(seconds)
+
+
+def queue_depths():
+    for topic, queues in list(message_queues.items()):
+        for priority, queue in queues.items():
+            yield (topic, priority), len(queue)
+
+
+def sse_client_counts():
+    for state in topic_registry.states():
+        yield (state.topic,), len(state.sse_clients)
+
+
+def sse_buffer_fill():
+    for state in topic_registry.states():
+        fills = sorted(q.fill() for q in state.sse_clients)
+        if fills:
+            for quantile in ("0.5", "0.9", "0.99", "1"):
+                yield (state.topic, quantile), fills[min(len(fills) - 1, int(len(fills) * float(quantile)))]
+
+
+def sse_dropped_frames():
+    for state in topic_registry.states():
+        yield (state.topic,), state.dropped + sum(q.dropped for q in state.sse_clients)
+
+
+metrics.gauge("broker_queue_depth", "Messages waiting in message_queues", ["topic", "priority"], queue_depths)
+metrics.gauge("broker_sse_clients", "Connected SSE clients per topic or pattern", ["topic"], sse_client_counts)
+metrics.gauge(
+    "broker_sse_buffer_fill", "Quantiles of the per-client SSE buffer fill ratio", ["topic", "quantile"], sse_buffer_fill
+)
+metrics.callback_counter(
+    "broker_sse_dropped_frames_total", "Frames dropped for slow SSE clients", ["topic"], sse_dropped_frames
+)
+metrics.gauge("broker_is_leader", "1 if this broker is the elected leader", [], lambda: [((), int(CURRENT_LEADER == BROKER_ID))])
+metrics.gauge("broker_leader_term", "Latest leader election term seen", [], lambda: [((), leader_election.term)])
+metrics.gauge(
+    "broker_leader_suspicion", "Phi-accrual suspicion level of the leader (0 on the leader)", [],
+    lambda: [((), 0 if CURRENT_LEADER == BROKER_ID else leader_election.detector.phi())]
+)
 
 # --- Peer Awareness ---
 def get_known_peers(my_id):
-    all_peers = {
-        1: "broker:5001",
-        2: "broker2:5001",
-        3: "broker3:5001"
-    }
-    return {url: id for id, url in all_peers.items() if id != my_id}
+    return {url.split("://", 1)[1]: id for id, url in BROKER_URLS.items() if id != my_id}
 
 known_peers = get_known_peers(BROKER_ID)
 
 # --- Leader Election Handler ---
 def on_leader_update(new_leader):
     global CURRENT_LEADER
-    CURRENT_LEADER = new_leader
-    print(f"👑 Leader updated to broker {new_leader}", flush=True)
+    CURRENT_LEADER = new_leader  # LeaderElection logs the change
+
+leader_election = LeaderElection(
+    BROKER_ID, known_peers, on_leader_update, on_election,
+    detector=PhiAccrualDetector(
+        threshold=PHI_THRESHOLD, window=PHI_WINDOW, min_std=PHI_MIN_STD,
+        acceptable_pause=PHI_ACCEPTABLE_PAUSE, first_interval=HEARTBEAT_INTERVAL,
+    ),
+    heartbeat_interval=HEARTBEAT_INTERVAL, message_timeout=ELECTION_MESSAGE_TIMEOUT, announce_wait=ELECTION_ANNOUNCE_WAIT,
+    commit_position=lambda: replicator.high_water_marks(),
+)
+leader_election.start_heartbeats()
+leader_election.start_health_monitor()
+
+# --- Topic Partitioning ---
+# Topics are spread over the live brokers with a consistent hash ring; each
+# topic's owner accepts its publishes, serves its streams and replicates it.
+# The elected leader acts as coordinator and publishes the map of live brokers.
+# A broker adopting a newer map fences its logs, so messages accepted under
+# the old map are no longer appended, and catches up on the topics it owns
+# from the most up-to-date replica before it accepts publishes for them.
+def on_partition_change(epoch):
+    commit_log.fence(epoch)
+    catch_up.notify()
+
+partition_map = PartitionMap(BROKER_URLS, vnodes=PARTITION_VNODES, on_change=on_partition_change)
+catch_up = CatchUp(commit_log, partition_map, BROKER_ID, max_batch=REPLICATION_MAX_BATCH)
+catch_up.start()
+partition_coordinator = PartitionCoordinator(
+    partition_map, BROKER_ID, lambda: CURRENT_LEADER == BROKER_ID, interval=PARTITION_CHECK_INTERVAL
+)
+partition_coordinator.start()
+
 
-leader_election = LeaderElection(BROKER_ID, known_peers, on_leader_update)
-leader_election.start_health_monitor(lambda: CURRENT_LEADER)
+# --- Message Dispatch ---
+FRAME_ENCODERS = {SSE: encode_sse_frame, MSGPACK: encode_msgpack_frame}  # Stream encoding -> frame encoder
+
+def dispatch_message(topic, message, ack=None):
+    """
+    Appends a message to its topic's commit log and delivers it to every SSE
+    client and webhook subscriber whose topic or wildcard pattern matches the
+    topic; both are looked up in a topic trie without locking. SSE clients are
+    grouped by filter in the topic registry, and each group's filter runs once per message. Runs on the dispatcher thread,
+    so offsets follow the actual delivery order; the message is encoded once per
+    stream encoding and the same frame (tagged with its offset) is shared by all clients.
+    Webhook POSTs and replication happen on their own threads, never on this one.
+    """
+    offset = record_message(topic, message)
+    if offset is None:
+        reject_misrouted(topic, message, ack)
+        return
+    published_total.labels(topic).inc()
+    replicator.notify()
+    if ack is not None:
+        if ack.level == ACK_ONE:
+            ack.done()
+        else:
+            replicator.track(topic, offset, ack)
+    start = time.perf_counter()
+    frames = {}
+    for group in topic_registry.sse_groups(topic):
+        if group.accepts(message):
+            frame = frames.get(group.encoding)
+            if frame is None:
+                frame = frames[group.encoding] = (offset, FRAME_ENCODERS[group.encoding](message, offset), message)
+            fan_out(frame, group.clients)
+    for url in webhook_routes.match(topic):
+        webhooks.enqueue(url, message)
+    fanout_seconds.labels(topic).observe(time.perf_counter() - start)
+
+replicator = Replicator(
+    commit_log,
+    {broker_id: url for broker_id, url in BROKER_URLS.items() if broker_id != BROKER_ID},
+    owns=lambda topic: partition_map.owner(topic) == BROKER_ID,
+    broker_id=BROKER_ID,
+    live=lambda: partition_map.live,
+    max_batch=REPLICATION_MAX_BATCH
+)
+dispatcher = PriorityDispatcher(dispatch_message)
+message_queues = dispatcher.message_queues           # Pending messages per topic and priority
+dispatcher.start()
+
+
+# --- Topic Validation ---
+def check_pattern(pattern):
+    """
+    Validates a subscription topic or wildcard pattern.
+
+    Returns:
+        tuple | None: A 400 response if the pattern is invalid, else None.
+    """
+    try:
+        validate_pattern(pattern)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if is_wildcard(partition_key(pattern)):
+        return jsonify({"error": f"The first level of '{pattern}' must be a topic name, not a wildcard"}), 400
+    return None
 
 
 # --- SSE Streaming Endpoint ---
-@app.route('/stream/<topic>')
+def prepare_stream(topic):
+    """
+    Validates a /stream request in the current request context. Shared by the
+    threaded view and the ASGI coroutine so both modes behave the same.
+
+    Returns:
+        tuple: (session, None) with the stream's settings, or (None, response)
+        for invalid requests and redirects to the topic's owner.
+    """
+    error = check_pattern(topic)
+    if error:
+        return None, error
+    owner = partition_map.owner(topic)
+    if owner != BROKER_ID:
+        return None, redirect_to_owner(owner)
+
+    message_filter = None
+    if request.args.get("filter"):
+        try:
+            message_filter = compile_filter(request.args["filter"])
+        except ValueError as e:
+            return None, (jsonify({"error": str(e)}), 400)
+
+    encoding = stream_encoding(request.headers.get("Accept"))
+    compress = request.args.get("compress")
+    if compress and compress != DEFLATE:
+        return None, (jsonify({"error": f"Unsupported compression '{compress}', use '{DEFLATE}'"}), 400)
+    delta = request.args.get("delta", "").lower() in ("1", "true")
+    if delta and encoding != SSE:
+        return None, (jsonify({"error": "Delta mode is only available for SSE streams"}), 400)
+
+    wildcard = is_wildcard(topic)
+    if wildcard and request.args.get("from") is not None:
+        return None, (jsonify({"error": "Wildcard streams cannot be resumed from an offset"}), 400)
+    try:
+        if wildcard:
+            resume_from = None
+        elif request.headers.get("Last-Event-ID"):
+            resume_from = int(request.headers["Last-Event-ID"]) + 1
+        elif request.args.get("from") is not None:
+            resume_from = int(request.args["from"])
+        else:
+            resume_from = None
+    except ValueError:
+        return None, (jsonify({"error": "Last-Event-ID and 'from' must be integer offsets"}), 400)
+
+    return {
+        "topic": topic,
+        "filter": message_filter,
+        "policy": SSE_TOPIC_POLICIES.get(topic, SSE_DEFAULT_POLICY),
+        "encoding": encoding,
+        "compress": bool(compress),
+        "delta": delta,
+        "client_ip": request.remote_addr,
+        "resume_from": resume_from,
+    }, None
+
+
+def open_stream(session, q):
+    """
+    Attaches a client buffer to its topic and records the subscriber.
+
+    Returns:
+        int: First offset to take from the live buffer; earlier ones are replayed.
+    """
+    topic = session["topic"]
+    topic_registry.add_sse_client(topic, q, session["filter"], session["encoding"])
+    sse_log.info("🔔 SSE client connected to topic: %s from %s", topic, session["client_ip"], rate=10)
+
+    # Update subscriber state
+    subscriber_gossip.add(topic, session["client_ip"])
+
+    if session["resume_from"] is None:
+        return 0
+    return commit_log.topic_log(topic).next_offset
+
+
+def replay_stream(session, live_from):
+    """
+    Yields the retained history from the resume point up to the point the live
+    buffer was attached, as (offset, frame, message) entries like the live ones;
+    live frames below that offset are skipped by the caller.
+    """
+    resume_from = session["resume_from"]
+    if resume_from is None:
+        return
+    topic, message_filter = session["topic"], session["filter"]
+    encode = FRAME_ENCODERS[session["encoding"]]
+    sse_log.info(
+        "⏪ Replaying '%s' from offset %s to %s for %s", topic, resume_from, live_from, session["client_ip"], rate=10
+    )
+    replay = commit_log.query(topic, from_offset=resume_from, limit=max(0, live_from - resume_from))
+    for offset, message in replay:
+        if message_filter is None or message_filter(message):
+            yield offset, None if session["delta"] else encode(message, offset), message
+
+
+def stream_renderer(session):
+    """
+    Returns a function turning (offset, frame, message) entries into the bytes
+    sent to one client, applying the stream's delta and compression options.
+    Both keep per-connection state, so they run on the client's own thread or
+    coroutine, never on the dispatcher.
+    """
+    delta = DeltaEncoder() if session["delta"] else None
+    deflate = DeflateStream() if session["compress"] else None
+
+    def render(entries):
+        if delta:
+            data = b"".join(delta.encode(offset, message) for offset, _, message in entries)
+        else:
+            data = b"".join(frame for _, frame, _ in entries)
+        return deflate.compress(data) if deflate and data else data
+
+    return render
+
+
+def stream_headers(session):
+    headers = {"Content-Type": session["encoding"]}
+    if session["compress"]:
+        headers["Content-Encoding"] = DEFLATE
+    return headers
+
+
+def close_stream(session, q):
+    """
+    Detaches a client buffer and records the unsubscription.
+    """
+    topic = session["topic"]
+    q.close()
+    topic_registry.remove_sse_client(topic, q)
+    subscriber_gossip.remove(topic, session["client_ip"])
+    sse_log.info("🔕 SSE client disconnected from topic: %s", topic, rate=10)
+
+
+@app.route('/stream/<path:topic>')
 def stream(topic):
-    def event_stream():
-        q = queue.Queue()
-        sse_clients[topic].append(q)
-        client_ip = request.remote_addr
-        print(f"🔔 SSE client connected to topic: {topic} from {client_ip}", flush=True)
+    """
+    Streams a topic over SSE. Every event carries its topic offset as the SSE `id`.
+    A client resuming with a Last-Event-ID header (or ?from=<offset>) first gets
+    the retained history after that point, then the live tail.
+
+    The topic may be a wildcard pattern below a literal root level, e.g.
+    traffic/+/main_st or traffic/%23 ('#' must be URL-encoded). Wildcard streams
+    merge several topics whose offsets are unrelated, so they are live only.
+
+    An optional ?filter= expression (see utils/filters.py), e.g.
+    `data.pm10 > 80`, is evaluated by the broker; only matching messages are sent.
+
+    Clients sending `Accept: application/msgpack` get a binary stream of
+    MessagePack [offset, message] arrays instead of SSE text.
 
-        # Update subscriber state
-        sse_subscribers[topic].add(client_ip)
-        sse_unsubscribed[topic].discard(client_ip)
+    Opt-in bandwidth savers: ?compress=deflate compresses the whole stream with
+    one deflate context, and ?delta=1 sends `event: delta` merge patches
+    against the previous message of the topic (see utils/stream_codecs.py).
+    """
+    session, error = prepare_stream(topic)
+    if error:
+        return error
 
+    def event_stream():
+        q = ClientBuffer(SSE_BUFFER_SIZE, session["policy"])
+        live_from = open_stream(session, q)
+        render = stream_renderer(session)
         try:
+            for entry in replay_stream(session, live_from):
+                yield render([entry])
+
             while True:
-                msg = q.get()
-                yield f"data: {msg}\n\n"
-        except GeneratorExit:
-            sse_clients[topic].remove(q)
-            sse_subscribers[topic].discard(client_ip)
-            sse_unsubscribed[topic].add(client_ip)
-            print(f"🔕 SSE client disconnected from topic: {topic}", flush=True)
+                item = q.get()
+                if item is None:
+                    sse_log.warning(
+                        "🐢 Disconnecting slow SSE client %s from topic: %s", session["client_ip"], topic, rate=5
+                    )
+                    break
+                if item[0] >= live_from:  # (offset, pre-encoded frame, message)
+                    yield render([item])
+        finally:
+            close_stream(session, q)
+
+    return Response(stream_with_context(event_stream()), headers=stream_headers(session))
+
+
+# --- Webhook Subscriptions ---
+def webhook_members(topic, url):
+    """
+    Returns:
+        list: Gossiped member strings subscribing `url` to the topic or pattern
+        (more than one only if brokers took different batch sizes concurrently).
+    """
+    return [
+        client for client in subscriber_gossip.subscribers(topic)
+        if (parse_webhook_member(client) or (None,))[0] == url
+    ]
 
-    return Response(stream_with_context(event_stream()), content_type='text/event-stream')
+
+def sync_webhooks(topic):
+    """
+    Brings the webhook routes of a topic or pattern in line with the gossiped
+    subscriber set, after a local or a peer's subscribe or unsubscribe.
+    """
+    with webhook_sync_lock:
+        wanted = {}
+        for client in subscriber_gossip.subscribers(topic):
+            webhook = parse_webhook_member(client)
+            if webhook:
+                wanted[webhook[0]] = webhook[1]
+        state = topic_registry.find(topic)
+        for url in (state.webhooks if state else ()):
+            if url not in wanted and topic_registry.remove_webhook(topic, url):
+                webhook_routes.remove(topic, url)
+                if not topic_registry.has_webhook(url):
+                    webhooks.remove(url)
+                log.info("🛑 Webhook %s unsubscribed from '%s'", url, topic)
+        for url, batch_size in wanted.items():
+            webhooks.register(url, batch_size)
+            if topic_registry.add_webhook(topic, url):
+                webhook_routes.add(topic, url)
+                log.info("✅ Webhook subscriber subscribed to '%s' at %s", topic, url)
 
 
 # --- SSE Subscribe Endpoint ---
@@ -80,21 +596,37 @@ def subscribe():
 
     if not topic:
         return jsonify({"error": "Missing topic"}), 400
+    error = check_pattern(topic)
+    if error:
+        return error
 
     if mode == "sse":
-        print(f"✅ SSE subscription requested for topic '{topic}'", flush=True)
-        sse_subscribers[topic].add(request.remote_addr)
-        sse_unsubscribed[topic].discard(request.remote_addr)
+        sse_log.info("✅ SSE subscription requested for topic '%s'", topic, rate=10)
+        subscriber_gossip.add(topic, request.remote_addr)
         return jsonify({"message": f"Subscribed to topic '{topic}' via SSE"}), 200
 
     elif mode == "webhook" or not mode:
         url = data.get("url")
         if not url:
             return jsonify({"error": "Missing URL for webhook subscription"}), 400
-        if url not in subscriptions[topic]:
-            subscriptions[topic].append(url)
-            unsubscribed[topic].discard(url)
-            print(f"✅ Webhook subscriber subscribed to '{topic}' at {url}", flush=True)
+        try:
+            validate_url(url)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        owner = partition_map.owner(topic)
+        if owner != BROKER_ID and not is_forwarded():
+            return forward_to_owner(owner)  # Webhooks are delivered by the topic's owner
+        batch_size = data.get("batch_size")
+        if batch_size is not None and (
+                not isinstance(batch_size, int) or isinstance(batch_size, bool) or batch_size < 1):
+            return jsonify({"error": "batch_size must be a positive integer"}), 400
+        member = webhook_member(url, batch_size)
+        previous = webhook_members(topic, url)
+        if member not in previous:
+            subscriber_gossip.add(topic, member)
+        for client in previous:
+            if client != member:
+                subscriber_gossip.remove(topic, client)     # Subscribed again with another batch size
         return jsonify({"message": f"Subscribed to topic '{topic}' (webhook)"}), 200
 
     return jsonify({"error": f"Unsupported subscription mode: {mode}"}), 400
@@ -109,23 +641,32 @@ def unsubscribe():
 
     if not topic:
         return jsonify({"error": "Missing topic"}), 400
+    error = check_pattern(topic)
+    if error:
+        return error
 
     if mode == "sse":
-        print(f"🔕 SSE unsubscription requested for topic '{topic}'", flush=True)
+        sse_log.info("🔕 SSE unsubscription requested for topic '%s'", topic, rate=10)
         client_ip = request.remote_addr
-        sse_subscribers[topic].discard(client_ip)
-        sse_unsubscribed[topic].add(client_ip)
-        print(f"📉 After unsubscription, subscribers: {sse_subscribers[topic]}")
+        subscriber_gossip.remove(topic, client_ip)
+        sse_log.debug("📉 After unsubscription, subscribers: %s", subscriber_gossip.subscribers(topic))
         return jsonify({"message": f"Unsubscribed from topic '{topic}' (SSE)"}), 200
 
     elif mode == "webhook" or not mode:
         url = data.get("url")
         if not url:
             return jsonify({"error": "Missing URL for webhook unsubscription"}), 400
-        if topic in subscriptions and url in subscriptions[topic]:
-            subscriptions[topic].remove(url)
-            unsubscribed[topic].add(url)
-            print(f"🛑 Unsubscribed: {url} from '{topic}' (webhook)")
+        try:
+            validate_url(url)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        owner = partition_map.owner(topic)
+        if owner != BROKER_ID and not is_forwarded():
+            return forward_to_owner(owner)
+        members = webhook_members(topic, url)
+        for client in members:
+            subscriber_gossip.remove(topic, client)
+        if members:
             return jsonify({"message": f"Unsubscribed from topic '{topic}' (webhook)"}), 200
         return jsonify({"message": f"Not subscribed to '{topic}' with URL '{url}'"}), 200
 
@@ -134,58 +675,390 @@ def unsubscribe():
 
 
 # --- Publish Messages ---
+def topic_error(topic):
+    """
+    Returns:
+        str | None: Why a published message's topic is invalid (not a string,
+        or containing wildcards), or None if it is valid.
+    """
+    try:
+        validate_topic(topic)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def parse_priority(data):
+    """
+    Maps a message's priority field to "high" or "low" (0 or "high" is high priority).
+    """
+    raw_priority = str(data.get("priority", "low")).lower()
+    return "high" if raw_priority in ["0", "high"] else "low"
+
+
+forwarder = LeaderForwarder(
+    senders=FORWARD_SENDERS,
+    max_batch=FORWARD_MAX_BATCH,
+    timeout=REPLICATION_ACK_TIMEOUT + 2,   # The owner may wait this long for acknowledgments before answering
+    headers={"X-Forwarded-By": str(BROKER_ID)},
+    on_batch=on_forward_batch
+)
+
+
+def owner_hint(response, owner):
+    """
+    Tags a response with the topic's owner, so clients can go there directly next time.
+    """
+    response.headers["X-Partition-Owner"] = str(owner)
+    response.headers["X-Partition-Owner-URL"] = BROKER_URLS.get(owner, "")
+    response.headers["X-Partition-Epoch"] = str(partition_map.epoch)
+    return response
+
+
+def redirect_to_owner(owner):
+    """
+    Answers with a 307 so the client repeats the same request against the topic's owner.
+    """
+    owner_url = BROKER_URLS.get(owner)
+    if not owner_url:
+        return jsonify({"error": "Unknown partition owner"}), 500
+    response = jsonify({"owner": owner, "owner_url": owner_url})
+    response.status_code = 307
+    response.headers["Location"] = f"{owner_url}{request.full_path.rstrip('?')}"
+    return owner_hint(response, owner)
+
+
+def forward_to_owner(owner):
+    """
+    Forwards the current request body unchanged to the same endpoint on the topic's owner.
+    """
+    try:
+        res = forwarder.post(
+            BROKER_URLS.get(owner), request.full_path.rstrip('?'),
+            request.get_data(), request.content_type or "application/json"
+        )
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        return jsonify({"error": f"Failed to contact leader: {str(e)}"}), 500
+    response = Response(res.content, status=res.status_code, content_type=res.headers.get("Content-Type"))
+    return owner_hint(response, owner)
+
+
+def is_forwarded():
+    """
+    True if another broker already routed this request here; it is then handled
+    locally even if the partition maps briefly disagree, so requests never bounce.
+    """
+    return "X-Forwarded-By" in request.headers
+
+
+def new_ack(topic):
+    """
+    Returns a PublishAck for the topic's acknowledgment level, or None for "none".
+    """
+    level = REPLICATION_TOPIC_ACKS.get(topic, REPLICATION_ACKS)
+    return PublishAck(level) if level != ACK_NONE else None
+
+
+def record_message(topic, data):
+    """
+    Appends a message to the topic's commit log, tagged with the partition
+    map epoch it was written in, if this broker still owns the topic.
+
+    Returns:
+        int | None: Offset of the message within the topic, or None if the
+        topic moved to another broker since the message was accepted.
+    """
+    while partition_map.owner(topic) == BROKER_ID:
+        offset = commit_log.append(topic, data, partition_map.epoch)
+        if offset is not None:
+            return offset
+        # The map changed between reading the epoch and appending; check ownership again
+    return None
+
+
+def reject_misrouted(topic, message, ack):
+    """
+    Handles a message whose topic moved to another broker after it was
+    accepted: a publisher waiting for an acknowledgment gets an error to retry
+    on, any other message is forwarded to the new owner.
+    """
+    owner = partition_map.owner(topic)
+    error = f"Broker {BROKER_ID} no longer owns '{topic}' (partition epoch {partition_map.epoch})"
+    publish_log.warning("🚧 %s; %s", error, "rejecting" if ack else f"forwarding to broker {owner}", rate=5)
+    if ack:
+        ack.fail(error)
+    elif owner != BROKER_ID:
+        forwarder.submit(BROKER_URLS.get(owner), message)
+
+
+def unavailable_error(topic, owner):
+    """
+    Why this broker cannot take a publish right now: a broker forwarded it
+    here under a partition map this broker no longer shares, or this broker
+    is still catching up on the topic it just gained.
+    """
+    if owner != BROKER_ID:
+        return f"Broker {BROKER_ID} does not own '{topic}' at partition epoch {partition_map.epoch}"
+    return f"Broker {BROKER_ID} is still catching up on '{topic}'"
+
+
+def unavailable(topic, owner):
+    return owner_hint(jsonify({"error": unavailable_error(topic, owner)}), owner), 503
+
+
+def decode_message_body():
+    """
+    Decodes a publish body as MessagePack or JSON, according to its Content-Type.
+
+    Returns:
+        tuple: (decoded body, None) or (None, error response).
+    """
+    if not is_msgpack(request.mimetype):
+        return request.get_json(force=True), None
+    try:
+        return unpack(request.get_data()), None
+    except RuntimeError as e:
+        return None, (jsonify({"error": str(e)}), 415)
+    except ValueError as e:
+        return None, (jsonify({"error": f"Invalid MessagePack: {e}"}), 400)
+
+
 @app.route('/publish', methods=['POST'])
 def publish():
-    data = request.get_json(force=True)
+    data, error = decode_message_body()
+    if error:
+        return error
+    if not isinstance(data, dict):
+        return jsonify({"error": "Message must be an object"}), 400
     topic = data.get("topic")
-    raw_priority = str(data.get("priority", "low")).lower()
-    priority = "high" if raw_priority in ["0", "high"] else "low"
+    priority = parse_priority(data)
 
     if not topic:
         return jsonify({"error": "No topic specified"}), 400
+    error = topic_error(topic)
+    if error is not None:
+        return jsonify({"error": error}), 400
+
+    # Forward to the topic's owner if not self; concurrent forwards are coalesced into batches.
+    # A request another broker already forwarded is never forwarded again.
+    owner = partition_map.owner(topic)
+    if owner != BROKER_ID:
+        if is_forwarded():
+            return unavailable(topic, owner)
+        if PUBLISH_REDIRECT:
+            return redirect_to_owner(owner)
+        status, body = forwarder.forward(BROKER_URLS.get(owner), data)
+        return owner_hint(jsonify(body) if body is not None else Response(''), owner), status
+    if not catch_up.ready(topic, PARTITION_CATCH_UP_WAIT):
+        return unavailable(topic, owner)
+
+    # Enqueue message locally; the dispatcher thread logs it and delivers it to SSE clients
+    ack = new_ack(topic)
+    dispatcher.submit(topic, priority, data, ack)
+
+    publish_log.debug("📬 Received message for topic '%s' with priority '%s'", topic, priority)
+
+    if ack:
+        if not ack.wait(REPLICATION_ACK_TIMEOUT):
+            return jsonify({"error": f"Timed out waiting for '{ack.level}' acknowledgment"}), 504
+        if ack.error:
+            return jsonify({"error": ack.error}), ack.status
+    return '', 200
+
+
+def parse_batch(body, mimetype):
+    """
+    Parses a batch body, either a JSON array or NDJSON (one message per line).
 
-    # Forward to leader if not self
-    if CURRENT_LEADER and CURRENT_LEADER != BROKER_ID:
-        leader_url = {
-            1: "http://broker:5001",
-            2: "http://broker2:5001",
-            3: "http://broker3:5001"
-        }.get(CURRENT_LEADER)
-        if leader_url:
-            try:
-                res = requests.post(f"{leader_url}/publish", json=data, timeout=2)
-                return res.content, res.status_code, res.headers.items()
-            except Exception as e:
-                return jsonify({"error": f"Failed to contact leader: {str(e)}"}), 500
+    Returns:
+        list: One entry per message, either the decoded message or an
+        Exception describing why that line could not be decoded.
+    """
+    if mimetype not in ("application/x-ndjson", "application/jsonl") and body.lstrip().startswith("["):
+        return json.loads(body)
+
+    messages = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            messages.append(json.loads(line))
+        except ValueError as e:
+            messages.append(e)
+    return messages
+
+
+@app.route('/publish/batch', methods=['POST'])
+def publish_batch():
+    if is_msgpack(request.mimetype):
+        messages, error = decode_message_body()
+        if error:
+            return error
+    else:
+        try:
+            messages = parse_batch(request.get_data(as_text=True), request.mimetype)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid JSON batch: {e}"}), 400
+    if not isinstance(messages, list):
+        return jsonify({"error": "Batch must be a JSON or MessagePack array, or NDJSON"}), 400
+
+    # Validate every message in one pass; messages of topics owned by other
+    # brokers are forwarded to them, the rest are enqueued here in one step.
+    results = []
+    accepted = []
+    waiting = []
+    forwarded = []
+    local = is_forwarded()
+    deadline = time.time() + PARTITION_CATCH_UP_WAIT
+    ready = {}                  # topic -> whether this broker may take its publishes now
+    for index, data in enumerate(messages):
+        if isinstance(data, Exception):
+            results.append({"index": index, "status": "rejected", "error": f"Invalid JSON: {data}"})
+        elif not isinstance(data, dict) or not data.get("topic"):
+            results.append({"index": index, "status": "rejected", "error": "No topic specified"})
+        elif topic_error(data["topic"]) is not None:
+            results.append({"index": index, "status": "rejected", "error": topic_error(data["topic"])})
         else:
-            return jsonify({"error": "Unknown leader ID"}), 500
-
-    # Enqueue message locally
-    message_queues[topic][priority].append(data)
-    logs[topic].append(data)
-    if len(logs[topic]) > 1000:
-        logs[topic] = logs[topic][-1000:]
-
-    print(f"\n📬 Received message for topic '{topic}' with priority '{priority}'")
-    
-    # Dispatch to SSE clients
-    for priority_level in ["high", "low"]:
-        while message_queues[topic][priority_level]:
-            message = message_queues[topic][priority_level].popleft()
-            for q in sse_clients[topic]:
-                try:
-                    q.put(jsonify(message).get_data(as_text=True))
-                except Exception as e:
-                    print(f"❌ Failed to send SSE to client: {e}", flush=True)
+            topic = data["topic"]
+            priority = parse_priority(data)
+            owner = partition_map.owner(topic)
+            result = {"index": index, "status": "accepted", "topic": topic, "priority": priority, "broker": owner}
+            if owner == BROKER_ID and topic not in ready:
+                ready[topic] = catch_up.ready(topic, max(0, deadline - time.time()))
+            if (owner != BROKER_ID and local) or (owner == BROKER_ID and not ready[topic]):
+                result["status"] = "unavailable"
+                result["error"] = unavailable_error(topic, owner)
+            elif owner == BROKER_ID:
+                ack = new_ack(topic)
+                accepted.append((topic, priority, data, ack))
+                if ack:
+                    waiting.append((result, ack))
+            else:
+                forwarded.append((result, forwarder.submit(BROKER_URLS.get(owner), data)))
+            results.append(result)
+
+    dispatcher.submit_many(accepted)
+
+    publish_log.debug(
+        "📬 Received batch of %d messages (%d local, %d forwarded)", len(messages), len(accepted), len(forwarded)
+    )
+
+    for result, entry in forwarded:
+        status, body = forwarder.wait(entry)
+        if status != 200:
+            result["status"] = {504: "timeout", 503: "unavailable", 500: "failed"}.get(status, "rejected")
+            result["error"] = (body or {}).get("error") if isinstance(body, dict) else str(body)
+
+    # Messages whose acknowledgment did not arrive in time get their own status,
+    # so a forwarding broker reports them as 504s rather than as accepted
+    deadline = time.time() + REPLICATION_ACK_TIMEOUT
+    for result, ack in waiting:
+        if not ack.wait(max(0, deadline - time.time())):
+            result["status"] = "timeout"
+            result["error"] = f"Timed out waiting for '{ack.level}' acknowledgment"
+        elif ack.error:
+            result["status"] = "failed" if ack.status == 500 else "unavailable"
+            result["error"] = ack.error
 
+    accepted_count = sum(1 for result in results if result["status"] == "accepted")
+    timed_out = sum(1 for result in results if result["status"] == "timeout")
+    unavailable_count = sum(1 for result in results if result["status"] == "unavailable")
+    failed = sum(1 for result in results if result["status"] == "failed")
+    if timed_out:
+        status = 504
+    elif failed and not accepted_count:
+        status = 500
+    elif unavailable_count and not accepted_count:
+        status = 503
+    elif accepted_count == len(messages):
+        status = 200
+    elif accepted_count:
+        status = 207  # Multi-Status: some messages were rejected
+    else:
+        status = 400
+    return jsonify({
+        "accepted": accepted_count,
+        "rejected": len(messages) - accepted_count - timed_out - unavailable_count - failed,
+        "failed": failed,
+        "timed_out": timed_out,
+        "unavailable": unavailable_count,
+        "results": results,
+    }), status
+
+
+# --- Log Replication (follower side) ---
+@app.route('/replicate', methods=['POST'])
+def replicate():
+    data = request.get_json(force=True)
+    sender = data.get("broker_id")
+    # Only accept entries from the broker this broker believes owns the topic
+    return jsonify(apply_replicated(
+        commit_log, data.get("entries", []), accepts=lambda topic: partition_map.owner(topic) == sender,
+        truncate=data.get("truncate")
+    )), 200
+
+
+@app.route('/replicate/positions', methods=['POST'])
+def replicate_positions():
+    """
+    Reports this broker's log positions to a broker catching up on the topics
+    it owns. The caller's partition map is adopted first if it is newer, which
+    fences the logs, so nothing is appended under the old map afterwards.
+    """
+    partition_map.adopt(request.get_json(force=True))
+    return jsonify({**log_positions(commit_log), "map": partition_map.message()}), 200
+
+
+@app.route('/replicate/fetch/<path:topic>', methods=['GET'])
+def replicate_fetch(topic):
+    try:
+        from_offset = int(request.args.get("from", 0))
+        limit = min(int(request.args.get("limit", REPLICATION_MAX_BATCH)), LOG_VIEW_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+    return jsonify({"entries": fetch_entries(commit_log, topic, from_offset, limit)}), 200
+
+
+# --- Partition Map ---
+@app.route('/partitions', methods=['GET'])
+def partitions():
+    return jsonify(partition_map.to_dict(commit_log.topics())), 200
+
+
+@app.route('/partitions/<path:topic>', methods=['GET'])
+def partition_owner(topic):
+    owner = partition_map.owner(topic)
+    return jsonify({
+        "topic": topic,
+        "owner": owner,
+        "owner_url": BROKER_URLS.get(owner),
+        "epoch": partition_map.epoch
+    }), 200
+
+
+@app.route('/partition_map', methods=['POST'])
+def receive_partition_map():
+    partition_map.adopt(request.get_json(force=True))
     return '', 200
 
 
 # --- Gossip Integration ---
 @app.route('/gossip', methods=['POST'])
 def handle_gossip():
-    print(f"📥 Gossip received at broker", flush=True)
-    return receive_gossip(request, sse_subscribers, sse_unsubscribed)
+    gossip_log.debug("📥 Gossip received at broker")
+    return receive_gossip(request, subscriber_gossip)
+
+
+@app.route('/gossip/digest', methods=['POST'])
+def handle_gossip_digest():
+    return receive_digest(request, subscriber_gossip)
+
+
+@app.route('/gossip/reconcile', methods=['POST'])
+def handle_gossip_reconcile():
+    return receive_reconcile(request, subscriber_gossip)
 
 
 # --- Leader Election Endpoints ---
@@ -193,24 +1066,41 @@ def handle_gossip():
 def election():
     data = request.get_json(force=True)
     sender_id = int(data.get("broker_id"))
-    print(f"⚡ Received election from broker {sender_id}", flush=True)
+    election_log.info("⚡ Received election from broker %s", sender_id)
     if BROKER_ID > sender_id:
-        return jsonify({"response": "OK"}), 200
-    return jsonify({"response": "NO"}), 200
+        return jsonify({"response": "OK", "term": leader_election.term}), 200
+    return jsonify({"response": "NO", "term": leader_election.term}), 200
 
 
 @app.route('/leader', methods=['POST'])
 def leader_announcement():
     data = request.get_json(force=True)
     leader_id = int(data.get("leader_id"))
-    leader_election.update_leader(leader_id)
-    return '', 200
+    term = data.get("term")
+    accepted = leader_election.update_leader(leader_id, None if term is None else int(term))
+    return jsonify({"accepted": accepted, "term": leader_election.term}), 200
+
+
+@app.route('/heartbeat', methods=['POST'])
+def heartbeat():
+    data = request.get_json(force=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Heartbeat must be an object"}), 400
+    leader_id, term = data.get("leader_id"), data.get("term")
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (leader_id, term)):
+        return jsonify({"error": "leader_id and term must be integers"}), 400
+    return jsonify(leader_election.receive_heartbeat(leader_id, term, data.get("commit"))), 200
 
 
 @app.route('/get_leader', methods=['GET'])
 def get_leader():
-    print(f"📥 Received /get_leader request. Returning {leader_election.get_leader()}", flush=True)
-    return jsonify({"leader_id": leader_election.get_leader()}), 200
+    election_log.debug("📥 Received /get_leader request. Returning %s", leader_election.get_leader())
+    return jsonify({
+        "leader_id": leader_election.get_leader(),
+        "term": leader_election.term,
+        "leader_commit": leader_election.leader_commit,
+        "suspicion": round(leader_election.detector.phi(), 3),
+    }), 200
 
 
 @app.route('/start_election', methods=['POST'])
@@ -223,25 +1113,206 @@ def start_election():
 def health_check():
     return "OK", 200
 
-@app.route('/logs/<topic>', methods=['GET'])
+@app.route('/logs/<path:topic>', methods=['GET'])
 def view_logs(topic):
-    return jsonify({"topic": topic, "logs": logs.get(topic, [])}), 200
+    """
+    Streams a page of a topic's history as JSON.
+
+    Query params (all optional):
+        from_offset: First offset to return; without it the newest messages are returned.
+        limit: Maximum number of messages (default 1000).
+        since, until: Inclusive bounds on the message `timestamp` (epoch seconds).
+        min_lamport_ts, max_lamport_ts: Inclusive bounds on the message `lamport_ts`.
+    """
+    def arg(name, cast, default=None):
+        value = request.args.get(name)
+        return default if value is None else cast(value)
+
+    try:
+        criteria = {
+            "from_offset": arg("from_offset", int),
+            "limit": min(arg("limit", int, LOG_VIEW_LIMIT), LOG_VIEW_MAX_LIMIT),
+            "since": arg("since", float),
+            "until": arg("until", float),
+            "min_lamport": arg("min_lamport_ts", int),
+            "max_lamport": arg("max_lamport_ts", int),
+        }
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+    if criteria["limit"] < 0:
+        return jsonify({"error": "limit must not be negative"}), 400
+
+    def generate():
+        yield f'{{"topic": {json.dumps(topic)}, "logs": ['
+        next_offset = criteria["from_offset"]
+        for i, (offset, message) in enumerate(commit_log.query(topic, **criteria)):
+            yield ("," if i else "") + json.dumps(message)
+            next_offset = offset + 1
+        yield f'], "next_offset": {json.dumps(next_offset)}}}'
+
+    return Response(stream_with_context(generate()), content_type='application/json'), 200
+
+@app.route('/latest/<path:topic>', methods=['GET'])
+def latest(topic):
+    """
+    Returns the newest message of a topic, or of every key of a keyed topic
+    (see LOG_TOPIC_KEYS), so a new subscriber can bootstrap its state in one
+    request and then stream from `next_offset`. ?key=<value> selects one key.
+    Served by the topic's owner, whose offsets the stream continues from.
+    """
+    owner = partition_map.owner(topic)
+    if owner != BROKER_ID:
+        return redirect_to_owner(owner)
+    if topic not in commit_log.topics():
+        return jsonify({"error": f"Unknown topic '{topic}'"}), 404
+    log = commit_log.topic_log(topic)
+    values = log.latest_values()
+    next_offset = log.next_offset
+    if log.key is None:
+        offset, message = values.get(None, (None, None))
+        return jsonify({"topic": topic, "offset": offset, "message": message, "next_offset": next_offset}), 200
+    if request.args.get("key") is not None:
+        key = request.args["key"]
+        if key not in values:
+            return jsonify({"error": f"No message with {log.key} = '{key}' in '{topic}'"}), 404
+        offset, message = values[key]
+        return jsonify({"topic": topic, "key": key, "offset": offset, "message": message,
+                        "next_offset": next_offset}), 200
+    return jsonify({
+        "topic": topic,
+        "key_field": log.key,
+        "latest": {key: {"offset": offset, "message": message}
+                   for key, (offset, message) in values.items() if key is not None},
+        "next_offset": next_offset,
+    }), 200
+
+@app.route('/sse_stats', methods=['GET'])
+def sse_stats():
+    stats = {}
+    for state in topic_registry.states():
+        clients = state.sse_clients
+        if not clients and not state.dropped:
+            continue  # Topics only known through webhooks or gossip
+        stats[state.topic] = {
+            "policy": SSE_TOPIC_POLICIES.get(state.topic, SSE_DEFAULT_POLICY),
+            "clients": len(clients),
+            "buffer_fill": [round(q.fill(), 3) for q in clients],
+            "dropped_frames": state.dropped + sum(q.dropped for q in clients),
+        }
+    return jsonify(stats), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE), 200
+
+@app.route('/log_levels', methods=['GET', 'POST'])
+def console_log_levels():
+    """
+    Shows or changes console log levels at runtime, e.g.
+    {"subsystem": "gossip", "level": "debug"}; without a subsystem the default
+    level of every subsystem without its own setting changes.
+    """
+    if request.method == 'POST':
+        data = request.get_json(force=True)
+        try:
+            set_level(data.get("level"), data.get("subsystem"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(log_levels()), 200
+
+@app.route('/webhook_stats', methods=['GET'])
+def webhook_stats():
+    return jsonify(webhooks.stats()), 200
 
 @app.route('/ping', methods=['GET'])
 def ping():
     return jsonify({"status": "alive"}), 200   
 
+# --- ASGI Serving Mode ---
+loop_waker = None
+
+
+async def stream_async(scope, receive, send):
+    """
+    Coroutine version of /stream/<topic> used when SERVER_MODE=asgi. Validation,
+    replay and delivery are shared with the threaded view, but an idle client
+    costs a coroutine and its buffer instead of an OS thread blocked in q.get().
+    """
+    global loop_waker
+    if loop_waker is None:
+        loop_waker = LoopWaker(asyncio.get_running_loop())
+
+    topic = scope["path"][len("/stream/"):]
+    with app.request_context(wsgi_environ(scope)):
+        session, error = prepare_stream(topic)
+        if error:
+            response = app.make_response(error)
+    if error:
+        headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": response.get_data()})
+        return
+
+    q = AsyncClientBuffer(loop_waker, SSE_BUFFER_SIZE, session["policy"])
+    live_from = open_stream(session, q)
+    render = stream_renderer(session)
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        q.close()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in stream_headers(session).items()]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        batch = []
+        for entry in replay_stream(session, live_from):
+            batch.append(entry)
+            if len(batch) >= 100:
+                await send({"type": "http.response.body", "body": render(batch), "more_body": True})
+                batch = []
+        if batch:
+            await send({"type": "http.response.body", "body": render(batch), "more_body": True})
+
+        while True:
+            items = await q.get_many()
+            if items is None:
+                if not watcher.done():
+                    sse_log.warning(
+                        "🐢 Disconnecting slow SSE client %s from topic: %s", session["client_ip"], topic, rate=5
+                    )
+                break
+            entries = [item for item in items if item[0] >= live_from]  # (offset, pre-encoded frame, message)
+            if entries:
+                await send({"type": "http.response.body", "body": render(entries), "more_body": True})
+    except OSError:
+        pass  # Client went away while sending
+    finally:
+        watcher.cancel()
+        close_stream(session, q)
+
+
 # --- Start Gossip Background Thread ---
-start_gossip_thread(sse_subscribers, sse_unsubscribed, known_peers)
+start_gossip_thread(subscriber_gossip, known_peers, on_round=gossip_round_seconds.observe,
+                    self_address=BROKER_URLS[BROKER_ID].split("://", 1)[1], fanout=GOSSIP_FANOUT,
+                    min_interval=GOSSIP_MIN_INTERVAL, max_interval=GOSSIP_MAX_INTERVAL, timeout=GOSSIP_TIMEOUT)
+start_anti_entropy_thread(subscriber_gossip, known_peers, interval=ANTI_ENTROPY_INTERVAL, timeout=GOSSIP_TIMEOUT,
+                          self_address=BROKER_URLS[BROKER_ID].split("://", 1)[1], on_repair=anti_entropy_topics.inc)
 
 # --- Main Startup ---
 if __name__ == '__main__':
-    print(f"🚀 Broker {BROKER_ID} running on port 5001...", flush=True)
+    log.info("🚀 Broker %s running on port %s...", BROKER_ID, BROKER_PORT)
 
     def delayed_election():
         time.sleep(5)
         leader_election.start_election()
 
     threading.Thread(target=delayed_election, daemon=True).start()
-    app.run(host='0.0.0.0', port=5001)
+    if SERVER_MODE == "asgi":
+        import uvicorn
+        asgi_app = AsgiBroker(app, {"/stream/": stream_async}, workers=ASGI_WSGI_WORKERS)
+        uvicorn.run(asgi_app, host='0.0.0.0', port=BROKER_PORT, log_level="warning", backlog=ASGI_BACKLOG)
+    else:
+        app.run(host='0.0.0.0', port=BROKER_PORT)
 
@@ -83,15 +83,41 @@ def stream():
     if not leader_url:
         return "❌ Could not get current broker leader.", 503
 
+    # Pass resume position through so the broker can replay missed messages
+    headers = {}
+    if request.headers.get("Last-Event-ID"):
+        headers["Last-Event-ID"] = request.headers["Last-Event-ID"]
+    params = {"from": request.args["from"]} if request.args.get("from") else {}
+    if request.args.get("delta"):
+        params["delta"] = request.args["delta"]  # Changed fields only, applied by the page
+    # Compressed streams are relayed byte for byte, so the broker's deflate
+    # context reaches the browser without being decompressed here
+    compress = request.args.get("compress") == "deflate" and "deflate" in request.headers.get("Accept-Encoding", "")
+    if compress:
+        params["compress"] = "deflate"
+
+    def proxy_compressed():
+        try:
+            with requests.get(f"{leader_url}/stream/{topic}", stream=True, headers=headers, params=params) as r:
+                for chunk in r.raw.stream(None, decode_content=False):
+                    yield chunk
+        except Exception as e:
+            print(f"⚠️ SSE proxy error for '{topic}': {e}", flush=True)
+
     def proxy_sse():
         try:
-            with requests.get(f"{leader_url}/stream/{topic}", stream=True) as r:
+            with requests.get(f"{leader_url}/stream/{topic}", stream=True, headers=headers, params=params) as r:
                 for line in r.iter_lines(decode_unicode=True):
-                    if line.startswith("data:"):
+                    if line.startswith("id:") or line.startswith("event:"):
+                        yield f"{line}\n"
+                    elif line.startswith("data:"):
                         yield f"{line}\n\n"
         except Exception as e:
             yield f"data: {{\"error\": \"SSE proxy error: {str(e)}\"}}\n\n"
 
+    if compress:
+        return Response(stream_with_context(proxy_compressed()), mimetype="text/event-stream",
+                        headers={"Content-Encoding": "deflate"})
     return Response(stream_with_context(proxy_sse()), mimetype="text/event-stream")
 
 if __name__ == '__main__':
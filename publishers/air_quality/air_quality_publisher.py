@@ -21,15 +21,15 @@ KNOWN_BROKERS = {
 
 def get_current_leader():
     """
-    Query all known brokers to determine the current leader.
-    Returns the broker ID of the leader if found, else None.
+    Query all known brokers for the partition map to find the broker leading TOPIC.
+    Returns the broker ID of the topic leader if found, else None.
     """
     for broker_id, broker_url in KNOWN_BROKERS.items():
         try:
             print(f"🔍 Trying {broker_url} for leader info...")
-            res = requests.get(f"http://{broker_url}/get_leader", timeout=2)
+            res = requests.get(f"http://{broker_url}/partitions/{TOPIC}", timeout=2)
             if res.status_code == 200:
-                leader_id = res.json().get("leader_id")
+                leader_id = res.json().get("owner")
                 print(f"📢 Leader ID found via {broker_url}: {leader_id}")
                 return leader_id
         except Exception as e:
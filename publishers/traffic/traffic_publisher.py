@@ -15,16 +15,16 @@ clock = LamportClock()  # Initialize Lamport clock
 
 def get_current_leader():
     """
-    Query all known brokers to determine the current leader.
-    Returns the broker ID of the leader if found, else None.
+    Query all known brokers for the partition map to find the broker leading TOPIC.
+    Returns the broker ID of the topic leader if found, else None.
     """
     for broker_id, broker_url in KNOWN_BROKERS.items():
         try:
             print(f"🔍 Trying {broker_url} for leader info...")
-            # Call each broker's /get_leader endpoint
-            res = requests.get(f"http://{broker_url}/get_leader", timeout=2)
+            # Ask any broker which broker owns this topic
+            res = requests.get(f"http://{broker_url}/partitions/{TOPIC}", timeout=2)
             if res.status_code == 200:
-                leader_id = res.json().get("leader_id")  # Extract leader ID
+                leader_id = res.json().get("owner")  # Extract leader ID
                 print(f"📢 Leader ID found via {broker_url}: {leader_id}")
                 return leader_id
         except Exception as e:
@@ -49,6 +49,7 @@ def publish_traffic():
             "congestion": congestion,
             "accident_reported": random.choice([True, False]),  # Randomly simulate accident
             "location": "Main St",  # Static location for this simulation
+            "timestamp": time.time(),  # Wall-clock time of the event
             "lamport_ts": clock.get_time()  # Logical timestamp
         },
         "priority": priority,  # Include message priority
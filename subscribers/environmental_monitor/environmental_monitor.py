@@ -2,6 +2,7 @@ from flask import Flask
 import requests
 import time
 import threading
+import os
 from utils.lamport_clock import LamportClock
 import json
 
@@ -10,6 +11,10 @@ app = Flask(__name__)
 
 # Topics to subscribe to
 TOPICS = ["weather", "air_quality"]
+# Server-side filters per topic: the broker only sends matching messages (set to "" to receive everything)
+TOPIC_FILTERS = {
+    "air_quality": os.environ.get("AIR_QUALITY_FILTER", "data.pm10 > 80"),
+}
 # Port for this subscriber service
 PORT = 5004
 # Name identifier for this service
@@ -43,6 +48,7 @@ def get_current_leader_url():
 
 # Function to connect to the SSE stream and listen for messages
 def listen_to_stream(topic):
+    last_event_id = None  # Offset of the last message received, used to resume without gaps
     while True:
         # Fetch the latest leader broker
         leader_url = get_current_leader_url()
@@ -53,11 +59,15 @@ def listen_to_stream(topic):
         try:
             url = f"http://{leader_url}/stream/{topic}"
             print(f"🔌 Connecting to SSE stream for topic '{topic}' at {url}")
-            response = requests.get(url, stream=True)
+            headers = {"Last-Event-ID": last_event_id} if last_event_id is not None else {}
+            params = {"filter": TOPIC_FILTERS[topic]} if TOPIC_FILTERS.get(topic) else {}
+            response = requests.get(url, stream=True, headers=headers, params=params)
 
             # Read stream line by line
             for line in response.iter_lines(decode_unicode=True):
-                if line.startswith("data:"):
+                if line.startswith("id:"):
+                    last_event_id = line[len("id:"):].strip()
+                elif line.startswith("data:"):
                     raw_data = line[len("data:"):].strip()
                     try:
                         json_data = json.loads(raw_data)
@@ -1,5 +1,6 @@
 from flask import Flask, jsonify
 import requests
+import json
 import time
 import threading
 
@@ -37,8 +38,27 @@ def get_current_leader_url():
     print("❌ All known brokers unreachable. Retrying soon...")
     return None
 
+# Function to fetch the broker's latest message for a topic, so the view is filled before any new event
+def bootstrap_latest(broker_url, topic):
+    """
+    Returns the offset to resume the stream after, or None if the topic has no history yet.
+    """
+    res = requests.get(f"http://{broker_url}/latest/{topic}", timeout=3)
+    if res.status_code != 200:
+        return None
+    body = res.json()
+    newest = body if body.get("message") is not None else None
+    for entry in body.get("latest", {}).values():  # Keyed topics: newest value per key
+        if newest is None or entry["offset"] > newest["offset"]:
+            newest = entry
+    if newest is not None:
+        latest_data[topic] = json.dumps(newest["message"])
+        print(f"📦 [PUBLIC INTERFACE] Bootstrapped '{topic}' from offset {newest['offset']}", flush=True)
+    return str(body["next_offset"] - 1)
+
 # Function to establish an SSE connection to a topic stream and update local state
 def listen_to_stream(topic):
+    last_event_id = None  # Offset of the last message received, used to resume without gaps
     while True:
         # Get the current leader to connect to
         leader_url = get_current_leader_url()
@@ -47,13 +67,20 @@ def listen_to_stream(topic):
             continue
 
         try:
+            if last_event_id is None:
+                # One cheap request instead of replaying history; the stream continues after it
+                last_event_id = bootstrap_latest(leader_url, topic)
+
             url = f"http://{leader_url}/stream/{topic}"
             print(f"🔌 Connecting to SSE stream for topic '{topic}' at {url}")
-            response = requests.get(url, stream=True)
+            headers = {"Last-Event-ID": last_event_id} if last_event_id is not None else {}
+            response = requests.get(url, stream=True, headers=headers)
 
             # Read Server-Sent Events line by line
             for line in response.iter_lines(decode_unicode=True):
-                if line.startswith("data:"):
+                if line.startswith("id:"):
+                    last_event_id = line[len("id:"):].strip()
+                elif line.startswith("data:"):
                     data = line[len("data:"):].strip()
                     print(f"📥 [PUBLIC INTERFACE] SSE Update for '{topic}': {data}", flush=True)
 
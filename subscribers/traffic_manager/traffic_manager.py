@@ -10,6 +10,10 @@ app = Flask(__name__)
 
 # Topics that this subscriber is interested in
 TOPICS = ["traffic"]
+# Server-side filters per topic: the broker only sends matching messages (set to "" to receive everything)
+TOPIC_FILTERS = {
+    "traffic": os.environ.get("TRAFFIC_FILTER", 'data.congestion == "high" or data.accident_reported'),
+}
 # Port this service runs on
 PORT = 5003
 # Service name for identification/logging
@@ -40,6 +44,7 @@ def get_current_leader_url():
 
 # Function to continuously connect to and listen from SSE stream for a topic
 def listen_to_stream(topic):
+    last_event_id = None  # Offset of the last message received, used to resume without gaps
     while True:
         # Get the current leader's URL
         leader_url = get_current_leader_url()
@@ -51,11 +56,15 @@ def listen_to_stream(topic):
             # Construct the stream endpoint for the topic
             url = f"http://{leader_url}/stream/{topic}"
             print(f"🔌 Connecting to SSE stream for topic '{topic}' at {url}")
-            response = requests.get(url, stream=True)
+            headers = {"Last-Event-ID": last_event_id} if last_event_id is not None else {}
+            params = {"filter": TOPIC_FILTERS[topic]} if TOPIC_FILTERS.get(topic) else {}
+            response = requests.get(url, stream=True, headers=headers, params=params)
 
             # Stream and process each line
             for line in response.iter_lines(decode_unicode=True):
-                if line.startswith("data:"):
+                if line.startswith("id:"):
+                    last_event_id = line[len("id:"):].strip()
+                elif line.startswith("data:"):
                     data = line[len("data:"):].strip()  # Extract message content
                     print(f"📥 [TRAFFIC MANAGER] Received SSE for '{topic}': {data}", flush=True)
         except Exception as e:
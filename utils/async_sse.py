@@ -0,0 +1,174 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.client_buffer import ClientBuffer, DROP_OLDEST
+
+
+class LoopWaker:
+    def __init__(self, loop):
+        """
+        Wakes up coroutines waiting on AsyncClientBuffers from other threads.
+        Wake-ups requested while one is already pending are merged, so a message
+        fanned out to thousands of clients costs a single call into the loop.
+        """
+        self.loop = loop
+        self.pending = set()
+        self.scheduled = False
+        self.lock = threading.Lock()
+
+    def wake(self, buffer):
+        with self.lock:
+            self.pending.add(buffer)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.loop.call_soon_threadsafe(self._run)
+
+    def _run(self):
+        with self.lock:
+            ready, self.pending = self.pending, set()
+            self.scheduled = False
+        for buffer in ready:
+            buffer.event.set()
+
+
+class AsyncClientBuffer(ClientBuffer):
+    def __init__(self, waker, maxsize=100, policy=DROP_OLDEST):
+        """
+        ClientBuffer read by a coroutine instead of a blocked thread. The
+        dispatcher thread still calls put(); the reader awaits get_many().
+        """
+        super().__init__(maxsize, policy)
+        self.waker = waker
+        self.event = asyncio.Event()
+
+    def put(self, frame):
+        delivered = super().put(frame)
+        self.waker.wake(self)   # Also wakes the reader if the put closed the buffer
+        return delivered
+
+    def close(self):
+        super().close()
+        self.waker.wake(self)
+
+    async def get_many(self):
+        """
+        Waits until frames are available and returns all of them.
+
+        Returns:
+            list: The buffered frames, or None once the buffer is closed and drained.
+        """
+        while True:
+            with self.cond:
+                if self.frames:
+                    frames = list(self.frames)
+                    self.frames.clear()
+                    return frames
+                if self.closed:
+                    return None
+                self.event.clear()
+            await self.event.wait()
+
+
+def wsgi_environ(scope, body=b""):
+    """
+    Builds a WSGI environ for an ASGI HTTP scope.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsgiBroker:
+    def __init__(self, wsgi_app, async_routes, workers=32):
+        """
+        ASGI application serving a WSGI app, with selected path prefixes handled
+        by native coroutines instead.
+
+        Every other request runs the WSGI app on a pool of `workers` threads.
+        The response streams back to the event loop as it is produced.
+
+        Args:
+            wsgi_app: The Flask (WSGI) application.
+            async_routes (dict): Path prefix -> async handler(scope, receive, send).
+            workers (int): Threads running WSGI requests.
+        """
+        self.wsgi_app = wsgi_app
+        self.async_routes = async_routes
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        for prefix, handler in self.async_routes.items():
+            if scope["path"].startswith(prefix):
+                return await handler(scope, receive, send)
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._run_wsgi, scope, bytes(body), send, loop)
+
+    def _run_wsgi(self, scope, body, send, loop):
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        result = self.wsgi_app(wsgi_environ(scope, body), start_response)
+        started = False
+        try:
+            for chunk in result:
+                if not started:
+                    emit({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+                    started = True
+                if chunk:
+                    emit({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not started:
+                emit({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+            emit({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
@@ -0,0 +1,84 @@
+import threading
+from collections import deque
+
+# Slow-consumer policies applied when a client's buffer is full
+DROP_OLDEST = "drop_oldest"      # Discard the oldest buffered frame to make room
+COALESCE = "coalesce"            # Collapse the backlog down to the newest frame
+DISCONNECT = "disconnect"        # Close the client's stream
+POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+
+class ClientBuffer:
+    def __init__(self, maxsize=100, policy=DROP_OLDEST):
+        """
+        Bounded, thread-safe frame buffer for a single SSE connection.
+
+        Args:
+            maxsize (int): Maximum number of frames held for this client.
+            policy (str): One of POLICIES, applied when the buffer is full.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: {policy}")
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.frames = deque()
+        self.dropped = 0        # Frames discarded because the client fell behind
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, frame):
+        """
+        Adds a frame, applying the slow-consumer policy if the buffer is full.
+
+        Returns:
+            bool: False if the client is closed and the frame was not buffered.
+        """
+        with self.cond:
+            if self.closed:
+                return False
+            if len(self.frames) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self.frames.popleft()
+                    self.dropped += 1
+                elif self.policy == COALESCE:
+                    self.dropped += len(self.frames)
+                    self.frames.clear()
+                else:
+                    self.dropped += len(self.frames) + 1
+                    self.frames.clear()
+                    self.closed = True
+                    self.cond.notify_all()
+                    return False
+            self.frames.append(frame)
+            self.cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Blocks until a frame is available.
+
+        Returns:
+            The next frame, or None if the buffer was closed (or the timeout expired).
+        """
+        with self.cond:
+            while not self.frames and not self.closed:
+                if not self.cond.wait(timeout):
+                    break
+            if self.frames:
+                return self.frames.popleft()
+            return None
+
+    def close(self):
+        """
+        Closes the buffer and wakes up any reader.
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def fill(self):
+        """
+        Returns the buffer fill ratio between 0.0 and 1.0.
+        """
+        return len(self.frames) / self.maxsize
+
@@ -0,0 +1,783 @@
+import json
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from urllib.parse import quote, unquote
+
+from utils.log_index import SortedIndex
+from utils.logger import get_logger
+
+log = get_logger("commit_log")
+
+INDEX_ENTRY = array("Q").itemsize   # Bytes per index entry (record position in the segment)
+PLACEHOLDER = b"null\n"             # Record left in place of a message removed by compaction
+EPOCHS_FILE = "leader-epochs"       # [epoch, first offset] of every epoch the topic was written in
+
+# Cleanup policies of a topic log
+DELETE = "delete"       # Drop the oldest segments past the retention limits
+COMPACT = "compact"     # Keep only the newest message per key, whatever its age
+CLEANUP_POLICIES = (DELETE, COMPACT)
+
+
+def message_key(message, path):
+    """
+    Extracts a message's key from a dotted field path such as "data.location".
+
+    Returns:
+        str | None: The key, or None if the message has no such field.
+    """
+    value = message
+    for name in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    if value is None:
+        return None
+    return value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+
+
+def epoch_at(epochs, offset):
+    """
+    Looks up the epoch a message was written in from an epoch history.
+
+    Args:
+        epochs (list): [epoch, first offset] pairs in offset order.
+        offset (int): Offset of the message.
+
+    Returns:
+        int: The epoch, 0 for messages written before epochs were recorded.
+    """
+    epoch = 0
+    for entry_epoch, start in epochs:
+        if start > offset:
+            break
+        epoch = entry_epoch
+    return epoch
+
+
+class Segment:
+    def __init__(self, directory, base_offset):
+        """
+        One append-only segment of a topic log.
+
+        Files:
+            <base_offset>.log    Newline-delimited JSON records.
+            <base_offset>.index  Byte position of every record in the .log file.
+
+        Args:
+            directory (str): Directory of the topic log.
+            base_offset (int): Offset of the first record in this segment.
+        """
+        self.base_offset = base_offset
+        self.log_path = os.path.join(directory, f"{base_offset:020d}.log")
+        self.index_path = os.path.join(directory, f"{base_offset:020d}.index")
+        self.positions = array("Q")
+        self.size = 0
+        self.created = time.time()
+        self.mm = None
+        self.mapped_size = 0
+        self.log_file = None
+        self.index_file = None
+        self._load()
+
+    def _load(self):
+        """
+        Loads an existing segment, rebuilding any index entries missing after a crash
+        and dropping a partially written trailing record.
+        """
+        if os.path.exists(self.log_path):
+            self.size = os.path.getsize(self.log_path)
+            self.created = os.path.getmtime(self.log_path)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                raw = f.read()
+            self.positions.frombytes(raw[:len(raw) - len(raw) % INDEX_ENTRY])
+        while self.positions and self.positions[-1] >= self.size:
+            self.positions.pop()
+
+        # Scan the tail of the log for records that are not indexed yet
+        with open(self.log_path, "a+b") as f:
+            pos = 0
+            if self.positions:
+                f.seek(self.positions[-1])
+                last = f.readline()
+                if last.endswith(b"\n"):
+                    pos = self.positions[-1] + len(last)
+                else:
+                    pos = self.positions.pop()
+            f.seek(pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.positions.append(pos)
+                pos += len(line)
+            if pos != self.size:
+                f.truncate(pos)
+                self.size = pos
+
+        with open(self.index_path, "wb") as f:
+            f.write(self.positions.tobytes())
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def next_offset(self):
+        return self.base_offset + len(self.positions)
+
+    def append(self, record, fsync=False):
+        """
+        Appends an encoded record (bytes ending in a newline).
+        """
+        if self.log_file is None:
+            self.log_file = open(self.log_path, "ab")
+            self.index_file = open(self.index_path, "ab")
+        self.log_file.write(record)
+        self.log_file.flush()
+        self.index_file.write(array("Q", [self.size]).tobytes())
+        self.index_file.flush()
+        if fsync:
+            os.fsync(self.log_file.fileno())
+        self.positions.append(self.size)
+        self.size += len(record)
+
+    def read(self, start, stop):
+        """
+        Reads records [start, stop) of this segment (relative positions) through a
+        memory map of the segment file.
+
+        Returns:
+            list: Decoded messages; None for records removed by compaction.
+        """
+        if start >= stop:
+            return []
+        if self.mm is None or self.mapped_size < self.size:
+            # The active segment grows, so remap once reads go past the mapped size
+            if self.mm is not None:
+                self.mm.close()
+            with open(self.log_path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+            self.mapped_size = self.size
+        ends = list(self.positions[start + 1:stop + 1])
+        if len(ends) < stop - start:
+            ends.append(self.size)
+        return [json.loads(self.mm[pos:end]) for pos, end in zip(self.positions[start:stop], ends)]
+
+    def truncate(self, count):
+        """
+        Drops every record from relative position `count` on.
+        """
+        if count >= len(self.positions):
+            return
+        self.seal()
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+            self.mapped_size = 0
+        size = self.positions[count]
+        with open(self.log_path, "r+b") as f:
+            f.truncate(size)
+        with open(self.index_path, "r+b") as f:
+            f.truncate(count * INDEX_ENTRY)
+        del self.positions[count:]
+        self.size = size
+
+    def write_compacted(self, blank, positions, size):
+        """
+        Writes a copy of this sealed segment, as it was when `positions` and
+        `size` were taken, with the records at the relative positions in
+        `blank` replaced by placeholders, so every other record keeps its
+        offset. The copy is written aside (and fsynced) without touching the
+        segment; swap_compacted() puts it in place.
+
+        Returns:
+            tuple: (record positions, size) of the copy.
+        """
+        with open(self.log_path, "rb") as f:
+            data = f.read(size)
+        ends = list(positions[1:]) + [size]
+        out = bytearray()
+        new_positions = array("Q")
+        for i, (pos, end) in enumerate(zip(positions, ends)):
+            new_positions.append(len(out))
+            out += PLACEHOLDER if i in blank else data[pos:end]
+        for path, content in ((self.log_path, out), (self.index_path, new_positions.tobytes())):
+            with open(path + ".compacting", "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+        return new_positions, len(out)
+
+    def swap_compacted(self, positions, size):
+        """
+        Atomically replaces the segment files with the copy write_compacted() made.
+        """
+        for path in (self.log_path, self.index_path):
+            os.replace(path + ".compacting", path)
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.positions = positions
+        self.size = size
+        self.mapped_size = 0
+
+    def discard_compacted(self):
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path + ".compacting"):
+                os.remove(path + ".compacting")
+
+    def seal(self):
+        """
+        Closes the append handles once the segment is no longer active.
+        """
+        if self.log_file is not None:
+            self.log_file.close()
+            self.index_file.close()
+            self.log_file = self.index_file = None
+
+    def delete(self):
+        """
+        Closes and removes the segment files.
+        """
+        self.seal()
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class TopicLog:
+    def __init__(self, directory, segment_bytes, segment_ms, retention_bytes, retention_ms, fsync=False,
+                 key=None, cleanup=DELETE, compactor=None):
+        """
+        Segmented append-only log of a single topic.
+
+        The newest message of every key is kept in memory as the topic's
+        latest-value cache (without a key, just the newest message). With the
+        compact cleanup policy, sealed segments are rewritten without the
+        messages a newer one of the same key superseded, and segments are never
+        deleted for age or size, so the log always holds every key's latest value.
+        Compaction runs on a Compactor thread, not on the appending one.
+
+        Every message is written in an epoch (the partition map epoch of the
+        broker that appended it); the log records where each epoch starts, so
+        two replicas can find the first offset where their logs differ.
+
+        Args:
+            directory (str): Directory holding this topic's segments.
+            segment_bytes (int): Roll over to a new segment past this size.
+            segment_ms (int): Roll over to a new segment past this age (0 disables).
+            retention_bytes (int): Delete oldest segments past this total size (0 disables).
+            retention_ms (int): Delete segments not written to within this time (0 disables).
+            fsync (bool): fsync every append for durability across power loss.
+            key (str): Dotted path of the field keying messages, e.g. "data.location".
+            cleanup (str): DELETE or COMPACT.
+            compactor (Compactor): Background compaction thread, shared by the
+                topic logs of a CommitLog; a new one by default.
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_ms = segment_ms
+        self.retention_bytes = retention_bytes
+        self.retention_ms = retention_ms
+        self.fsync = fsync
+        self.key = key
+        self.cleanup = cleanup
+        self.latest = {}            # key -> (offset, message) of the newest message with that key
+        self.superseded = set()     # Offsets of messages a newer one replaced, not compacted yet
+        self.min_epoch = 0          # append() refuses messages of older epochs (see fence())
+        self.compactor = compactor or Compactor()
+        self.truncations = 0        # Bumped by every truncation, so compaction can tell its plan is stale
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        base_offsets = sorted(
+            int(name[:-len(".log")]) for name in os.listdir(directory) if name.endswith(".log")
+        )
+        self.segments = [Segment(directory, base) for base in base_offsets]
+        if not self.segments:
+            self.segments.append(Segment(directory, 0))
+
+        self.epochs_path = os.path.join(directory, EPOCHS_FILE)
+        self.epochs = []
+        if os.path.exists(self.epochs_path):
+            with open(self.epochs_path) as f:
+                # Epochs past the end were recorded for messages lost in a crash
+                self.epochs = [entry for entry in json.load(f) if entry[1] < self.next_offset]
+
+        self._reindex()
+        if self.cleanup == COMPACT:
+            self.compact()
+
+    def _reindex(self):
+        """
+        Rebuilds the secondary indexes for time and Lamport range queries and
+        the latest-value cache from disk.
+        """
+        self.indexes = {field: SortedIndex(field) for field in ("timestamp", "lamport_ts")}
+        self.latest = {}
+        self.superseded = set()
+        for segment in self.segments:
+            for position, message in enumerate(segment.read(0, len(segment))):
+                if message is not None:
+                    self._index(segment.base_offset + position, message)
+
+    def _index(self, offset, message):
+        for index in self.indexes.values():
+            index.add(offset, message)
+        key = message_key(message, self.key) if self.key else None
+        previous = self.latest.get(key)
+        if previous is not None and previous[0] < offset and self.cleanup == COMPACT:
+            self.superseded.add(previous[0])
+        if previous is None or previous[0] < offset:
+            self.latest[key] = (offset, message)
+
+    @property
+    def start_offset(self):
+        """Offset of the oldest retained message."""
+        return self.segments[0].base_offset
+
+    @property
+    def next_offset(self):
+        """Offset the next appended message will get."""
+        return self.segments[-1].next_offset
+
+    def epoch_history(self):
+        """
+        Returns:
+            list: [epoch, first offset] of every epoch with retained messages.
+        """
+        with self.lock:
+            return [list(entry) for entry in self.epochs]
+
+    def epoch_at(self, offset):
+        with self.lock:
+            return epoch_at(self.epochs, offset)
+
+    def divergence(self, epochs, next_offset):
+        """
+        Compares another replica of this log, described by its epoch history
+        and next offset, with this one. Two logs hold the same message at an
+        offset if both wrote it in the same epoch, and epochs can only differ
+        from where one of them starts, so only those offsets are compared.
+
+        Returns:
+            int: The first offset where the other log differs from this one,
+            or the end of the shorter log if one is a prefix of the other.
+        """
+        with self.lock:
+            end = min(next_offset, self.next_offset)
+            starts = {0} | {start for _, start in self.epochs} | {start for _, start in epochs}
+            for offset in sorted(starts):
+                if offset >= end:
+                    break
+                if epoch_at(self.epochs, offset) != epoch_at(epochs, offset):
+                    return offset
+            return end
+
+    def append(self, message, epoch=0):
+        """
+        Appends a message to the active segment.
+
+        Returns:
+            int | None: Offset assigned to the message, or None if `epoch` is
+            older than the log's fence.
+        """
+        record = json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.lock:
+            if epoch < self.min_epoch:
+                return None
+            return self._append(record, message, self.segments[-1].next_offset, epoch)
+
+    def fence(self, epoch):
+        """
+        Refuses further appends of messages written in epochs before `epoch`.
+        Takes the lock, so every append it lets through is complete and
+        visible to reads once it returns.
+        """
+        with self.lock:
+            self.min_epoch = max(self.min_epoch, epoch)
+
+    def append_at(self, offset, message, epoch=0):
+        """
+        Appends a message at an offset chosen by the leader (replication).
+        An offset already present with the same epoch holds the same message
+        and is skipped; one written in another epoch holds a message the
+        leader does not have, so the log is truncated there first. A gap
+        starts a new segment at `offset`.
+
+        Returns:
+            int: The offset, or None if the log already contains it.
+        """
+        record = json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.lock:
+            if offset < self.next_offset:
+                if offset < self.start_offset or epoch_at(self.epochs, offset) == epoch:
+                    return None
+                self._truncate(offset)
+            return self._append(record, message, offset, epoch)
+
+    def truncate(self, offset):
+        """
+        Drops every message at or after `offset`.
+        """
+        with self.lock:
+            self._truncate(offset)
+
+    def _truncate(self, offset):
+        """
+        Must be called with the lock held. Indexes and the latest-value cache
+        are rebuilt from disk; truncation only happens when a replica diverged
+        from the topic's leader, so it is rare.
+        """
+        if offset >= self.next_offset:
+            return
+        self.truncations += 1
+        while len(self.segments) > 1 and self.segments[-1].base_offset >= offset:
+            self.segments.pop().delete()
+        active = self.segments[-1]
+        if active.base_offset >= offset:
+            active.delete()
+            self.segments[-1] = Segment(self.directory, offset)
+        else:
+            active.truncate(offset - active.base_offset)
+        self.epochs = [entry for entry in self.epochs if entry[1] < offset]
+        self._save_epochs()
+        self._reindex()
+
+    def _append(self, record, message, offset, epoch):
+        """
+        Writes an encoded record at `offset`, rolling over to a new segment when
+        the active one is full, too old or does not end right before `offset`.
+        Must be called with the lock held.
+        """
+        active = self.segments[-1]
+        if offset != active.next_offset or (len(active) and self._should_roll(active)):
+            if len(active):
+                active.seal()
+            else:
+                active.delete()
+                self.segments.pop()
+            active = Segment(self.directory, offset)
+            self.segments.append(active)
+            if self.cleanup == COMPACT:
+                self.compactor.schedule(self)
+            else:
+                self._apply_retention()
+        active.append(record, self.fsync)
+        self._index(offset, message)
+        if epoch != (self.epochs[-1][0] if self.epochs else 0):
+            self.epochs.append([epoch, offset])
+            self._save_epochs()
+        return offset
+
+    def _save_epochs(self):
+        with open(self.epochs_path + ".tmp", "w") as f:
+            json.dump(self.epochs, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(self.epochs_path + ".tmp", self.epochs_path)
+
+    def _prune_epochs(self):
+        """
+        Forgets epochs that ended before the oldest retained message.
+        """
+        first = 0
+        while first + 1 < len(self.epochs) and self.epochs[first + 1][1] <= self.start_offset:
+            first += 1
+        if first:
+            del self.epochs[:first]
+            self._save_epochs()
+
+    def _should_roll(self, segment):
+        if segment.size >= self.segment_bytes:
+            return True
+        return bool(self.segment_ms) and (time.time() - segment.created) * 1000 >= self.segment_ms
+
+    def _apply_retention(self):
+        """
+        Deletes the oldest sealed segments that fall outside the retention limits.
+        """
+        now = time.time()
+        total = sum(segment.size for segment in self.segments)
+        deleted = False
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            too_big = self.retention_bytes and total > self.retention_bytes
+            too_old = self.retention_ms and (now - os.path.getmtime(oldest.log_path)) * 1000 > self.retention_ms
+            if not (too_big or too_old):
+                break
+            total -= oldest.size
+            oldest.delete()
+            self.segments.pop(0)
+            deleted = True
+        if deleted:
+            for index in self.indexes.values():
+                index.prune(self.start_offset)
+            self._prune_epochs()
+
+    def compact(self):
+        """
+        Rewrites the sealed segments holding superseded messages and deletes
+        sealed segments left with no message at all. Only offsets recorded in
+        `superseded` are touched, so segments without changes are not read.
+
+        The lock is only held to pick the segments and to swap the rewritten
+        copies in: reading, rewriting and fsyncing happen outside it, so
+        appends and reads continue meanwhile. A segment truncated or deleted
+        in between is left for the next compaction.
+        """
+        with self.lock:
+            truncations = self.truncations
+            plan = []
+            for segment in self.segments[:-1]:
+                blank = {
+                    offset - segment.base_offset for offset in self.superseded
+                    if segment.base_offset <= offset < segment.next_offset
+                }
+                if blank:
+                    plan.append((segment, blank, array("Q", segment.positions), segment.size))
+
+        copies = []
+        for segment, blank, positions, size in plan:
+            copies.append((segment, blank) + segment.write_compacted(blank, positions, size))
+
+        with self.lock:
+            live = {offset for offset, _ in self.latest.values()}
+            deleted = set()
+            for segment, blank, new_positions, new_size in copies:
+                if self.truncations != truncations or segment not in self.segments[:-1]:
+                    segment.discard_compacted()
+                    continue
+                segment.swap_compacted(new_positions, new_size)
+                self.superseded.difference_update(segment.base_offset + p for p in blank)
+                if not any(segment.base_offset <= offset < segment.next_offset for offset in live):
+                    self.superseded.difference_update(range(segment.base_offset, segment.next_offset))
+                    segment.delete()
+                    deleted.add(segment)
+            if deleted:
+                self.segments = [segment for segment in self.segments if segment not in deleted]
+                for index in self.indexes.values():
+                    index.prune(self.start_offset)
+                self._prune_epochs()
+
+    def latest_values(self):
+        """
+        Returns:
+            dict: key -> (offset, message) of the newest message per key; the key
+            is None for a topic without a key field.
+        """
+        with self.lock:
+            return dict(self.latest)
+
+    def read(self, from_offset, limit):
+        """
+        Reads the messages in offsets [from_offset, from_offset + limit). Offsets
+        removed by compaction are skipped, so fewer than `limit` may be returned.
+
+        Returns:
+            list: (offset, message) tuples in offset order.
+        """
+        with self.lock:
+            from_offset = max(from_offset, self.start_offset)
+            stop_offset = min(from_offset + limit, self.next_offset)
+            result = []
+            for segment in self.segments:
+                if segment.next_offset <= from_offset or segment.base_offset >= stop_offset:
+                    continue
+                start = max(from_offset, segment.base_offset) - segment.base_offset
+                stop = min(stop_offset, segment.next_offset) - segment.base_offset
+                messages = segment.read(start, stop)
+                result.extend(
+                    (offset, message)
+                    for offset, message in zip(range(segment.base_offset + start, segment.base_offset + stop), messages)
+                    if message is not None
+                )
+            return result
+
+    def read_latest(self, limit):
+        """
+        Reads the newest `limit` messages.
+        """
+        return self.read(max(self.start_offset, self.next_offset - limit), limit)
+
+    def read_offsets(self, offsets):
+        """
+        Reads the messages at the given ascending offsets, skipping offsets that
+        are no longer retained.
+
+        Returns:
+            list: (offset, message) tuples.
+        """
+        result = []
+        with self.lock:
+            base_offsets = [segment.base_offset for segment in self.segments]
+            i = 0
+            while i < len(offsets):
+                # Group consecutive offsets of the same segment into one read
+                segment = self.segments[max(0, bisect_right(base_offsets, offsets[i]) - 1)]
+                j = i + 1
+                while (j < len(offsets) and offsets[j] == offsets[j - 1] + 1
+                       and offsets[j] < segment.next_offset):
+                    j += 1
+                start = offsets[i] - segment.base_offset
+                if 0 <= start and offsets[j - 1] < segment.next_offset:
+                    messages = segment.read(start, start + j - i)
+                    result.extend(pair for pair in zip(offsets[i:j], messages) if pair[1] is not None)
+                i = j
+        return result
+
+    def query(self, from_offset=None, limit=1000, since=None, until=None,
+              min_lamport=None, max_lamport=None, chunk=100):
+        """
+        Lazily yields (offset, message) tuples in offset order.
+
+        Without `from_offset` the newest `limit` matching messages are returned;
+        with it, the first `limit` matching messages at or after that offset.
+        Time (`timestamp` field) and Lamport bounds are inclusive and resolved
+        through the sorted indexes, so no unrelated messages are read.
+        """
+        filters = []
+        with self.lock:
+            if since is not None or until is not None:
+                filters.append(self.indexes["timestamp"].range(since, until))
+            if min_lamport is not None or max_lamport is not None:
+                filters.append(self.indexes["lamport_ts"].range(min_lamport, max_lamport))
+            start_offset, next_offset = self.start_offset, self.next_offset
+
+        if not filters:
+            if from_offset is None:
+                from_offset = max(start_offset, next_offset - limit)
+            position, remaining = max(from_offset, start_offset), limit
+            while remaining > 0 and position < next_offset:
+                step = min(chunk, remaining)
+                batch = self.read(position, step)
+                yield from batch
+                # Compacted offsets leave gaps, so an empty batch does not mean the end
+                position = max(position + step, batch[-1][0] + 1 if batch else 0)
+                remaining -= len(batch)
+            return
+
+        matches = set(filters[0]).intersection(*filters[1:])
+        lowest = start_offset if from_offset is None else max(from_offset, start_offset)
+        offsets = sorted(offset for offset in matches if offset >= lowest)
+        offsets = offsets[-limit:] if from_offset is None else offsets[:limit]
+        for i in range(0, len(offsets), chunk):
+            yield from self.read_offsets(offsets[i:i + chunk])
+
+
+class Compactor:
+    def __init__(self):
+        """
+        Background thread compacting topic logs (TopicLog.compact()) one at a
+        time, so rewriting and fsyncing segments never happens on the thread
+        that rolled them over. Started on first use.
+        """
+        self.pending = []           # Topic logs waiting for compaction, oldest request first
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def schedule(self, topic_log):
+        with self.cond:
+            if topic_log not in self.pending:
+                self.pending.append(topic_log)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                topic_log = self.pending.pop(0)
+            try:
+                topic_log.compact()
+            except Exception as e:
+                log.error("❌ Compaction of %s failed: %s", topic_log.directory, e)
+
+
+class CommitLog:
+    def __init__(self, directory, segment_bytes=1024 * 1024, segment_ms=0,
+                 retention_bytes=64 * 1024 * 1024, retention_ms=0, fsync=False,
+                 topic_keys=None, topic_cleanup=None):
+        """
+        Per-topic segmented commit logs stored under `directory`.
+        Existing topic logs are reopened, so history survives broker restarts.
+
+        Args:
+            topic_keys (dict): topic -> dotted path of the field keying its messages.
+            topic_cleanup (dict): topic -> cleanup policy (DELETE by default).
+        """
+        self.directory = directory
+        self.options = dict(segment_bytes=segment_bytes, segment_ms=segment_ms,
+                            retention_bytes=retention_bytes, retention_ms=retention_ms, fsync=fsync)
+        self.topic_keys = topic_keys or {}
+        self.topic_cleanup = topic_cleanup or {}
+        self.topic_logs = {}
+        self.min_epoch = 0
+        self.compactor = Compactor()
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if os.path.isdir(os.path.join(directory, name)):
+                self.topic_log(unquote(name))
+
+    def topic_log(self, topic):
+        """
+        Returns the TopicLog of a topic, creating it on first use.
+        """
+        log = self.topic_logs.get(topic)
+        if log is None:
+            with self.lock:
+                log = self.topic_logs.get(topic)
+                if log is None:
+                    path = os.path.join(self.directory, quote(topic, safe=""))
+                    log = TopicLog(
+                        path, key=self.topic_keys.get(topic), cleanup=self.topic_cleanup.get(topic, DELETE),
+                        compactor=self.compactor, **self.options
+                    )
+                    log.fence(self.min_epoch)
+                    self.topic_logs[topic] = log
+        return log
+
+    def topics(self):
+        return list(self.topic_logs)
+
+    def fence(self, epoch):
+        """
+        Fences every topic log, including ones created later, at `epoch`: a
+        broker that adopted a newer partition map no longer appends messages
+        it accepted under an older one, whether or not it still owns their topic.
+        """
+        with self.lock:
+            self.min_epoch = max(self.min_epoch, epoch)
+            logs = list(self.topic_logs.values())
+        for log in logs:
+            log.fence(epoch)
+
+    def append(self, topic, message, epoch=0):
+        return self.topic_log(topic).append(message, epoch)
+
+    def read(self, topic, from_offset, limit):
+        if topic not in self.topic_logs:
+            return []
+        return self.topic_log(topic).read(from_offset, limit)
+
+    def read_latest(self, topic, limit):
+        if topic not in self.topic_logs:
+            return []
+        return self.topic_log(topic).read_latest(limit)
+
+    def query(self, topic, **criteria):
+        if topic not in self.topic_logs:
+            return iter(())
+        return self.topic_log(topic).query(**criteria)
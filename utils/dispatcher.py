@@ -0,0 +1,102 @@
+import threading
+from collections import defaultdict, deque
+
+from utils.logger import get_logger
+
+log = get_logger("dispatcher")
+
+PRIORITIES = ("high", "low")
+
+
+class PriorityDispatcher:
+    def __init__(self, deliver):
+        """
+        Background dispatcher that owns the per-topic priority queues.
+
+        Args:
+            deliver (function): Called as deliver(topic, message, ack) from the dispatcher
+                thread for every message, high priority first.
+        """
+        self.deliver = deliver
+        self.message_queues = defaultdict(lambda: {"high": deque(), "low": deque()})
+        # Topics in arrival order, one entry per queued message, so that the
+        # dispatcher can pick the next message across all topics in O(1).
+        self.pending = {level: deque() for level in PRIORITIES}
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def submit(self, topic, priority, message, ack=None):
+        """
+        Enqueues a message for delivery and returns immediately.
+
+        Args:
+            topic (str): Topic the message was published to.
+            priority (str): "high" or "low".
+            message (dict): The published message.
+            ack: Optional completion handle passed through to deliver().
+        """
+        with self.cond:
+            self.message_queues[topic][priority].append((message, ack))
+            self.pending[priority].append(topic)
+            self.cond.notify()
+
+    def submit_many(self, items):
+        """
+        Enqueues several messages atomically, so the dispatcher never observes
+        a partially enqueued batch.
+
+        Args:
+            items (list): (topic, priority, message, ack) tuples, in publish order.
+        """
+        with self.cond:
+            for topic, priority, message, ack in items:
+                self.message_queues[topic][priority].append((message, ack))
+                self.pending[priority].append(topic)
+            self.cond.notify()
+
+    def next_message(self):
+        """
+        Blocks until a message is available and pops it, draining every
+        high priority message (across all topics) before any low priority one.
+
+        Returns:
+            tuple: (topic, priority, message, ack)
+        """
+        with self.cond:
+            while not self.pending["high"] and not self.pending["low"]:
+                self.cond.wait()
+            priority = "high" if self.pending["high"] else "low"
+            topic = self.pending[priority].popleft()
+            message, ack = self.message_queues[topic][priority].popleft()
+            return topic, priority, message, ack
+
+    def depth(self, topic=None):
+        """
+        Returns the number of queued messages, for one topic or overall.
+        """
+        with self.cond:
+            if topic is None:
+                return len(self.pending["high"]) + len(self.pending["low"])
+            queues = self.message_queues.get(topic)
+            if not queues:
+                return 0
+            return len(queues["high"]) + len(queues["low"])
+
+    def start(self):
+        """
+        Starts the dispatcher thread. A single thread keeps per-topic delivery
+        order identical to publish order within each priority level.
+        """
+        def dispatch_loop():
+            log.info("🧵 Dispatcher thread started")
+            while True:
+                topic, priority, message, ack = self.next_message()
+                try:
+                    self.deliver(topic, message, ack)
+                except Exception as e:
+                    log.error("❌ Dispatch of '%s' (%s) message failed: %s", topic, priority, e, rate=5)
+                    if ack is not None:
+                        ack.fail(f"Dispatch failed: {e}", 500)   # Report it now rather than as an ack timeout
+
+        self.thread = threading.Thread(target=dispatch_loop, daemon=True)
+        self.thread.start()
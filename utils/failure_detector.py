@@ -0,0 +1,90 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class PhiAccrualDetector:
+    def __init__(self, threshold=8.0, window=100, min_std=0.05, acceptable_pause=0.3, first_interval=0.5):
+        """
+        Phi-accrual failure detector (Hayashibara et al.) for one monitored node.
+
+        Instead of a fixed timeout it keeps a window of recent heartbeat
+        intervals and turns the time since the last heartbeat into a suspicion
+        level phi = -log10(P(a heartbeat arrives this late)). phi 1 means
+        about a 10% chance the node is still alive, phi 8 about 1e-8, so the
+        threshold adapts to the observed interval and jitter of the link.
+
+        Args:
+            threshold (float): phi above which the node is suspected.
+            window (int): Heartbeat intervals kept.
+            min_std (float): Floor on the interval standard deviation, in
+                seconds, so a very regular link does not make phi spike on
+                the first slightly late heartbeat.
+            acceptable_pause (float): Seconds of silence tolerated on top of
+                the usual interval (e.g. a GC pause on the sender).
+            first_interval (float): Expected interval until real ones are measured.
+        """
+        self.threshold = threshold
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.first_interval = first_interval
+        self.intervals = deque(maxlen=max(2, window))
+        self.last = None
+        self.heartbeats = 0
+        self.lock = threading.Lock()
+
+    def reset(self, now=None):
+        """
+        Starts monitoring afresh, e.g. for a new leader: history is dropped
+        and the clock starts now, so a node that never sends a heartbeat
+        becomes suspected too.
+        """
+        with self.lock:
+            self._seed()
+            self.last = time.monotonic() if now is None else now
+            self.heartbeats = 0
+
+    def heartbeat(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.last is None:
+                self._seed()
+            else:
+                self.intervals.append(now - self.last)
+            self.last = now
+            self.heartbeats += 1
+
+    def _seed(self):
+        # Start from the expected interval, as if two heartbeats around it had been seen
+        self.intervals.clear()
+        self.intervals.extend([self.first_interval * 0.75, self.first_interval * 1.25])
+
+    def phi(self, now=None):
+        """
+        Returns:
+            float: The suspicion level, 0 if nothing is monitored yet.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.last is None:
+                return 0.0
+            elapsed = now - self.last
+            n = len(self.intervals)
+            mean = sum(self.intervals) / n
+            std = max(self.min_std, math.sqrt(sum((i - mean) ** 2 for i in self.intervals) / n))
+        return _phi(elapsed, mean + self.acceptable_pause, std)
+
+    def suspected(self, now=None):
+        return self.phi(now) > self.threshold
+
+
+def _phi(elapsed, mean, std):
+    """
+    -log10 of the probability that a normally distributed interval exceeds
+    `elapsed`, using the logistic approximation of the normal CDF (as in Akka).
+    """
+    y = (elapsed - mean) / std
+    t = -y * (1.5976 + 0.070566 * y * y)       # ln of e in -log10(e / (1 + e)), computed in log space
+    softplus = t + math.log1p(math.exp(-t)) if t > 0 else math.log1p(math.exp(t))
+    return (softplus - t) / math.log(10)
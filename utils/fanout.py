@@ -0,0 +1,46 @@
+import json
+
+from utils.logger import get_logger
+
+log = get_logger("sse")
+
+
+def encode_sse_frame(message, event_id=None):
+    """
+    Serializes a message exactly once into a complete SSE frame.
+
+    Args:
+        message (dict): The published message.
+        event_id (int): Optional topic offset, sent as the SSE `id:` field so
+            clients can resume with Last-Event-ID.
+
+    Returns:
+        bytes: Immutable `data: ...\\n\\n` frame shared by every client of the topic.
+    """
+    payload = json.dumps(message, separators=(",", ":"), sort_keys=True)
+    if event_id is None:
+        return f"data: {payload}\n\n".encode("utf-8")
+    return f"id: {event_id}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def fan_out(frame, client_queues):
+    """
+    Hands the same encoded frame to every client queue.
+
+    Args:
+        frame: Frame produced by encode_sse_frame(), optionally wrapped with its offset
+            (and message) as a tuple.
+        client_queues (list): Per-client buffers of a topic.
+
+    Returns:
+        int: Number of buffers the frame could not be delivered to.
+    """
+    failed = 0
+    for q in client_queues:
+        try:
+            if q.put(frame) is False:
+                failed += 1  # Client was disconnected by its slow-consumer policy
+        except Exception as e:
+            failed += 1
+            log.error("❌ Failed to send SSE to client: %s", e, rate=5)
+    return failed
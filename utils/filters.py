@@ -0,0 +1,157 @@
+import ast
+import operator
+from functools import lru_cache
+
+_MISSING = object()
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+
+class MessageFilter:
+    def __init__(self, expression, predicate, key):
+        """
+        A compiled filter expression. Calling it with a message returns True if
+        the message should be delivered.
+
+        Attributes:
+            expression (str): The expression as given by the subscriber.
+            key (str): Canonical form of the expression; filters that only differ
+                in whitespace or parentheses share the same key.
+        """
+        self.expression = expression
+        self.predicate = predicate
+        self.key = key
+
+    def __call__(self, message):
+        return bool(self.predicate(message))
+
+
+def _field(path):
+    def get(message):
+        value = message
+        for name in path:
+            if isinstance(value, dict):
+                value = value.get(name, _MISSING)
+            elif isinstance(value, list) and isinstance(name, int) and -len(value) <= name < len(value):
+                value = value[name]
+            else:
+                return None
+            if value is _MISSING:
+                return None
+        return value
+    return get
+
+
+def _compare(op, left, right):
+    def compare(message):
+        try:
+            return op(left(message), right(message))
+        except TypeError:
+            return False  # e.g. None > 80 for a missing field, or a string compared with a number
+    return compare
+
+
+def _compile(node):
+    """
+    Turns an expression AST into nested closures. Only field access, literals,
+    comparisons and boolean operators are accepted; nothing is ever evaluated
+    with eval().
+    """
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda message: all(part(message) for part in parts)
+        return lambda message: any(part(message) for part in parts)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile(node.operand)
+        return lambda message: not operand(message)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        if not isinstance(node.operand.value, (int, float)) or isinstance(node.operand.value, bool):
+            raise ValueError(f"Unary minus needs a number, not {node.operand.value!r}")
+        value = -node.operand.value
+        return lambda message: value
+
+    if isinstance(node, ast.Compare):
+        comparisons = []
+        left = _compile(node.left)
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARISONS:
+                raise ValueError(f"Unsupported operator: {type(op).__name__}")
+            right = _compile(comparator)
+            comparisons.append(_compare(_COMPARISONS[type(op)], left, right))
+            left = right
+        return lambda message: all(compare(message) for compare in comparisons)
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda message: value
+
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        if not all(isinstance(element, ast.Constant) for element in node.elts):
+            raise ValueError("Lists in filters may only contain literals")
+        values = frozenset(element.value for element in node.elts)
+        return lambda message: values
+
+    if isinstance(node, (ast.Name, ast.Attribute, ast.Subscript)):
+        path = []
+        while not isinstance(node, ast.Name):
+            if isinstance(node, ast.Attribute):
+                path.append(node.attr)
+                node = node.value
+            elif isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant):
+                path.append(node.slice.value)
+                node = node.value
+            else:
+                raise ValueError("Field names may only be indexed with literals")
+        path.append(node.id)
+        return _field(tuple(reversed(path)))
+
+    raise ValueError(f"Unsupported expression: {type(node).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compile_filter(expression):
+    """
+    Compiles a filter expression over a message, such as
+    `data.congestion == "high" or data.accident_reported` or `data.pm10 > 80`.
+
+    Fields are addressed with dots (or ["key"] for names that are not
+    identifiers) starting from the top level of the published message;
+    missing fields read as None. Supported: ==, !=, <, <=, >, >=, in,
+    not in, and, or, not, and string/number/boolean/None literals and lists
+    of them. Compilation is cached, so repeated subscriptions are free.
+
+    Raises:
+        ValueError: If the expression is malformed or uses anything else.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid filter expression: {e.msg}") from None
+    return MessageFilter(expression, _compile(tree.body), ast.dump(tree.body))
+
+
+class FilterGroup:
+    def __init__(self, message_filter=None, encoding=None):
+        """
+        The clients of one subscription pattern that share the same filter and
+        stream encoding. The filter runs once per message for the whole group,
+        so its cost does not grow with the number of clients.
+        """
+        self.filter = message_filter
+        self.encoding = encoding
+        self.clients = ()       # Copy-on-write: replaced, never mutated, while fan-out reads it
+
+    def accepts(self, message):
+        return self.filter is None or self.filter(message)
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.wire import MSGPACK, msgpack_available, pack
+
+# Per-message statuses in a /publish/batch response -> HTTP status of the equivalent single publish
+MESSAGE_STATUS_CODES = {"accepted": 200, "rejected": 400, "failed": 500, "unavailable": 503, "timeout": 504}
+
+
+class LeaderForwarder:
+    def __init__(self, senders=4, max_batch=100, timeout=2.0, headers=None, on_batch=None):
+        """
+        Forwards messages published on one broker to the broker leading their topic.
+
+        Concurrent forwards are coalesced: every sender thread takes the messages
+        queued so far for one destination (up to `max_batch`) and POSTs them to
+        that broker's /publish/batch endpoint in one request. Several senders
+        keep batches pipelined over a pooled keep-alive session, so a quiet
+        broker adds no batching delay and a busy one sends few, large requests.
+        Batches are sent as MessagePack when it is installed, falling back to
+        JSON for leaders that answer 415.
+
+        Args:
+            senders (int): Number of batches that may be in flight at once.
+            max_batch (int): Maximum messages per forwarded request.
+            timeout (float): HTTP timeout per forwarded request.
+            headers (dict): Extra headers sent with every forwarded request.
+            on_batch (function): Optional callback(leader_url, size, seconds) after
+                every forwarded batch, with the time the leader took to answer.
+        """
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.binary = msgpack_available()
+        self.on_batch = on_batch
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=senders)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(headers or {})
+
+        self.pending = deque()              # [leader_url, message, done_event, result] entries
+        self.cond = threading.Condition()
+        for _ in range(senders):
+            threading.Thread(target=self._sender_loop, daemon=True).start()
+
+    def submit(self, leader_url, message):
+        """
+        Queues one message for forwarding without waiting.
+
+        Returns:
+            list: Handle to pass to wait().
+        """
+        entry = [leader_url, message, threading.Event(), None]
+        with self.cond:
+            self.pending.append(entry)
+            self.cond.notify()
+        return entry
+
+    def wait(self, entry):
+        """
+        Waits for the leader's verdict on a submitted message.
+
+        Returns:
+            tuple: (status_code, body) where body is None on success or an error dict.
+        """
+        if not entry[2].wait(self.timeout + 1):
+            return 504, {"error": "Timed out forwarding to leader"}
+        return entry[3]
+
+    def forward(self, leader_url, message):
+        """
+        Forwards one message and waits for the leader's verdict on it.
+        """
+        return self.wait(self.submit(leader_url, message))
+
+    def post(self, leader_url, path, data, content_type):
+        """
+        Forwards a raw request body to a leader over the pooled session.
+
+        Returns:
+            requests.Response: The leader's response.
+        """
+        if not leader_url:
+            raise RuntimeError("Unknown leader ID")
+        return self.session.post(
+            f"{leader_url}{path}", data=data, headers={"Content-Type": content_type}, timeout=self.timeout
+        )
+
+    def _sender_loop(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                # Take the oldest message and everything queued for the same leader
+                leader_url = self.pending[0][0]
+                batch, rest = [], deque()
+                while self.pending and len(batch) < self.max_batch:
+                    entry = self.pending.popleft()
+                    (batch if entry[0] == leader_url else rest).append(entry)
+                rest.extend(self.pending)
+                self.pending = rest
+            self._send(leader_url, batch)
+
+    def _send(self, leader_url, batch):
+        """
+        POSTs a batch to a leader and hands every caller its own result.
+        """
+        start = time.perf_counter()
+        try:
+            if not leader_url:
+                raise RuntimeError("Unknown leader ID")
+            url = f"{leader_url}/publish/batch"
+            messages = [entry[1] for entry in batch]
+            res = None
+            if self.binary:
+                res = self.session.post(
+                    url, data=pack(messages), headers={"Content-Type": MSGPACK}, timeout=self.timeout
+                )
+                if res.status_code == 415:
+                    self.binary = False  # The leader cannot decode MessagePack; stay on JSON
+            if not self.binary:
+                res = self.session.post(url, json=messages, timeout=self.timeout)
+            body = res.json()
+            per_message = body.get("results") if isinstance(body, dict) else None
+            if per_message is not None and len(per_message) == len(batch):
+                results = [
+                    (200, None) if r.get("status") == "accepted"
+                    else (MESSAGE_STATUS_CODES.get(r.get("status"), 400), {"error": r.get("error")})
+                    for r in per_message
+                ]
+            else:
+                results = [(res.status_code, body)] * len(batch)
+        except RuntimeError as e:
+            results = [(500, {"error": str(e)})] * len(batch)
+        except Exception as e:
+            results = [(500, {"error": f"Failed to contact leader: {str(e)}"})] * len(batch)
+        if self.on_batch:
+            self.on_batch(leader_url, len(batch), time.perf_counter() - start)
+
+        for entry, result in zip(batch, results):
+            entry[3] = result
+            entry[2].set()
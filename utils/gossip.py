@@ -1,98 +1,470 @@
+import random
 import threading
 import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 
-def receive_gossip(request, sse_subscribers, sse_unsubscribed):
+from utils.logger import get_logger, DEBUG
+from utils.merkle import MerkleDigest, digest
+from utils.orset import ORSet, encode_delta, decode_delta
+
+log = get_logger("gossip")
+
+WEBHOOK_PREFIX = "webhook "
+
+
+def webhook_member(url, batch_size=None):
+    """
+    Encodes a webhook subscription as a client of the subscriber set, so it
+    is replicated like SSE subscribers. Client IPs contain no spaces, so the
+    two kinds never collide.
+
+    Raises:
+        ValueError: If the URL contains whitespace, which would make the
+            encoding ambiguous (see utils.webhook.validate_url()).
+    """
+    if any(c.isspace() for c in url):
+        raise ValueError(f"Webhook URL must not contain whitespace: '{url}'")
+    return f"{WEBHOOK_PREFIX}{url}" + (f" {batch_size}" if batch_size else "")
+
+
+def parse_webhook_member(client):
+    """
+    Returns:
+        tuple | None: (url, batch size or None) of a webhook_member() string,
+        or None for an SSE subscriber.
+    """
+    if not client.startswith(WEBHOOK_PREFIX):
+        return None
+    url, _, batch_size = client[len(WEBHOOK_PREFIX):].partition(" ")
+    return url, int(batch_size) if batch_size.isdigit() else None
+
+
+class SubscriberGossip:
+    def __init__(self, broker_id, max_buffered=10000, relay_sends=6, digest_buckets=64, on_change=None):
+        """
+        Which clients are subscribed to which topics, replicated between brokers
+        as an observed-remove set of (topic, client) pairs.
+
+        Every local subscribe/unsubscribe produces a small delta that is buffered
+        under a sequence number. A peer is sent only the deltas after the last
+        sequence number it acknowledged, so a dropped round is simply resent
+        and gossip traffic follows churn, not the number of subscribers. A peer
+        that is new, restarted (its incarnation changed) or so far behind that
+        its deltas were discarded gets the full state once instead. Every
+        exchange is push-pull: the reply to a message carries the receiver's
+        own changes for the sender, acknowledged in the sender's next message.
+
+        Deltas learned from a peer are relayed too, so news spreads
+        epidemically, but only in `relay_sends` messages: relaying every one
+        to every peer would cost more than sending full states. Delivery does
+        not depend on relays, since a delta's originator keeps sending it to
+        each peer until that peer acknowledges it.
+
+        A Merkle digest of the per-topic subscriber sets backs periodic
+        anti-entropy: two brokers compare bucket hashes, then the topic hashes
+        of differing buckets, and exchange entries of differing topics only.
+        It repairs whatever deltas missed, at a cost that follows the
+        differences rather than the state.
+
+        Args:
+            broker_id (int): ID of this broker.
+            max_buffered (int): Deltas kept for peers that have not acknowledged them.
+            relay_sends (int): Messages a delta learned from a peer is relayed in.
+            digest_buckets (int): Buckets of the anti-entropy hash tree.
+            on_change (function): Optional callback(topic) run, outside the
+                lock, after the topic's subscribers changed.
+        """
+        self.incarnation = uuid.uuid4().hex[:12]     # New on every start, so dots are never reused
+        self.members = ORSet(f"{broker_id}:{self.incarnation}", on_change=self._changed)
+        self.topics = {}            # topic -> subscribed clients, kept in step with members
+        self.digest = MerkleDigest(self._topic_hash, buckets=digest_buckets)
+        self.buffer = deque()       # [seq, encoded delta, peer it came from or None, relay sends left]
+        self.seq = 0                # Sequence number of the last buffered delta
+        self.acked = {}             # peer -> (peer incarnation, last seq it acknowledged)
+        self.received = {}          # peer -> (peer incarnation, seq of the last reply merged from it)
+        self.max_buffered = max_buffered
+        self.relay_sends = relay_sends
+        self.on_change = on_change
+        self.changed = set()        # Topics changed under the lock, for on_change
+        self.lock = threading.Lock()
+
+    # --- Local changes ---
+    def add(self, topic, client):
+        with self.lock:
+            self._buffer(self.members.add((topic, client)))
+            changed = self._take_changed()
+        self._notify(changed)
+
+    def remove(self, topic, client):
+        with self.lock:
+            delta = self.members.remove((topic, client))
+            if delta is not None:
+                self._buffer(delta)
+            changed = self._take_changed()
+        self._notify(changed)
+
+    def subscribers(self, topic):
+        with self.lock:
+            return set(self.topics.get(topic, ()))
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: topic -> sorted list of subscribed clients.
+        """
+        with self.lock:
+            return {topic: sorted(clients) for topic, clients in self.topics.items()}
+
+    def _changed(self, element):
+        topic, client = element
+        if element in self.members:
+            self.topics.setdefault(topic, set()).add(client)
+        else:
+            clients = self.topics.get(topic)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.topics[topic]
+        self.digest.invalidate(topic)
+        if self.on_change:
+            self.changed.add(topic)
+
+    def _take_changed(self):
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def _notify(self, topics):
+        for topic in topics:
+            self.on_change(topic)
+
+    def _topic_hash(self, topic):
+        clients = self.topics.get(topic)
+        if not clients:
+            return None
+        parts = []
+        for client in sorted(clients):
+            dots = ",".join(f"{replica}:{counter}" for replica, counter in sorted(self.members.entries[(topic, client)]))
+            parts.append(f"{client}@{dots}")
+        return digest(*parts)
+
+    def _buffer(self, delta, origin=None):
+        self.seq += 1
+        self.buffer.append([self.seq, encode_delta(delta), origin, None if origin is None else self.relay_sends])
+        while len(self.buffer) > self.max_buffered:
+            self.buffer.popleft()
+
+    # --- Peer exchange (push-pull) ---
+    def payload_for(self, peer):
+        """
+        Builds the next gossip message for a peer: what it has not acknowledged
+        yet, and the acknowledgement of the last reply it sent us.
+
+        Returns:
+            dict: The message; its "seq" is what the peer acknowledges.
+        """
+        with self.lock:
+            payload = self._changes_for(peer)
+            payload["ack"] = self.received.get(peer)
+            return payload
+
+    def receive(self, payload, peer):
+        """
+        Merges a peer's gossip message (the push) and returns the reply, which
+        carries what that peer has not acknowledged from us yet (the pull), so
+        one exchange brings both sides up to date.
+
+        Returns:
+            dict: The reply to send back.
+        """
+        with self.lock:
+            incarnation = payload.get("incarnation")
+            acked = self.acked.get(peer)
+            if acked is not None and acked[0] != incarnation:
+                del self.acked[peer]            # Peer restarted and lost what it had: resend everything
+            ack = payload.get("ack")
+            if ack and ack[0] == self.incarnation:
+                self._acknowledged(peer, incarnation, ack[1])
+            changed = self._merge(payload, peer)
+            reply = self._changes_for(peer)
+            reply["changed"] = changed
+            topics = self._take_changed()
+        self._notify(topics)
+        return reply
+
+    def receive_reply(self, peer, payload, reply):
+        """
+        Handles a peer's reply to `payload`: records what the peer acknowledged
+        and merges what it sent back.
+
+        Returns:
+            bool: True if either side learned something from the exchange.
+        """
+        with self.lock:
+            incarnation = reply.get("incarnation")
+            acked = self.acked.get(peer)
+            if "state" in payload or (acked is not None and acked[0] == incarnation):
+                self._acknowledged(peer, incarnation, payload["seq"])
+            else:
+                self.acked.pop(peer, None)      # Peer restarted and missed earlier deltas
+            changed = self._merge(reply, peer)
+            self.received[peer] = (incarnation, reply["seq"])
+            topics = self._take_changed()
+        self._notify(topics)
+        return changed or reply.get("changed", False)
+
+    def _changes_for(self, peer):
+        acked = self.acked.get(peer)
+        payload = {"incarnation": self.incarnation, "seq": self.seq}
+        if acked is None or (self.buffer and self.buffer[0][0] > acked[1] + 1):
+            payload["state"] = encode_delta(self.members.state())
+        else:
+            payload["deltas"] = deltas = []
+            for entry in self.buffer:
+                seq, delta, origin, relays = entry
+                if seq <= acked[1] or origin == peer or relays == 0:
+                    continue
+                deltas.append(delta)
+                if relays is not None:
+                    entry[3] -= 1
+        return payload
+
+    def _acknowledged(self, peer, incarnation, seq):
+        """
+        Records what a peer has, and forgets deltas every peer has.
+        """
+        acked = self.acked.get(peer)
+        if acked is not None and acked[0] == incarnation and acked[1] >= seq:
+            return
+        self.acked[peer] = (incarnation, seq)
+        oldest = min(seq for _, seq in self.acked.values())
+        while self.buffer and self.buffer[0][0] <= oldest:
+            self.buffer.popleft()
+
+    def _merge(self, payload, peer):
+        """
+        Merges a message's state or deltas. Deltas that carried news are
+        buffered again so they spread on to other peers; a full state is not,
+        since its originators keep sending their own deltas until acknowledged.
+        """
+        if "state" in payload:
+            return self.members.merge(decode_delta(payload["state"]))
+        changed = False
+        for data in payload.get("deltas", []):
+            delta = decode_delta(data)
+            if self.members.merge(delta):
+                self._buffer(delta, origin=peer)
+                changed = True
+        return changed
+
+    # --- Anti-entropy ---
+    def digest_buckets(self):
+        with self.lock:
+            return self.digest.buckets()
+
+    def compare_buckets(self, remote_buckets):
+        """
+        Returns:
+            dict: bucket -> {topic: hash} of every bucket that differs from the remote one.
+        """
+        with self.lock:
+            return {bucket: self.digest.leaves_of(bucket) for bucket in self.digest.differing_buckets(remote_buckets)}
+
+    def differing_topics(self, remote_leaves):
+        with self.lock:
+            return self.digest.differing_keys(remote_leaves)
+
+    def topic_state(self, topics):
+        """
+        Returns:
+            dict: Encoded entries of the given topics, with the whole causal context.
+        """
+        with self.lock:
+            elements = [(topic, client) for topic in topics for client in self.topics.get(topic, ())]
+            return encode_delta(self.members.state_of(elements))
+
+    def reconcile(self, topics, data):
+        """
+        Merges a peer's entries for some topics (from topic_state()).
+
+        Returns:
+            bool: True if anything changed.
+        """
+        topics = set(topics)
+        state = decode_delta(data)
+        state["entries"] = {element: dots for element, dots in state["entries"].items() if element[0] in topics}
+        with self.lock:
+            elements = [(topic, client) for topic in topics for client in self.topics.get(topic, ())]
+            changed = self.members.merge_partial(state, elements)
+            topics = self._take_changed()
+        self._notify(topics)
+        return changed
+
+def receive_gossip(request, gossip):
     """
     Receives gossip data from peer brokers to update local subscription state.
 
     Args:
         request: Flask request object with JSON containing gossip info.
-        sse_subscribers (defaultdict(set)): Local map of topic -> active subscribers.
-        sse_unsubscribed (defaultdict(set)): Local map of topic -> unsubscribed clients.
+        gossip (SubscriberGossip): Local replica of the subscriber set.
 
     Behavior:
-        - Adds new subscribers received from other brokers.
-        - Removes clients that have unsubscribed elsewhere.
+        - Merges the subscribes and unsubscribes the peer has not had acknowledged yet.
+        - Replies with this broker's own changes the peer has not acknowledged (push-pull).
+    """
+    payload = request.get_json(force=True) or {}
+    peer = payload.get("from")
+
+    if log.enabled(DEBUG):
+        if "state" in payload:
+            log.debug("🤝 Received full subscriber state from %s: %d entries", peer, len(payload["state"]["entries"]))
+        else:
+            log.debug("🤝 Received %d subscriber deltas from %s", len(payload.get("deltas", [])), peer)
+
+    return gossip.receive(payload, peer), 200
+
+
+def receive_digest(request, gossip):
+    """
+    First step of anti-entropy: compares a peer's bucket hashes with ours.
+
+    Returns:
+        The topic hashes of every bucket that differs (none if in sync).
+    """
+    payload = request.get_json(force=True) or {}
+    leaves = gossip.compare_buckets(payload.get("buckets", []))
+    log.debug("🌳 Digest from %s: %d buckets differ", payload.get("from"), len(leaves))
+    return {"leaves": leaves}, 200
+
+
+def receive_reconcile(request, gossip):
+    """
+    Second step of anti-entropy: merges a peer's entries for the topics that
+    differ and replies with ours, so both sides end up with the union.
     """
-    # Extract incoming gossip state from JSON
-    incoming_sse = request.json.get("sse_subscribers", {})
-    incoming_unsubs = request.json.get("unsubscribed", {})
+    payload = request.get_json(force=True) or {}
+    topics = payload.get("topics", [])
+    changed = gossip.reconcile(topics, payload.get("state", {}))
+    log.debug("🌳 Reconciled %d topics with %s (changed: %s)", len(topics), payload.get("from"), changed)
+    return {"state": gossip.topic_state(topics)}, 200
 
-    print(f"🤝 Received gossip update:", flush=True)
 
-    # Update local state with new subscriber data
-    for topic, clients in incoming_sse.items():
-        if clients:
-            print(f"   📡 SSE subscribers for {topic}: {clients}", flush=True)
-        sse_subscribers[topic].update(clients)  # Add new subscribers
-        sse_unsubscribed[topic].difference_update(clients)  # Remove from unsubscribed set
+def start_anti_entropy_thread(gossip, known_peers, interval=30.0, timeout=2.0, self_address=None, on_repair=None):
+    """
+    Starts a background thread that reconciles with one random peer every
+    `interval` seconds: one request to find the topics whose subscriber sets
+    differ, and, only if some do, one to exchange their entries.
+
+    Args:
+        gossip (SubscriberGossip): Local replica of the subscriber set.
+        known_peers (dict): Broker URL map to other peer brokers.
+        on_repair (function): Optional callback(topics) with the number of topics reconciled.
+    """
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=max(1, len(known_peers)), pool_maxsize=1))
+
+    def anti_entropy_loop():
+        while True:
+            time.sleep(interval)
+            peers = list(known_peers.keys())
+            if not peers:
+                continue
+            peer = random.choice(peers)
+            try:
+                res = session.post(f"http://{peer}/gossip/digest", timeout=timeout,
+                                   json={"from": self_address, "buckets": gossip.digest_buckets()})
+                res.raise_for_status()
+                topics = gossip.differing_topics(res.json()["leaves"])
+                if not topics:
+                    log.debug("🌳 Subscriber state in sync with %s", peer)
+                    continue
 
-    # Update unsubscribed set and remove those from active subscribers
-    for topic, removed in incoming_unsubs.items():
-        if removed:
-            print(f"   ❌ SSE unsubscriptions for {topic}: {removed}", flush=True)
-        sse_unsubscribed[topic].update(removed)  # Add to unsubscribed
-        sse_subscribers[topic].difference_update(removed)  # Remove from active subscribers
+                topics = sorted(topics)
+                res = session.post(f"http://{peer}/gossip/reconcile", timeout=timeout,
+                                   json={"from": self_address, "topics": topics, "state": gossip.topic_state(topics)})
+                res.raise_for_status()
+                gossip.reconcile(topics, res.json()["state"])
+                log.info("🌳 Reconciled %d topics with %s", len(topics), peer, rate=1)
+                if on_repair:
+                    on_repair(len(topics))
 
-    return "OK", 200
+            except Exception as e:
+                log.warning("⚠️ Anti-entropy with %s failed: %s", peer, e, rate=1)
 
+    threading.Thread(target=anti_entropy_loop, daemon=True).start()
 
-def start_gossip_thread(sse_subscribers, sse_unsubscribed, known_peers):
+
+def start_gossip_thread(gossip, known_peers, on_round=None, self_address=None,
+                        fanout=3, min_interval=1.0, max_interval=10.0, timeout=2.0):
     """
-    Starts a background thread that periodically sends gossip messages to all known peers.
+    Starts a background thread that runs gossip rounds with random peers.
+
+    Every round exchanges state with `fanout` peers picked at random, in
+    parallel over pooled keep-alive connections, so an unreachable peer costs
+    one timeout in its own worker rather than delaying the round for everyone.
+    Rounds run every `min_interval` seconds while subscriptions change and
+    back off by doubling up to `max_interval` once the cluster is quiet.
 
     Args:
-        sse_subscribers (defaultdict(set)): Local topic -> subscribers map.
-        sse_unsubscribed (defaultdict(set)): Local topic -> unsubscribed clients map.
+        gossip (SubscriberGossip): Local replica of the subscriber set.
         known_peers (dict): Broker URL map to other peer brokers.
+        on_round (function): Optional callback(seconds) with the duration of every gossip round.
+        self_address (str): This broker's host:port, so peers can skip echoing its deltas back.
+        fanout (int): Peers contacted per round.
+        min_interval (float): Seconds between rounds while there is news to spread.
+        max_interval (float): Seconds between rounds of a quiet cluster.
+        timeout (float): Seconds to wait for a peer's reply.
     """
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=max(1, len(known_peers)), pool_maxsize=1))
+    executor = ThreadPoolExecutor(max_workers=max(1, fanout), thread_name_prefix="gossip")
+
+    def exchange(peer):
+        payload = gossip.payload_for(peer)
+        payload["from"] = self_address
+        try:
+            if "state" in payload:
+                log.debug("🔄 Sending full subscriber state to %s", peer)
+            else:
+                log.debug("🔄 Sending %d subscriber deltas to %s", len(payload["deltas"]), peer)
+
+            # POST the gossip payload to peer's /gossip endpoint; the reply carries its news for us
+            res = session.post(f"http://{peer}/gossip", json=payload, timeout=timeout)
+            res.raise_for_status()
+            learned = gossip.receive_reply(peer, payload, res.json())
+            log.debug("📣 Exchanged gossip with %s – status: %s", peer, res.status_code)
+            return learned
+
+        except Exception as e:
+            # Unacknowledged deltas are resent next time; an unreachable peer fails every time it is picked
+            log.warning("⚠️ Gossip to %s failed: %s", peer, e, rate=1)
+            return False
+
     def gossip_loop():
-        print("🧵 Gossip thread started...", flush=True)
+        log.info("🧵 Gossip thread started...")
+        interval = min_interval
+        last_seq = gossip.seq
         while True:
-            time.sleep(10)  # Wait 10 seconds between gossip rounds
+            time.sleep(interval)
 
-            if not known_peers:
+            peers = list(known_peers.keys())
+            if not peers:
                 continue  # Skip if there are no known peers to gossip with
 
-            # Construct payload for gossip message
-            payload = {
-                "sse_subscribers": {
-                    topic: list(addrs - sse_unsubscribed[topic])  # Exclude unsubscribed addresses
-                    for topic, addrs in sse_subscribers.items()
-                },
-                "unsubscribed": {
-                    topic: list(sse_unsubscribed[topic])
-                    for topic in sse_unsubscribed
-                    if sse_unsubscribed[topic]  # Only include non-empty unsub lists
-                }
-            }
-
-            # Send gossip update to each known peer
-            for peer in list(known_peers.keys()):
-                try:
-                    print(f"🔄 Preparing to send gossip to {peer}:")
-
-                    # Log current subscriber state being gossiped
-                    for topic, clients in payload["sse_subscribers"].items():
-                        print(f"    📡 {topic}: {clients}")
-                    for topic, removed in payload["unsubscribed"].items():
-                        print(f"    ❌ {topic}: {removed}")
-
-                    if not payload["sse_subscribers"] and not payload["unsubscribed"]:
-                        print("    ⛔ Nothing to gossip.")
-
-                    # POST the gossip payload to peer's /gossip endpoint
-                    res = requests.post(f"http://{peer}/gossip", json=payload, timeout=3)
-                    print(f"📣 Sent gossip to {peer} – status: {res.status_code}", flush=True)
-
-                except Exception as e:
-                    # Log failure to contact peer
-                    print(f"⚠️ Gossip to {peer} failed: {e}", flush=True)
-                    # Optionally remove peer or retry later
-
-            # ✅ After sending, clear unsubscribed records (they’ve been propagated)
-            sse_unsubscribed.clear()
+            round_start = time.perf_counter()
+            targets = random.sample(peers, min(fanout, len(peers)))
+            learned = any(list(executor.map(exchange, targets)))
+
+            # Gossip fast while subscriptions change, back off while the cluster is quiet
+            busy = learned or gossip.seq != last_seq
+            interval = min_interval if busy else min(interval * 2, max_interval)
+            last_seq = gossip.seq
+
+            if on_round:
+                on_round(time.perf_counter() - round_start)
 
     # Start gossip thread as daemon so it doesn't block program exit
     threading.Thread(target=gossip_loop, daemon=True).start()
@@ -1,22 +1,55 @@
 import requests
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from utils.failure_detector import PhiAccrualDetector
+from utils.logger import get_logger
+
+log = get_logger("election")
 
 class LeaderElection:
-    def __init__(self, broker_id, known_peers_with_ids, announce_leader_callback=None):
+    def __init__(self, broker_id, known_peers_with_ids, announce_leader_callback=None, election_callback=None,
+                 detector=None, heartbeat_interval=0.1, check_interval=0.05, message_timeout=2, announce_wait=5,
+                 commit_position=None):
         """
         Initialize LeaderElection with broker ID and known peers.
-        
+
+        Every election win starts a new term. The leader pushes a heartbeat
+        carrying its term and commit position to every follower each
+        `heartbeat_interval` seconds; followers feed them to a phi-accrual
+        failure detector and start an election once the leader is suspected.
+        A leader whose heartbeats are refused for an older term steps down.
+
         Args:
             broker_id (int): The ID of the current broker.
             known_peers_with_ids (dict): Map of peer URL -> broker ID.
             announce_leader_callback (function): Optional callback when a new leader is elected.
+            election_callback (function): Optional callback(seconds, won) when an election
+                started by this broker finishes.
+            detector (PhiAccrualDetector): Failure detector for the leader's heartbeats.
+            heartbeat_interval (float): Seconds between heartbeats sent by the leader.
+            check_interval (float): Seconds between checks of the leader's suspicion level.
+            message_timeout (float): Seconds to wait for an election or announcement reply.
+            announce_wait (float): Seconds to wait for a higher broker to announce itself.
+            commit_position (function): Optional callable returning the leader's commit
+                position (e.g. Replicator.high_water_marks()), sent with every heartbeat.
         """
         self.broker_id = broker_id
         self.known_peers = known_peers_with_ids
         self.current_leader = None
         self.election_ongoing = False
         self.announce_leader_callback = announce_leader_callback
+        self.election_callback = election_callback
+        self.term = 0                       # Highest term seen; every election win starts a new one
+        self.leader_commit = None           # Commit position from the leader's last heartbeat
+        self.detector = detector or PhiAccrualDetector(first_interval=heartbeat_interval)
+        self.heartbeat_interval = heartbeat_interval
+        self.check_interval = check_interval
+        self.message_timeout = message_timeout
+        self.announce_wait = announce_wait
+        self.commit_position = commit_position
         self.lock = threading.Lock()  # To protect shared state
 
     def send_election_message(self, peer_url, peer_id, result_list):
@@ -26,31 +59,43 @@ class LeaderElection:
         If the peer responds with "OK", it indicates it's alive and willing to participate.
         """
         try:
-            print(f"📤 Sending election message to {peer_url} (broker {peer_id})", flush=True)
-            res = requests.post(f"http://{peer_url}/election", json={"broker_id": self.broker_id}, timeout=2)
+            log.debug("📤 Sending election message to %s (broker %s)", peer_url, peer_id)
+            res = requests.post(f"http://{peer_url}/election", json={"broker_id": self.broker_id},
+                                timeout=self.message_timeout)
+            self.observe_term(res.json().get("term"))
             if res.status_code == 200 and res.json().get("response") == "OK":
-                print(f"👍 Received OK from broker {peer_id} at {peer_url}", flush=True)
+                log.info("👍 Received OK from broker %s at %s", peer_id, peer_url)
                 result_list.append(True)
         except Exception as e:
-            print(f"❌ Election message to {peer_url} failed: {e}", flush=True)
+            log.warning("❌ Election message to %s failed: %s", peer_url, e)
 
     def announce_leader(self):
         """
         Announces the current broker as the leader to all known peers.
         """
         with self.lock:
+            self.term += 1
             self.current_leader = self.broker_id
             self.election_ongoing = False
 
-        print(f"🚨 Announcing self as leader {self.current_leader}", flush=True)
+        log.info("🚨 Announcing self as leader %s for term %s", self.broker_id, self.term)
 
-        # Notify all peers about new leader
-        for peer_url in self.known_peers:
-            try:
-                requests.post(f"http://{peer_url}/leader", json={"leader_id": self.current_leader}, timeout=2)
-                print(f"📢 Announced leader to {peer_url}", flush=True)
-            except Exception as e:
-                print(f"⚠️ Leader announcement to {peer_url} failed: {e}", flush=True)
+        # Notify all peers about new leader; a peer already in a later term refuses,
+        # in which case the announcement is repeated once for a term after that one
+        for attempt in range(2):
+            term, newer = self.term, 0
+            for peer_url in self.known_peers:
+                try:
+                    res = requests.post(f"http://{peer_url}/leader", json={"leader_id": self.broker_id, "term": term},
+                                        timeout=self.message_timeout)
+                    newer = max(newer, res.json().get("term", 0))
+                    log.debug("📢 Announced leader to %s", peer_url)
+                except Exception as e:
+                    log.warning("⚠️ Leader announcement to %s failed: %s", peer_url, e)
+            with self.lock:
+                if newer <= term or self.current_leader != self.broker_id:
+                    break
+                self.term = newer + 1
 
         # Trigger callback if any
         if self.announce_leader_callback:
@@ -62,11 +107,23 @@ class LeaderElection:
         """
         with self.lock:
             if self.election_ongoing:
-                print("⚠️ Election already in progress", flush=True)
+                log.debug("⚠️ Election already in progress")
                 return
             self.election_ongoing = True
 
-        print(f"🎯 Broker {self.broker_id} starting election", flush=True)
+        start = time.perf_counter()
+        won = self._run_election()
+        if self.election_callback:
+            self.election_callback(time.perf_counter() - start, won)
+
+    def _run_election(self):
+        """
+        Runs the bully algorithm for an election this broker started.
+
+        Returns:
+            bool: True if this broker became the leader.
+        """
+        log.info("🎯 Broker %s starting election", self.broker_id)
 
         # Identify brokers with higher IDs than self
         higher_id_peers = {
@@ -74,8 +131,8 @@ class LeaderElection:
             if peer_id > self.broker_id
         }
 
-        print(f"📡 Known peers: {self.known_peers}", flush=True)
-        print(f"🔼 Higher ID peers: {higher_id_peers}", flush=True)
+        log.debug("📡 Known peers: %s", self.known_peers)
+        log.debug("🔼 Higher ID peers: %s", higher_id_peers)
 
         responses = []
         threads = []
@@ -87,40 +144,73 @@ class LeaderElection:
             threads.append(t)
 
         for t in threads:
-            t.join(timeout=3)
+            t.join(timeout=self.message_timeout + 1)
 
         # If no higher broker responds, become leader
         if not responses:
             self.announce_leader()
+            return True
         else:
-            print("⏳ Waiting for leader announcement", flush=True)
-            wait_time = 5  # seconds
+            log.info("⏳ Waiting for leader announcement")
+            wait_time = self.announce_wait
             start = time.time()
             # Wait a while to see if someone else announces as leader
             while time.time() - start < wait_time:
                 with self.lock:
                     if self.current_leader and self.current_leader != self.broker_id:
                         self.election_ongoing = False
-                        print(f"👑 Leader announcement received for broker {self.current_leader}", flush=True)
-                        return
+                        log.info("👑 Leader announcement received for broker %s", self.current_leader)
+                        return False
                 time.sleep(0.5)
 
             # No announcement received → assume leadership
-            print("⏳ Timeout waiting for leader announcement, announcing self", flush=True)
+            log.warning("⏳ Timeout waiting for leader announcement, announcing self")
             self.announce_leader()
+            return True
 
-    def update_leader(self, leader_id):
+    def update_leader(self, leader_id, term=None):
         """
         Called when this broker receives a leader announcement from another broker.
+
+        An announcement for an older term is refused; within one term the
+        higher broker ID wins, as in the bully algorithm.
+
+        Returns:
+            bool: True if the announcement was accepted.
         """
         with self.lock:
+            if term is not None:
+                if term < self.term or (term == self.term and (self.current_leader or 0) > leader_id):
+                    return False
+                self.term = term
+            changed = leader_id != self.current_leader
             self.current_leader = leader_id
             self.election_ongoing = False
-        print(f"👑 Leader updated to broker {leader_id}", flush=True)
+        if not changed:
+            return True
+        log.info("👑 Leader updated to broker %s (term %s)", leader_id, self.term)
+        self.detector.reset()
 
         # Notify local broker of new leader (if callback provided)
         if self.announce_leader_callback:
             self.announce_leader_callback(leader_id)
+        return True
+
+    def observe_term(self, term):
+        """
+        Records a term seen in a peer's reply, so the next election starts a later one.
+        """
+        with self.lock:
+            if term and term > self.term:
+                self.term = term
+
+    def suspect(self, leader_id):
+        """
+        Forgets a suspected leader, so the election that follows waits for a real announcement.
+        """
+        with self.lock:
+            if self.current_leader == leader_id:
+                self.current_leader = None
 
     def get_leader(self):
         """
@@ -129,31 +219,95 @@ class LeaderElection:
         with self.lock:
             return self.current_leader
 
-    def start_health_monitor(self, current_leader_getter):
+    # --- Heartbeats ---
+    def receive_heartbeat(self, leader_id, term, commit=None):
+        """
+        Handles a heartbeat from the leader. A heartbeat for a newer term, or
+        from a leader this broker missed the announcement of, is accepted as
+        an announcement.
+
+        Returns:
+            dict: The reply: whether the heartbeat was accepted, and the term and
+            leader this broker knows, so a stale leader can step down.
+        """
+        with self.lock:
+            known = self.current_leader == leader_id and term == self.term
+        accepted = known or self.update_leader(leader_id, term)
+        if accepted:
+            self.detector.heartbeat()
+            self.leader_commit = commit
+        return {"accepted": accepted, "term": self.term, "leader_id": self.get_leader()}
+
+    def start_heartbeats(self):
+        """
+        Starts a background thread that, while this broker is the leader, sends
+        a heartbeat to every peer each `heartbeat_interval` seconds. Sends run
+        in parallel over pooled connections, and a peer whose previous
+        heartbeat is still in flight is skipped, so a hung follower cannot
+        delay the others.
+        """
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=len(self.known_peers) or 1, pool_maxsize=1))
+        executor = ThreadPoolExecutor(max_workers=max(1, len(self.known_peers)), thread_name_prefix="heartbeat")
+        in_flight = set()
+
+        def send(peer_url, payload):
+            try:
+                reply = session.post(f"http://{peer_url}/heartbeat", json=payload, timeout=self.message_timeout).json()
+                if not reply.get("accepted") and reply.get("term", 0) >= payload["term"]:
+                    if reply.get("leader_id") is not None:
+                        log.warning("🔻 Broker %s leads term %s, stepping down", reply["leader_id"], reply["term"])
+                        self.update_leader(reply["leader_id"], reply["term"])
+                    else:
+                        self.observe_term(reply.get("term"))
+            except Exception:
+                pass  # A dead follower is simply not told; it does not affect the others
+            finally:
+                in_flight.discard(peer_url)
+
+        def heartbeat_loop():
+            while True:
+                time.sleep(self.heartbeat_interval)
+                with self.lock:
+                    if self.current_leader != self.broker_id:
+                        continue
+                    payload = {"leader_id": self.broker_id, "term": self.term}
+                if self.commit_position:
+                    payload["commit"] = self.commit_position()
+                for peer_url in list(self.known_peers):
+                    if peer_url not in in_flight:
+                        in_flight.add(peer_url)
+                        executor.submit(send, peer_url, payload)
+
+        threading.Thread(target=heartbeat_loop, daemon=True).start()
+
+    def start_health_monitor(self):
         """
         Starts a background thread to monitor the health of the current leader.
 
-        If the leader is unreachable, it initiates a new election.
+        The leader's heartbeats feed the failure detector; once its suspicion
+        level crosses the threshold, a new election starts. A check that
+        wakes up much later than scheduled means this broker itself was
+        paused, so it is skipped to let the heartbeats queued meanwhile land.
         """
         def monitor():
+            last_check = time.monotonic()
             while True:
-                time.sleep(5)
-                leader_id = current_leader_getter()
+                time.sleep(self.check_interval)
+                now = time.monotonic()
+                paused = now - last_check > self.check_interval + self.detector.acceptable_pause
+                last_check = now
+                leader_id = self.get_leader()
 
                 # If no leader or self is leader, skip
-                if leader_id is None or leader_id == self.broker_id:
+                if leader_id is None or leader_id == self.broker_id or paused:
                     continue
 
-                # Check the current leader's health
-                for peer_url, peer_id in list(self.known_peers.items()):
-                    if peer_id == leader_id:
-                        try:
-                            res = requests.get(f"http://{peer_url}/ping", timeout=2)
-                            if res.status_code != 200:
-                                raise Exception("Bad response")
-                        except Exception as e:
-                            print(f"💥 Leader {leader_id} not responding: {e}. Initiating election.", flush=True)
-                            self.start_election()
+                phi = self.detector.phi(now)
+                if phi > self.detector.threshold:
+                    log.warning("💥 Leader %s suspected (phi %.1f). Initiating election.", leader_id, phi)
+                    self.suspect(leader_id)
+                    self.start_election()
 
         # Start the monitor thread as a daemon
         threading.Thread(target=monitor, daemon=True).start()
@@ -165,5 +319,5 @@ class LeaderElection:
         with self.lock:
             self.current_leader = None
             self.election_ongoing = False
-        print("🔄 LeaderElection state reset", flush=True)
+        log.info("🔄 LeaderElection state reset")
 
@@ -0,0 +1,61 @@
+from bisect import bisect_left, bisect_right
+
+
+def message_field(message, name):
+    """
+    Returns a numeric field of a message, looked up in message["data"] first
+    and then at the top level. Returns None if missing or not numeric.
+    """
+    data = message.get("data")
+    value = data.get(name) if isinstance(data, dict) else None
+    if value is None:
+        value = message.get(name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+class SortedIndex:
+    def __init__(self, field):
+        """
+        Sorted (key, offset) index over one numeric message field, used for
+        O(log n) range lookups such as "all messages since timestamp T".
+
+        Args:
+            field (str): Name of the field to index (e.g. "timestamp", "lamport_ts").
+        """
+        self.field = field
+        self.keys = []
+        self.offsets = []
+
+    def add(self, offset, message):
+        """
+        Indexes a message. Keys normally arrive in order, so this is an append;
+        out-of-order keys (e.g. from different publishers) are inserted in place.
+        """
+        key = message_field(message, self.field)
+        if key is None:
+            return
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.offsets.append(offset)
+        else:
+            i = bisect_right(self.keys, key)
+            self.keys.insert(i, key)
+            self.offsets.insert(i, offset)
+
+    def range(self, low=None, high=None):
+        """
+        Returns the offsets of messages with low <= key <= high (either bound optional).
+        """
+        lo = 0 if low is None else bisect_left(self.keys, low)
+        hi = len(self.keys) if high is None else bisect_right(self.keys, high)
+        return self.offsets[lo:hi]
+
+    def prune(self, start_offset):
+        """
+        Drops entries of messages that were removed by retention.
+        """
+        kept = [(key, offset) for key, offset in zip(self.keys, self.offsets) if offset >= start_offset]
+        self.keys = [key for key, _ in kept]
+        self.offsets = [offset for _, offset in kept]
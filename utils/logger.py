@@ -0,0 +1,203 @@
+import atexit
+import queue
+import sys
+import threading
+import time
+
+# Log levels, lowest first
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+
+class LogWriter:
+    def __init__(self, stream=None):
+        """
+        Background thread writing log lines to a stream. Callers only put the
+        line on a queue and return; the writer drains everything queued so far
+        and flushes once per batch, so a burst of lines costs one flush.
+        """
+        self.stream = stream or sys.stdout
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        self.queue.put(line)
+
+    def flush(self, timeout=1.0):
+        """
+        Waits (up to `timeout`) until every line queued so far has been written.
+        """
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def _write_loop(self):
+        while True:
+            items = [self.queue.get()]
+            try:
+                while True:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            lines = [item for item in items if isinstance(item, str)]
+            try:
+                if lines:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+            except (OSError, ValueError):
+                pass  # stdout closed or gone; logging must never take the broker down
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+
+class Logger:
+    def __init__(self, subsystem, writer, level=INFO):
+        """
+        Leveled logger for one subsystem ("publish", "gossip", ...).
+
+        Messages are %-style format strings formatted only if the level is
+        enabled, so a disabled debug call costs one comparison. Passing
+        rate=N limits a call site to N lines per second; the number of lines
+        suppressed in between is appended to the next one that is emitted.
+        """
+        self.subsystem = subsystem
+        self.writer = writer
+        self.level = level
+        self.windows = {}       # (level, format string) -> [window start, lines emitted, lines suppressed]
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args, rate=None):
+        if level < self.level:
+            return
+        suppressed = 0
+        if rate is not None:
+            suppressed = self._sample((level, message), rate)
+            if suppressed is None:
+                return
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = f"{message} {args}"
+        if suppressed:
+            message = f"{message} (+{suppressed} similar suppressed)"
+        stamp = time.strftime("%H:%M:%S")
+        self.writer.write(f"{stamp} {LEVEL_NAMES[level].upper():<7} [{self.subsystem}] {message}")
+
+    def _sample(self, site, rate):
+        """
+        Fixed one-second window per call site. Concurrent callers may let a
+        line or two more through than `rate`; that is cheaper than a lock.
+
+        Returns:
+            int | None: Lines suppressed since the last emitted one, or None to drop this one.
+        """
+        now = time.monotonic()
+        window = self.windows.get(site)
+        if window is None or now - window[0] >= 1.0:
+            suppressed = window[2] if window else 0
+            self.windows[site] = [now, 1, 0]
+            return suppressed
+        if window[1] >= rate:
+            window[2] += 1
+            return None
+        window[1] += 1
+        suppressed, window[2] = window[2], 0
+        return suppressed
+
+    def debug(self, message, *args, rate=None):
+        if DEBUG >= self.level:
+            self.log(DEBUG, message, *args, rate=rate)
+
+    def info(self, message, *args, rate=None):
+        if INFO >= self.level:
+            self.log(INFO, message, *args, rate=rate)
+
+    def warning(self, message, *args, rate=None):
+        if WARNING >= self.level:
+            self.log(WARNING, message, *args, rate=rate)
+
+    def error(self, message, *args, rate=None):
+        if ERROR >= self.level:
+            self.log(ERROR, message, *args, rate=rate)
+
+
+_writer = LogWriter()
+_loggers = {}
+_default_level = INFO
+_overrides = {}             # subsystem -> level set explicitly
+_lock = threading.Lock()    # Guards logger creation and level changes only
+atexit.register(_writer.flush)
+
+
+def parse_level(name):
+    """
+    Raises:
+        ValueError: If `name` is not one of LEVELS.
+    """
+    level = LEVELS.get(str(name).lower())
+    if level is None:
+        raise ValueError(f"Unknown log level '{name}', use one of {', '.join(LEVELS)}")
+    return level
+
+
+def get_logger(subsystem):
+    """
+    Returns the shared logger of a subsystem, creating it on first use.
+    """
+    logger = _loggers.get(subsystem)
+    if logger is None:
+        with _lock:
+            logger = _loggers.get(subsystem)
+            if logger is None:
+                logger = _loggers[subsystem] = Logger(subsystem, _writer, _overrides.get(subsystem, _default_level))
+    return logger
+
+
+def set_level(level, subsystem=None):
+    """
+    Changes the level of one subsystem, or the default level of every subsystem
+    without its own override when `subsystem` is None. Takes effect immediately.
+
+    Args:
+        level: A name from LEVELS or one of their values.
+
+    Raises:
+        ValueError: If `level` is neither.
+    """
+    global _default_level
+    if isinstance(level, int) and not isinstance(level, bool):
+        if level not in LEVEL_NAMES:
+            raise ValueError(f"Unknown log level {level}, use one of {', '.join(map(str, LEVEL_NAMES))}")
+    else:
+        level = parse_level(level)
+    with _lock:
+        if subsystem is None:
+            _default_level = level
+            for name, logger in _loggers.items():
+                if name not in _overrides:
+                    logger.level = level
+        else:
+            _overrides[subsystem] = level
+            logger = _loggers.get(subsystem)
+            if logger is None:
+                _loggers[subsystem] = Logger(subsystem, _writer, level)
+            else:
+                logger.level = level
+
+
+def levels():
+    """
+    Returns:
+        dict: The default level and the level of every known subsystem, by name.
+    """
+    with _lock:
+        return {
+            "default": LEVEL_NAMES[_default_level],
+            "subsystems": {name: LEVEL_NAMES[logger.level] for name, logger in sorted(_loggers.items())},
+        }
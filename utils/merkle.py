@@ -0,0 +1,101 @@
+import hashlib
+
+EMPTY = ""      # Hash of an empty bucket
+
+
+def digest(*parts):
+    """
+    Short stable hash of some strings; unlike hash(), equal on every broker.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class MerkleDigest:
+    def __init__(self, leaf_hash, buckets=64):
+        """
+        Two-level hash tree over keyed leaves (here: one leaf per topic).
+
+        Keys are spread over `buckets` buckets by a stable hash; a bucket's
+        hash covers the hashes of its leaves and the root covers the buckets.
+        Two replicas compare roots, then bucket hashes, then the leaf hashes
+        of differing buckets only, so finding what differs costs about one
+        bucket list plus the differing buckets, not the whole state.
+
+        Leaf hashes are cached: invalidate() a key when its content changes
+        and only that leaf and its bucket are rehashed on the next read.
+
+        Args:
+            leaf_hash (function): leaf_hash(key) -> hash of the key's content, or None if it is empty.
+            buckets (int): Number of buckets under the root.
+        """
+        self.leaf_hash = leaf_hash
+        self.size = max(1, buckets)
+        self.leaves = [{} for _ in range(self.size)]        # bucket -> {key: leaf hash}
+        self.hashes = [EMPTY] * self.size                    # bucket -> bucket hash
+        self.dirty = {}                                      # bucket -> keys to rehash
+
+    def bucket_of(self, key):
+        return int(digest(key), 16) % self.size
+
+    def invalidate(self, key):
+        self.dirty.setdefault(self.bucket_of(key), set()).add(key)
+
+    def _refresh(self):
+        dirty, self.dirty = self.dirty, {}
+        for bucket, keys in dirty.items():
+            leaves = self.leaves[bucket]
+            for key in keys:
+                leaf = self.leaf_hash(key)
+                if leaf is None:
+                    leaves.pop(key, None)
+                else:
+                    leaves[key] = leaf
+            self.hashes[bucket] = digest(*(f"{k}={h}" for k, h in sorted(leaves.items()))) if leaves else EMPTY
+
+    def root(self):
+        self._refresh()
+        return digest(*self.hashes)
+
+    def buckets(self):
+        """
+        Returns:
+            list: The hash of every bucket, by bucket number.
+        """
+        self._refresh()
+        return list(self.hashes)
+
+    def leaves_of(self, bucket):
+        """
+        Returns:
+            dict: key -> leaf hash of every non-empty key in the bucket.
+        """
+        self._refresh()
+        return dict(self.leaves[bucket])
+
+    def differing_buckets(self, remote_buckets):
+        """
+        Returns:
+            list: Bucket numbers whose hash differs from the remote one.
+        """
+        local = self.buckets()
+        if len(remote_buckets) != len(local):
+            return list(range(self.size))
+        return [i for i, (a, b) in enumerate(zip(local, remote_buckets)) if a != b]
+
+    def differing_keys(self, remote_leaves):
+        """
+        Args:
+            remote_leaves (dict): bucket -> {key: leaf hash} on the remote side.
+
+        Returns:
+            set: Keys whose leaf differs, including keys only one side has.
+        """
+        keys = set()
+        for bucket, remote in remote_leaves.items():
+            local = self.leaves_of(int(bucket))
+            keys.update(k for k in local.keys() | remote.keys() if local.get(k) != remote.get(k))
+        return keys
@@ -0,0 +1,207 @@
+import math
+import threading
+from bisect import bisect_left
+
+# Prometheus text exposition format served by /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from 100 µs to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _cell(cells, size):
+    """
+    Returns the calling thread's cell, creating it on first use. Only its own
+    thread ever writes to a cell, so updates need no lock: dict.setdefault is
+    atomic, and thread idents are only reused once the previous owner has exited.
+    """
+    ident = threading.get_ident()
+    cell = cells.get(ident)
+    if cell is None:
+        cell = cells.setdefault(ident, [0] * size)
+    return cell
+
+
+class _CounterChild:
+    def __init__(self):
+        self.cells = {}         # thread ident -> [value]
+
+    def inc(self, amount=1):
+        _cell(self.cells, 1)[0] += amount
+
+    def value(self):
+        return sum(cell[0] for cell in list(self.cells.values()))
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.cells = {}         # thread ident -> [count per bucket..., count above the last bucket, sum]
+
+    def observe(self, value):
+        cell = _cell(self.cells, len(self.buckets) + 2)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (cumulative count per bucket including +Inf, sum of observations)
+        """
+        totals = [0] * (len(self.buckets) + 2)
+        for cell in list(self.cells.values()):
+            for i, value in enumerate(cell):
+                totals[i] += value
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.children = {}      # label values -> child
+
+    def labels(self, *values):
+        """
+        Returns the child metric for one combination of label values.
+        """
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            yield self.name, _label_pairs(self.label_names, values), child.value()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for values, child in list(self.children.items()):
+            pairs = _label_pairs(self.label_names, values)
+            cumulative, total = child.snapshot()
+            for bound, count in zip(bounds, cumulative):
+                yield f"{self.name}_bucket", pairs + [("le", bound)], count
+            yield f"{self.name}_sum", pairs, total
+            yield f"{self.name}_count", pairs, cumulative[-1]
+
+
+class CallbackMetric(_Metric):
+    def __init__(self, name, documentation, labels, collect, kind="gauge"):
+        """
+        Metric whose values are read from the broker's own state at scrape time,
+        so the hot path pays nothing for it.
+
+        Args:
+            collect (function): Returns an iterable of (label values tuple, value).
+            kind (str): "gauge", or "counter" for values that only grow.
+        """
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def samples(self):
+        for values, value in self.collect():
+            yield self.name, _label_pairs(self.label_names, values), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Holds the broker's metrics and renders them in the Prometheus text format.
+
+        Counters and histograms keep one cell per writing thread, so recording a
+        value is a dict lookup and an in-place add with no lock to contend on;
+        a scrape sums the cells. A scrape racing with writers may see a
+        histogram's count and sum one observation apart, never a lost update.
+        """
+        self.metrics = []
+        self.lock = threading.Lock()    # Guards registration only
+
+    def _register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, labels, collect):
+        return self._register(CallbackMetric(name, documentation, labels, collect))
+
+    def callback_counter(self, name, documentation, labels, collect):
+        return self._register(CallbackMetric(name, documentation, labels, collect, kind="counter"))
+
+    def render(self):
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in list(self.metrics):
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation, help_text=True)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, pairs, value in metric.samples():
+                labels = ",".join(f'{key}="{_escape(str(val))}"' for key, val in pairs)
+                lines.append(f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_pairs(names, values):
+    return list(zip(names, values))
+
+
+def _escape(text, help_text=False):
+    text = text.replace("\\", "\\\\").replace("\n", "\\n")
+    return text if help_text else text.replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        return repr(value)
+    return str(value)
@@ -0,0 +1,213 @@
+class CausalContext:
+    def __init__(self, vv=None, cloud=None):
+        """
+        The set of dots (replica ID, counter) a replica has seen: a version vector
+        covering every counter up to vv[replica], plus a cloud of dots seen out
+        of order. Deltas carry only a cloud, so they stay proportional to churn.
+        """
+        self.vv = dict(vv or {})
+        self.cloud = set(cloud or ())
+
+    def contains(self, dot):
+        return dot[1] <= self.vv.get(dot[0], 0) or dot in self.cloud
+
+    def add(self, dot):
+        self.cloud.add(dot)
+
+    def merge(self, other):
+        for replica, counter in other.vv.items():
+            if counter > self.vv.get(replica, 0):
+                self.vv[replica] = counter
+        self.cloud |= other.cloud
+        self.compact()
+
+    def compact(self):
+        """
+        Folds cloud dots that continue a replica's version vector into it.
+        """
+        for dot in sorted(self.cloud):
+            replica, counter = dot
+            if counter == self.vv.get(replica, 0) + 1:
+                self.vv[replica] = counter
+                self.cloud.discard(dot)
+            elif counter <= self.vv.get(replica, 0):
+                self.cloud.discard(dot)
+
+    def next_dot(self, replica):
+        return replica, self.vv.get(replica, 0) + 1
+
+    def to_dict(self):
+        return {"vv": dict(self.vv), "cloud": [list(d) for d in sorted(self.cloud)]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("vv", {}), (tuple(d) for d in data.get("cloud", [])))
+
+
+class ORSet:
+    def __init__(self, replica, on_change=None):
+        """
+        Observed-remove set (an add-wins ORSWOT): every add is tagged with a
+        fresh dot and a remove deletes only the dots it has observed, so an add
+        concurrent with a remove survives and merging in any order, any number
+        of times, converges. Removals leave no tombstone in the set itself;
+        the causal context records that those dots were seen.
+
+        Every add() and remove() returns a delta, which is itself a small
+        ORSet state; merging deltas is enough to replicate the set.
+
+        Args:
+            replica (str): ID of the replica that owns this copy. It must be new
+                every time the copy starts empty, or its dots would be reused.
+            on_change (function): Optional callback(element) run whenever an
+                element is added, removed or its dots change.
+        """
+        self.replica = replica
+        self.on_change = on_change
+        self.entries = {}           # element -> set of dots that added it
+        self.dot_index = {}         # dot -> element, to apply removals without scanning
+        self.context = CausalContext()
+
+    def __contains__(self, element):
+        return element in self.entries
+
+    def elements(self):
+        return list(self.entries)
+
+    def add(self, element):
+        """
+        Returns:
+            dict: The delta of this add.
+        """
+        dot = self.context.next_dot(self.replica)
+        observed = self.entries.get(element, set())
+        delta = {"entries": {element: {dot}}, "context": CausalContext(cloud=observed | {dot})}
+        self._set_dots(element, {dot})
+        self.context.vv[self.replica] = dot[1]
+        return delta
+
+    def remove(self, element):
+        """
+        Returns:
+            dict | None: The delta of this remove, or None if the element was absent.
+        """
+        observed = self.entries.get(element)
+        if not observed:
+            return None
+        self._set_dots(element, set())
+        return {"entries": {}, "context": CausalContext(cloud=observed)}
+
+    def state(self):
+        """
+        Returns the whole set as a delta, for peers that cannot be sent increments.
+        """
+        return {
+            "entries": {element: set(dots) for element, dots in self.entries.items()},
+            "context": CausalContext(self.context.vv, self.context.cloud),
+        }
+
+    def state_of(self, elements):
+        """
+        Returns the entries of some elements with the whole causal context, for
+        merge_partial() on a replica that reconciles only those elements.
+        """
+        return {
+            "entries": {element: set(self.entries[element]) for element in elements if element in self.entries},
+            "context": CausalContext(self.context.vv, self.context.cloud),
+        }
+
+    def merge(self, delta):
+        """
+        Joins a delta (or a full state) into this set.
+
+        Returns:
+            bool: True if anything changed, i.e. the delta carried news.
+        """
+        remote_entries, remote_context = delta["entries"], delta["context"]
+        changed = False
+
+        # Dots the remote side saw but no longer holds were removed there
+        if remote_context.vv:
+            candidates = list(self.dot_index)   # Full state: every local dot may be covered
+        else:
+            candidates = [dot for dot in remote_context.cloud if dot in self.dot_index]
+        for dot in candidates:
+            element = self.dot_index.get(dot)
+            if element is None or not remote_context.contains(dot):
+                continue
+            if dot not in remote_entries.get(element, ()):
+                self._set_dots(element, self.entries[element] - {dot})
+                changed = True
+
+        # Dots added remotely that this replica has not seen yet
+        for element, dots in remote_entries.items():
+            new = {dot for dot in dots if not self.context.contains(dot)}
+            if new:
+                self._set_dots(element, self.entries.get(element, set()) | new)
+                changed = True
+
+        before = (dict(self.context.vv), len(self.context.cloud))
+        self.context.merge(remote_context)
+        return changed or before != (self.context.vv, len(self.context.cloud))
+
+    def merge_partial(self, state, elements):
+        """
+        Joins another replica's entries for some elements (from state_of()),
+        leaving all other elements alone. Only the dots this
+        merge adds or removes enter the local causal context, since the remote
+        context also covers elements whose entries were not sent.
+
+        Args:
+            state (dict): The remote entries of the elements and the full remote context.
+            elements (iterable): Local elements being reconciled; remote entries
+                of other elements must not be in `state`.
+
+        Returns:
+            bool: True if anything changed.
+        """
+        remote_entries, remote_context = state["entries"], state["context"]
+        changed = False
+        for element in list(elements):
+            for dot in list(self.entries.get(element, ())):
+                if remote_context.contains(dot) and dot not in remote_entries.get(element, ()):
+                    self._set_dots(element, self.entries[element] - {dot})
+                    self.context.add(dot)
+                    changed = True
+        for element, dots in remote_entries.items():
+            new = {dot for dot in dots if not self.context.contains(dot)}
+            if new:
+                self._set_dots(element, self.entries.get(element, set()) | new)
+                self.context.cloud |= new
+                changed = True
+        if changed:
+            self.context.compact()
+        return changed
+
+    def _set_dots(self, element, dots):
+        for dot in self.entries.get(element, ()):
+            self.dot_index.pop(dot, None)
+        if dots:
+            self.entries[element] = dots
+            for dot in dots:
+                self.dot_index[dot] = element
+        else:
+            self.entries.pop(element, None)
+        if self.on_change:
+            self.on_change(element)
+
+
+def encode_delta(delta):
+    """
+    Converts a delta to JSON-friendly lists; elements must be tuples of JSON values.
+    """
+    return {
+        "entries": [[list(element), [list(dot) for dot in sorted(dots)]] for element, dots in delta["entries"].items()],
+        "context": delta["context"].to_dict(),
+    }
+
+
+def decode_delta(data):
+    return {
+        "entries": {tuple(element): {tuple(dot) for dot in dots} for element, dots in data.get("entries", [])},
+        "context": CausalContext.from_dict(data.get("context", {})),
+    }
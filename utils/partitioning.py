@@ -0,0 +1,199 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.logger import get_logger
+from utils.topic_trie import SEPARATOR
+
+log = get_logger("partitioning")
+
+
+def ring_hash(key):
+    """
+    Stable 64-bit hash used to place brokers and topics on the ring.
+    """
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def partition_key(topic):
+    """
+    Key a topic is placed by: its first level, so a whole topic hierarchy
+    (traffic/downtown/main_st, traffic/uptown/...) is led by one broker and
+    wildcard subscriptions below its root can be served in one place.
+    """
+    return topic.split(SEPARATOR, 1)[0]
+
+
+class HashRing:
+    def __init__(self, broker_ids, vnodes=64):
+        """
+        Consistent hash ring. Each broker is placed at `vnodes` points, so adding
+        or removing a broker only moves about 1/N of the topics.
+
+        Args:
+            broker_ids (iterable): IDs of the brokers on the ring.
+            vnodes (int): Virtual nodes per broker.
+        """
+        points = sorted((ring_hash(f"broker-{broker_id}#{v}"), broker_id)
+                        for broker_id in broker_ids for v in range(vnodes))
+        self.hashes = [h for h, _ in points]
+        self.owners = [broker_id for _, broker_id in points]
+
+    def owner(self, key):
+        """
+        Returns the broker owning `key`, or None if the ring is empty.
+        """
+        if not self.hashes:
+            return None
+        i = bisect_right(self.hashes, ring_hash(key)) % len(self.hashes)
+        return self.owners[i]
+
+
+class PartitionMap:
+    def __init__(self, broker_urls, vnodes=64, on_change=None):
+        """
+        Current assignment of topics to brokers: a hash ring over the live
+        brokers, versioned by (epoch, coordinator). Until the coordinator
+        publishes a map every configured broker is assumed live.
+
+        Args:
+            broker_urls (dict): Broker ID -> base URL of every configured broker.
+            vnodes (int): Virtual nodes per broker on the ring.
+            on_change (function): Optional callback(epoch) run after a newer map is adopted.
+        """
+        self.broker_urls = broker_urls
+        self.vnodes = vnodes
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.version = (0, 0)
+        self.live = sorted(broker_urls)
+        self.ring = HashRing(self.live, vnodes)
+
+    @property
+    def epoch(self):
+        return self.version[0]
+
+    def owner(self, topic):
+        """
+        Returns the ID of the broker that leads `topic` (or a subscription pattern below its root).
+        """
+        return self.ring.owner(partition_key(topic))
+
+    def update(self, epoch, coordinator, live):
+        """
+        Adopts a map if it is newer than the current one.
+
+        Returns:
+            bool: True if the map changed.
+        """
+        with self.lock:
+            if (epoch, coordinator) <= self.version:
+                return False
+            self.version = (epoch, coordinator)
+            self.live = sorted(live)
+            self.ring = HashRing(self.live, self.vnodes)
+        log.info("🗺️ Partition map epoch %s: live brokers %s", epoch, self.live)
+        if self.on_change:
+            self.on_change(epoch)
+        return True
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (version, live broker IDs, HashRing) of one consistent map.
+        """
+        with self.lock:
+            return self.version, self.live, self.ring
+
+    def message(self):
+        """
+        Returns:
+            dict: The map as the coordinator publishes it to /partition_map.
+        """
+        with self.lock:
+            return {"epoch": self.version[0], "coordinator": self.version[1], "live": self.live}
+
+    def adopt(self, message):
+        """
+        Adopts a map received from another broker (see message()) if it is newer.
+        """
+        if message and "epoch" in message:
+            return self.update(int(message["epoch"]), int(message["coordinator"]), [int(b) for b in message["live"]])
+        return False
+
+    def to_dict(self, topics=()):
+        """
+        Serializable view of the map, including the owner of every given topic.
+        """
+        return {
+            "epoch": self.version[0],
+            "coordinator": self.version[1],
+            "live": self.live,
+            "vnodes": self.vnodes,
+            "brokers": {str(broker_id): url for broker_id, url in self.broker_urls.items()},
+            "topics": {topic: self.owner(topic) for topic in topics},
+        }
+
+
+class PartitionCoordinator:
+    def __init__(self, partition_map, broker_id, is_coordinator, interval=2.0, timeout=1.0, refresh_rounds=5):
+        """
+        Run on every broker; only active on the elected leader, which acts as
+        coordinator. It pings all brokers every `interval` seconds and, when the
+        set of live brokers changes, publishes a new map epoch to all of them.
+        The map is also re-sent every `refresh_rounds` rounds so brokers that
+        missed an update converge.
+        """
+        self.partition_map = partition_map
+        self.broker_id = broker_id
+        self.is_coordinator = is_coordinator
+        self.interval = interval
+        self.timeout = timeout
+        self.refresh_rounds = refresh_rounds
+
+        peers = [bid for bid in partition_map.broker_urls if bid != broker_id]
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(peers) or 1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(peers)), thread_name_prefix="partitions")
+        self.peers = peers
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _alive(self, broker_id):
+        try:
+            url = self.partition_map.broker_urls[broker_id]
+            return self.session.get(f"{url}/ping", timeout=self.timeout).status_code == 200
+        except Exception:
+            return False
+
+    def _broadcast(self, payload):
+        def send(broker_id):
+            try:
+                url = self.partition_map.broker_urls[broker_id]
+                self.session.post(f"{url}/partition_map", json=payload, timeout=self.timeout)
+            except Exception:
+                pass
+        list(self.executor.map(send, self.peers))
+
+    def _loop(self):
+        rounds = 0
+        while True:
+            time.sleep(self.interval)
+            if not self.is_coordinator():
+                rounds = 0
+                continue
+            alive = dict(zip(self.peers, self.executor.map(self._alive, self.peers)))
+            live = sorted([self.broker_id] + [bid for bid, ok in alive.items() if ok])
+            changed = live != self.partition_map.live or self.partition_map.version[1] != self.broker_id
+            if changed:
+                self.partition_map.update(self.partition_map.epoch + 1, self.broker_id, live)
+            if changed or rounds % self.refresh_rounds == 0:
+                self._broadcast(self.partition_map.message())
+            rounds += 1
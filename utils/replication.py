@@ -0,0 +1,447 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.logger import get_logger
+from utils.partitioning import partition_key
+
+log = get_logger("replication")
+
+# Acknowledgment levels a publish can wait for
+ACK_NONE = "none"   # Return as soon as the message is queued on the leader
+ACK_ONE = "one"     # Return once the leader has appended it to its commit log
+ACK_ALL = "all"     # Return once every in-sync follower has appended it as well
+ACK_LEVELS = (ACK_NONE, ACK_ONE, ACK_ALL)
+
+
+class PublishAck:
+    def __init__(self, level):
+        """
+        Completion handle a publish request waits on until its acknowledgment
+        level is reached.
+        """
+        self.level = level
+        self.event = threading.Event()
+        self.error = None           # Why the message was not appended, if it was not
+        self.status = None          # HTTP status reporting that error
+
+    def done(self):
+        self.event.set()
+
+    def fail(self, error, status=503):
+        """
+        Completes the ack without the message: 503 if the publisher should
+        retry elsewhere (the topic moved), 500 if dispatching it failed.
+        """
+        self.error = error
+        self.status = status
+        self.event.set()
+
+    def wait(self, timeout):
+        """
+        Returns:
+            bool: True if acknowledged within `timeout` seconds.
+        """
+        return self.event.wait(timeout)
+
+
+class FollowerState:
+    def __init__(self, url):
+        self.url = url
+        self.positions = None       # Follower's next offset per topic; None until first contact
+        self.epochs = {}            # Follower's epoch history per topic
+        self.matched = {}           # Per owned topic, how far the follower's log matches ours
+        self.last_ack = 0.0         # Time of the last successful replication request
+        self.last_error = None
+
+
+class Replicator:
+    def __init__(self, commit_log, followers, owns, broker_id, live=None, max_batch=500,
+                 timeout=2.0, lag_timeout=10.0, idle_interval=1.0):
+        """
+        Ships the topics this broker leads to every follower.
+
+        One sender thread per follower compares the follower's per-topic
+        positions with the local log of every owned topic and POSTs everything
+        it is missing to the follower's /replicate endpoint, in batches of up
+        to `max_batch` entries over a pooled keep-alive session. Followers that
+        fell behind (or were down) catch up from the retained log.
+
+        Entries carry the epoch they were written in. Followers report their
+        epoch history with their positions, so a follower holding entries this
+        broker does not have (e.g. from a previous owner of the topic) is told
+        to truncate its log back to where the two diverge, and only entries
+        up to that point count towards ACK_ALL.
+
+        Args:
+            commit_log (CommitLog): The broker's commit log.
+            followers (dict): Broker ID -> base URL of every other broker.
+            owns (function): Returns True if this broker leads the given topic.
+            broker_id (int): This broker's ID, sent with every request.
+            live (function): Returns the IDs of brokers currently in the cluster;
+                ACK_ALL publishes only wait for followers among them.
+            max_batch (int): Maximum entries per replication request.
+            timeout (float): HTTP timeout per replication request.
+            lag_timeout (float): A follower without a successful request for this
+                long is out of sync and no longer awaited by ACK_ALL publishes.
+            idle_interval (float): How often idle followers are polled for positions.
+        """
+        self.commit_log = commit_log
+        self.followers = {fid: FollowerState(url) for fid, url in followers.items()}
+        self.owns = owns
+        self.broker_id = broker_id
+        self.live = live
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.lag_timeout = lag_timeout
+        self.idle_interval = idle_interval
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(followers) or 1, pool_maxsize=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.version = 0                    # Bumped on every local append
+        self.cond = threading.Condition()
+        self.waiters = defaultdict(list)    # topic -> [(offset, ack, required follower IDs)]
+        self.waiters_lock = threading.Lock()
+
+        for fid in self.followers:
+            threading.Thread(target=self._follower_loop, args=(fid,), daemon=True).start()
+
+    def notify(self):
+        """
+        Wakes up the senders after this broker appended to its log.
+        """
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def in_sync(self):
+        """
+        Returns the IDs of live followers that acknowledged a request within `lag_timeout`.
+        """
+        now = time.time()
+        live = set(self.live()) if self.live else set(self.followers)
+        return {
+            fid for fid, state in self.followers.items()
+            if fid in live and now - state.last_ack < self.lag_timeout
+        }
+
+    def track(self, topic, offset, ack):
+        """
+        Completes `ack` once every currently in-sync follower has the message at
+        `offset`, written in the same epoch (immediately if there is none).
+        """
+        required = self.in_sync()
+        if not required:
+            ack.done()
+            return
+        with self.waiters_lock:
+            self.waiters[topic].append((offset, ack, required))
+        self._check_waiters()
+
+    def high_water_marks(self):
+        """
+        Returns:
+            dict: topic -> offset up to which every in-sync follower holds the
+            local log, for every topic this broker owns (its commit position).
+        """
+        in_sync = self.in_sync()
+        marks = {}
+        for topic in self.commit_log.topics():
+            if self.owns(topic):
+                marks[topic] = min(
+                    [self.followers[fid].matched.get(topic, 0) for fid in in_sync],
+                    default=self.commit_log.topic_log(topic).next_offset
+                )
+        return marks
+
+    def _check_waiters(self):
+        in_sync = self.in_sync()
+        with self.waiters_lock:
+            for topic, waiting in list(self.waiters.items()):
+                remaining = []
+                for offset, ack, required in waiting:
+                    if all(
+                        fid not in in_sync or self.followers[fid].matched.get(topic, 0) > offset
+                        for fid in required
+                    ):
+                        ack.done()
+                    else:
+                        remaining.append((offset, ack, required))
+                if remaining:
+                    self.waiters[topic] = remaining
+                else:
+                    del self.waiters[topic]
+
+    def _follower_loop(self, fid):
+        state = self.followers[fid]
+        seen_version = -1
+        more = False
+        while True:
+            with self.cond:
+                if not more and self.version == seen_version:
+                    self.cond.wait(self.idle_interval)
+                seen_version = self.version
+            entries, truncate = self._collect(state) if state.positions is not None else ([], {})
+            try:
+                res = self.session.post(
+                    f"{state.url}/replicate",
+                    json={"broker_id": self.broker_id, "entries": entries, "truncate": truncate},
+                    timeout=self.timeout
+                )
+                res.raise_for_status()
+                body = res.json()
+                state.positions = body.get("positions", {})
+                state.epochs = body.get("epochs", {})
+                state.matched = self._matched(state)
+                state.last_ack = time.time()
+                state.last_error = None
+                more = len(entries) >= self.max_batch
+            except Exception as e:
+                if state.last_error is None:
+                    log.warning("⚠️ Replication to broker %s failed: %s", fid, e)
+                state.last_error = str(e)
+                more = False
+            self._check_waiters()
+
+    def _matched(self, state):
+        """
+        Returns:
+            dict: Per owned topic, the first offset where the follower's log
+            differs from ours (or ends).
+        """
+        matched = {}
+        for topic in self.commit_log.topics():
+            if self.owns(topic):
+                matched[topic] = self.commit_log.topic_log(topic).divergence(
+                    state.epochs.get(topic, []), state.positions.get(topic, 0)
+                )
+        return matched
+
+    def _collect(self, state):
+        """
+        Reads the entries of owned topics a follower is missing, up to `max_batch`.
+
+        Returns:
+            tuple: (entries, {topic: offset} the follower must truncate its log to first)
+        """
+        entries = []
+        truncate = {}
+        for topic in self.commit_log.topics():
+            if not self.owns(topic):
+                continue
+            topic_log = self.commit_log.topic_log(topic)
+            position = topic_log.divergence(state.epochs.get(topic, []), state.positions.get(topic, 0))
+            if state.positions.get(topic, 0) > position:
+                truncate[topic] = position
+            budget = self.max_batch - len(entries)
+            if budget <= 0 or position >= topic_log.next_offset:
+                continue
+            for offset, message in topic_log.read(position, budget):
+                entries.append({"topic": topic, "offset": offset, "epoch": topic_log.epoch_at(offset), "message": message})
+        return entries, truncate
+
+
+def log_positions(commit_log):
+    """
+    Returns:
+        dict: The next offset and epoch history of every topic, as a replica reports them.
+    """
+    topics = commit_log.topics()
+    return {
+        "positions": {topic: commit_log.topic_log(topic).next_offset for topic in topics},
+        "epochs": {topic: commit_log.topic_log(topic).epoch_history() for topic in topics},
+    }
+
+
+def apply_replicated(commit_log, entries, accepts=None, truncate=None):
+    """
+    Appends replicated entries to a follower's commit log at the leader's offsets,
+    after truncating the topics the leader found diverged. Entries of topics for
+    which `accepts(topic)` is False are ignored.
+
+    Returns:
+        dict: The follower's positions and epochs (see log_positions()), reported back to the leader.
+    """
+    for topic, offset in (truncate or {}).items():
+        if accepts and not accepts(topic):
+            continue
+        topic_log = commit_log.topic_log(topic)
+        if offset < topic_log.next_offset:
+            log.warning("✂️ Truncating '%s' from offset %s to %s to match its leader", topic, topic_log.next_offset, offset)
+            topic_log.truncate(offset)
+    for entry in entries:
+        if accepts and not accepts(entry["topic"]):
+            continue
+        commit_log.topic_log(entry["topic"]).append_at(entry["offset"], entry["message"], entry.get("epoch", 0))
+    return log_positions(commit_log)
+
+
+class CatchUp:
+    def __init__(self, commit_log, partition_map, broker_id, timeout=2.0, max_batch=500):
+        """
+        Brings this broker's logs up to date before it serves topics as their
+        owner: at startup, when it may have missed writes while it was down,
+        and after every partition map change, when it may have gained topics
+        another broker wrote to in the meantime.
+
+        For every map version it asks the other live brokers for their log
+        positions, sending the map along: a broker adopting a newer map fences
+        its logs (CommitLog.fence()) before it answers, so a previous owner
+        accepts no more writes for the topic once its tail has been read. A
+        newer map in a reply is adopted too, so a restarted broker learns the
+        current owners before it serves anything. For each owned topic, the
+        most up-to-date replica (highest last epoch, then longest log) wins:
+        the local log is truncated where it diverges from it and the rest is
+        fetched. Until then, publishes to owned topics wait in ready().
+
+        Args:
+            commit_log (CommitLog): The broker's commit log.
+            partition_map (PartitionMap): The broker's partition map.
+            broker_id (int): This broker's ID.
+            timeout (float): HTTP timeout per request to a peer.
+            max_batch (int): Entries fetched per request.
+        """
+        self.commit_log = commit_log
+        self.partition_map = partition_map
+        self.broker_id = broker_id
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.settled = None                 # Map version the logs were last caught up with
+        self.cond = threading.Condition()
+
+        peers = [bid for bid in partition_map.broker_urls if bid != broker_id]
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=len(peers) or 1, pool_maxsize=2))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(peers)), thread_name_prefix="catch-up")
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def notify(self):
+        """
+        Wakes up the catch-up thread after the partition map changed.
+        """
+        with self.cond:
+            self.cond.notify_all()
+
+    def ready(self, topic, timeout):
+        """
+        Waits until this broker has caught up with the current partition map,
+        if it owns `topic`.
+
+        Returns:
+            bool: False if it was still catching up after `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.settled != self.partition_map.version and self.partition_map.owner(topic) == self.broker_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            return True
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.settled == self.partition_map.version:
+                    self.cond.wait()
+            try:
+                version = self._catch_up()
+            except Exception as e:
+                log.error("❌ Catching up with the partition map failed: %s", e)
+                time.sleep(self.timeout)
+                continue
+            with self.cond:
+                self.settled = version
+                self.cond.notify_all()
+
+    def _positions(self, broker_id, message):
+        try:
+            url = self.partition_map.broker_urls[broker_id]
+            res = self.session.post(f"{url}/replicate/positions", json=message, timeout=self.timeout)
+            res.raise_for_status()
+            return res.json()
+        except Exception as e:
+            log.warning("⚠️ No log positions from broker %s: %s", broker_id, e)
+            return None
+
+    def _catch_up(self):
+        """
+        Returns:
+            tuple: The map version caught up with.
+        """
+        version, live, ring = self.partition_map.snapshot()
+        message = self.partition_map.message()
+        peers = [bid for bid in live if bid != self.broker_id]
+        replies = {bid: reply for bid, reply in zip(peers, self.executor.map(
+            lambda bid: self._positions(bid, message), peers
+        )) if reply is not None}
+        for reply in replies.values():
+            self.partition_map.adopt(reply.get("map"))
+        if self.partition_map.version != version:
+            return self.settled              # A newer map arrived: catch up with that one instead
+
+        topics = set(self.commit_log.topics())
+        for reply in replies.values():
+            topics.update(reply.get("positions", {}))
+        for topic in sorted(topics):
+            if ring.owner(partition_key(topic)) == self.broker_id:
+                self._catch_up_topic(topic, replies)
+        return version
+
+    def _catch_up_topic(self, topic, replies):
+        local = self.commit_log.topic_log(topic)
+        best, best_rank = None, (last_epoch(local.epoch_history()), local.next_offset)
+        for bid, reply in replies.items():
+            epochs = reply.get("epochs", {}).get(topic, [])
+            rank = (last_epoch(epochs), reply.get("positions", {}).get(topic, 0))
+            if rank > best_rank:
+                best, best_rank = bid, rank
+        if best is None:
+            return                          # No replica is ahead of this one
+
+        epochs, end = replies[best]["epochs"][topic], replies[best]["positions"][topic]
+        position = local.divergence(epochs, end)
+        if position < local.next_offset:
+            log.warning("✂️ Truncating '%s' from offset %s to %s to match broker %s",
+                        topic, local.next_offset, position, best)
+            local.truncate(position)
+        log.info("📥 Catching up on '%s' from broker %s: offsets %s to %s", topic, best, position, end)
+        url = f"{self.partition_map.broker_urls[best]}/replicate/fetch/{quote(topic, safe='')}"
+        while position < end:
+            res = self.session.get(url, params={"from": position, "limit": self.max_batch}, timeout=self.timeout)
+            res.raise_for_status()
+            entries = res.json().get("entries", [])
+            for entry in entries:
+                local.append_at(entry["offset"], entry["message"], entry.get("epoch", 0))
+            # Compacted offsets leave gaps, so an empty page does not mean the end
+            position = max(position + self.max_batch, entries[-1]["offset"] + 1 if entries else 0)
+
+
+def last_epoch(epochs):
+    return epochs[-1][0] if epochs else 0
+
+
+def fetch_entries(commit_log, topic, from_offset, limit):
+    """
+    Reads entries of a topic with their epochs, for a broker catching up on it.
+
+    Returns:
+        list: {"offset", "epoch", "message"} dicts.
+    """
+    if topic not in commit_log.topics():
+        return []
+    topic_log = commit_log.topic_log(topic)
+    return [
+        {"offset": offset, "epoch": topic_log.epoch_at(offset), "message": message}
+        for offset, message in topic_log.read(from_offset, limit)
+    ]
@@ -0,0 +1,84 @@
+import json
+import zlib
+
+# Per-stream options of /stream/<topic>
+DEFLATE = "deflate"     # ?compress=deflate: one zlib context for the whole connection
+DELTA_EVENT = "delta"   # SSE event name of frames carrying a merge patch instead of a full message
+
+_ABSENT = object()
+
+
+def merge_patch(previous, current):
+    """
+    Computes a JSON merge patch (RFC 7386) turning `previous` into `current`:
+    changed and added keys with their new value, removed keys as None.
+    Nested objects are diffed recursively.
+
+    Returns:
+        dict: The patch; empty if nothing changed.
+    """
+    patch = {}
+    for key, value in current.items():
+        old = previous.get(key, _ABSENT)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = merge_patch(old, value)
+            if nested:
+                patch[key] = nested
+        elif old is _ABSENT or old != value or type(old) is not type(value):
+            patch[key] = value
+    for key in previous:
+        if key not in current:
+            patch[key] = None
+    return patch
+
+
+def apply_merge_patch(target, patch):
+    """
+    Applies a merge patch to a copy of `target` and returns it.
+    """
+    result = dict(target)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = apply_merge_patch(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+class DeltaEncoder:
+    def __init__(self):
+        """
+        Per-connection SSE encoder sending only what changed since the previous
+        message of the same topic on this stream. The first message of each
+        topic is sent in full as a normal event; later ones are `event: delta`
+        frames whose data is a merge patch against the previous message. A patch
+        cannot express a field whose new value is null; such a field is removed.
+        """
+        self.previous = {}      # topic -> last message sent on this stream
+
+    def encode(self, offset, message):
+        topic = message.get("topic") if isinstance(message, dict) else None
+        previous = self.previous.get(topic)
+        self.previous[topic] = message
+        if previous is None or not isinstance(message, dict):
+            payload = json.dumps(message, separators=(",", ":"), sort_keys=True)
+            return f"id: {offset}\ndata: {payload}\n\n".encode("utf-8")
+        payload = json.dumps(merge_patch(previous, message), separators=(",", ":"), sort_keys=True)
+        return f"id: {offset}\nevent: {DELTA_EVENT}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class DeflateStream:
+    def __init__(self, level=6):
+        """
+        Long-lived deflate context for one connection, served as
+        Content-Encoding: deflate. Every write is sync-flushed so the client
+        can decode it right away. Later frames are compressed against the
+        history of earlier ones, so repetitive messages shrink far more than
+        they would compressed one at a time.
+        """
+        self.compressor = zlib.compressobj(level)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
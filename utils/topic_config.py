@@ -0,0 +1,27 @@
+from utils.logger import get_logger
+
+log = get_logger("config")
+
+
+def parse_topic_settings(spec, allowed, setting="setting"):
+    """
+    Parses per-topic overrides such as "traffic=disconnect,weather=coalesce".
+
+    Args:
+        spec (str): Comma-separated topic=value pairs (may be None or empty).
+        allowed (tuple): Accepted values; anything else is ignored with a warning.
+            None accepts any non-empty value.
+        setting (str): Name of the setting, used in the warning.
+
+    Returns:
+        dict: Map of topic -> value.
+    """
+    settings = {}
+    for item in (spec or "").split(","):
+        topic, _, value = item.partition("=")
+        topic, value = topic.strip(), value.strip()
+        if topic and (value in allowed if allowed is not None else value):
+            settings[topic] = value
+        elif item.strip():
+            log.warning("⚠️ Ignoring invalid %s override: '%s'", setting, item.strip())
+    return settings
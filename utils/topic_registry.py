@@ -0,0 +1,154 @@
+import threading
+
+from utils.filters import FilterGroup
+from utils.topic_trie import TopicTrie
+
+
+class TopicState:
+    __slots__ = ("topic", "sse_groups", "webhooks", "dropped")
+
+    def __init__(self, topic):
+        """
+        Everything the broker tracks for one topic or subscription pattern.
+
+        `sse_groups`, each group's clients and `webhooks` are copy-on-write
+        tuples: writers replace them under the topic's lock, so readers
+        iterate a stable snapshot without taking it.
+        """
+        self.topic = topic
+        self.sse_groups = ()        # FilterGroups of open SSE streams, one per filter and encoding
+        self.webhooks = ()          # Webhook URLs subscribed to this topic or pattern
+        self.dropped = 0            # Frames dropped for already disconnected clients
+
+    @property
+    def sse_clients(self):
+        """
+        Client buffers of every open SSE stream of the topic or pattern.
+        """
+        return tuple(q for group in self.sse_groups for q in group.clients)
+
+
+class TopicRegistry:
+    def __init__(self, stripes=64):
+        """
+        Per-topic broker state guarded by striped locks: a topic maps to one of
+        `stripes` locks by hash, so threads working on different topics rarely
+        contend and none ever takes a registry-wide lock.
+
+        SSE streams are routed through it too: patterns with open streams are
+        indexed in a topic trie, updated under the pattern's lock when its
+        first group appears or its last one goes, and sse_groups() reads the
+        trie and the per-pattern group snapshots without locking.
+
+        Args:
+            stripes (int): Number of locks shared among all topics.
+        """
+        self.topics = {}
+        self.locks = [threading.Lock() for _ in range(max(1, stripes))]
+        self.sse_routes = TopicTrie()   # Patterns with open SSE streams
+
+    def lock(self, topic):
+        return self.locks[hash(topic) % len(self.locks)]
+
+    def get(self, topic):
+        """
+        Returns the state of a topic, creating it on first use.
+        """
+        state = self.topics.get(topic)
+        if state is None:
+            with self.lock(topic):
+                state = self.topics.get(topic)
+                if state is None:
+                    state = self.topics[topic] = TopicState(topic)
+        return state
+
+    def find(self, topic):
+        """
+        Returns the state of a topic, or None if it was never used.
+        """
+        return self.topics.get(topic)
+
+    def states(self):
+        """
+        Returns a snapshot of every topic's state.
+        """
+        return list(self.topics.values())
+
+    # --- SSE clients ---
+    def add_sse_client(self, topic, q, message_filter=None, encoding=None):
+        """
+        Adds a client buffer to the group of the topic's or pattern's clients
+        sharing its filter and encoding, creating the group on first use.
+        """
+        key = message_filter.key if message_filter else None
+        state = self.get(topic)
+        with self.lock(topic):
+            for group in state.sse_groups:
+                if group.encoding == encoding and (group.filter.key if group.filter else None) == key:
+                    break
+            else:
+                group = FilterGroup(message_filter, encoding)
+                if not state.sse_groups:
+                    self.sse_routes.add(topic, topic)
+                state.sse_groups += (group,)
+            group.clients += (q,)
+
+    def remove_sse_client(self, topic, q):
+        """
+        Removes a client buffer, dropping its group once it is empty and
+        keeping the count of frames it dropped.
+        """
+        state = self.get(topic)
+        with self.lock(topic):
+            for group in state.sse_groups:
+                if q in group.clients:
+                    group.clients = tuple(c for c in group.clients if c is not q)
+                    if not group.clients:
+                        state.sse_groups = tuple(g for g in state.sse_groups if g is not group)
+                        if not state.sse_groups:
+                            self.sse_routes.remove(topic, topic)
+                    break
+            state.dropped += q.dropped
+
+    def sse_groups(self, topic):
+        """
+        Returns the filter groups of every pattern matching a published topic.
+        """
+        return [
+            group
+            for pattern in self.sse_routes.match(topic)
+            for group in self.topics[pattern].sse_groups
+        ]
+
+    # --- Webhooks ---
+    def add_webhook(self, topic, url):
+        """
+        Returns:
+            bool: False if the URL was already subscribed to the topic.
+        """
+        state = self.get(topic)
+        with self.lock(topic):
+            if url in state.webhooks:
+                return False
+            state.webhooks += (url,)
+            return True
+
+    def remove_webhook(self, topic, url):
+        """
+        Returns:
+            bool: False if the URL was not subscribed to the topic.
+        """
+        state = self.find(topic)
+        if state is None:
+            return False
+        with self.lock(topic):
+            if url not in state.webhooks:
+                return False
+            state.webhooks = tuple(u for u in state.webhooks if u != url)
+            return True
+
+    def has_webhook(self, url):
+        """
+        True if the URL is still subscribed to any topic.
+        """
+        return any(url in state.webhooks for state in self.states())
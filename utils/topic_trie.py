@@ -0,0 +1,127 @@
+import threading
+
+SEPARATOR = "/"     # Separates the levels of a hierarchical topic: traffic/downtown/main_st
+SINGLE = "+"        # Wildcard matching exactly one level: traffic/+/main_st
+MULTI = "#"         # Wildcard matching any remaining levels (including none): traffic/#
+
+
+def validate_pattern(pattern):
+    """
+    Checks a subscription pattern. Wildcards must fill a whole level and `#`
+    may only be the last level.
+
+    Raises:
+        ValueError: If the pattern is malformed.
+    """
+    if not isinstance(pattern, str):
+        raise ValueError(f"Topic must be a string, not {type(pattern).__name__}")
+    if not pattern:
+        raise ValueError("Topic must not be empty")
+    levels = pattern.split(SEPARATOR)
+    for i, level in enumerate(levels):
+        if level == MULTI and i != len(levels) - 1:
+            raise ValueError(f"'{MULTI}' must be the last level of '{pattern}'")
+        if level not in (SINGLE, MULTI) and (SINGLE in level or MULTI in level):
+            raise ValueError(f"Wildcards must occupy a whole level in '{pattern}'")
+
+
+def validate_topic(topic):
+    """
+    Checks a topic messages are published to; it must not contain wildcards.
+
+    Raises:
+        ValueError: If the topic is malformed.
+    """
+    if not isinstance(topic, str):
+        raise ValueError(f"Topic must be a string, not {type(topic).__name__}")
+    if not topic:
+        raise ValueError("Topic must not be empty")
+    if SINGLE in topic or MULTI in topic:
+        raise ValueError(f"Published topics must not contain wildcards: '{topic}'")
+
+
+def is_wildcard(pattern):
+    return any(level in (SINGLE, MULTI) for level in pattern.split(SEPARATOR))
+
+
+class _Node:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children = {}
+        self.values = frozenset()   # Replaced, never mutated, so match() can read it without the lock
+
+
+class TopicTrie:
+    def __init__(self):
+        """
+        Index of subscription patterns by topic level. Matching a topic walks
+        one path per level plus the `+` and `#` branches present in the trie,
+        so its cost depends on the topic's depth, not on the number of subscribers.
+
+        Only writers take the lock: they replace value sets instead of
+        mutating them, so match() walks a consistent snapshot of every node
+        without blocking the dispatcher on subscribes and unsubscribes.
+        """
+        self.root = _Node()
+        self.lock = threading.Lock()
+
+    def add(self, pattern, value):
+        """
+        Registers `value` (a client buffer, webhook URL, ...) under a pattern.
+        """
+        with self.lock:
+            node = self.root
+            for level in pattern.split(SEPARATOR):
+                node = node.children.setdefault(level, _Node())
+            node.values = node.values | {value}
+
+    def remove(self, pattern, value):
+        """
+        Unregisters `value` from a pattern, pruning branches left empty.
+
+        Returns:
+            bool: True if the value was registered.
+        """
+        with self.lock:
+            path = [self.root]
+            for level in pattern.split(SEPARATOR):
+                node = path[-1].children.get(level)
+                if node is None:
+                    return False
+                path.append(node)
+            if value not in path[-1].values:
+                return False
+            path[-1].values = path[-1].values - {value}
+            for parent, level, node in zip(reversed(path[:-1]), reversed(pattern.split(SEPARATOR)), reversed(path)):
+                if node.values or node.children:
+                    break
+                del parent.children[level]
+            return True
+
+    def match(self, topic):
+        """
+        Returns the set of values whose pattern matches `topic`.
+        """
+        levels = topic.split(SEPARATOR)
+        matched = set()
+        nodes = [self.root]
+        for level in levels:
+            next_nodes = []
+            for node in nodes:
+                multi = node.children.get(MULTI)
+                if multi is not None:
+                    matched.update(multi.values)
+                for key in (level, SINGLE):
+                    child = node.children.get(key)
+                    if child is not None:
+                        next_nodes.append(child)
+            nodes = next_nodes
+            if not nodes:
+                return matched
+        for node in nodes:
+            matched.update(node.values)
+            multi = node.children.get(MULTI)
+            if multi is not None:
+                matched.update(multi.values)  # "traffic/#" also matches "traffic"
+        return matched
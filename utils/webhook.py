@@ -0,0 +1,300 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.logger import get_logger
+
+log = get_logger("webhook")
+
+# Circuit breaker states
+CLOSED = "closed"          # Deliveries flow normally
+OPEN = "open"              # Endpoint is failing; deliveries are paused until the cooldown ends
+HALF_OPEN = "half_open"    # Cooldown ended; a single trial delivery decides the next state
+
+
+def validate_url(url):
+    """
+    Checks a webhook URL: an absolute http(s) URL without whitespace.
+
+    Raises:
+        ValueError: If the URL is malformed.
+    """
+    if not isinstance(url, str):
+        raise ValueError(f"Webhook URL must be a string, not {type(url).__name__}")
+    if any(c.isspace() for c in url):
+        raise ValueError(f"Webhook URL must not contain whitespace: '{url}'")
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        raise ValueError(f"Webhook URL must be an absolute http(s) URL: '{url}'")
+
+
+class WebhookEndpoint:
+    def __init__(self, url, batch_size, max_concurrency):
+        """
+        Delivery state and counters of one webhook subscriber URL.
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.pending = deque()              # [message, attempt] entries waiting to be sent
+        self.inflight = 0
+        self.lock = threading.Lock()
+
+        self.circuit = CLOSED
+        self.open_until = 0.0
+        self.consecutive_failures = 0
+        self.wakeup_scheduled = False       # A timer will resume delivery when the circuit cooldown ends
+
+        self.delivered = 0                  # Messages acknowledged with a 2xx response
+        self.failed_attempts = 0            # POSTs that errored or returned a non-2xx status
+        self.retried = 0                    # Messages scheduled for another attempt
+        self.dropped = 0                    # Messages given up on (queue full or retries exhausted)
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.requests = 0
+        self.last_error = None
+
+    def can_send(self, now):
+        """
+        Returns True if another POST may start, honoring the concurrency limit
+        and the circuit breaker. Must be called with the lock held.
+        """
+        if self.circuit == OPEN:
+            if now < self.open_until:
+                return False
+            self.circuit = HALF_OPEN
+        if self.circuit == HALF_OPEN:
+            return self.inflight == 0
+        return self.inflight < self.max_concurrency
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queued": len(self.pending),
+                "in_flight": self.inflight,
+                "circuit": self.circuit,
+                "delivered": self.delivered,
+                "failed_attempts": self.failed_attempts,
+                "retried": self.retried,
+                "dropped": self.dropped,
+                "avg_latency_ms": round(self.latency_total / self.requests * 1000, 2) if self.requests else None,
+                "max_latency_ms": round(self.latency_max * 1000, 2),
+                "last_error": self.last_error,
+            }
+
+
+class WebhookDelivery:
+    def __init__(self, workers=8, batch_size=1, max_concurrency=2, max_retries=5,
+                 backoff_base=0.5, backoff_max=30.0, breaker_threshold=5,
+                 breaker_cooldown=30.0, timeout=3.0, queue_size=1000):
+        """
+        Asynchronous webhook delivery engine.
+
+        Messages are queued per subscriber URL and POSTed by a shared worker pool
+        over keep-alive connections pooled per destination host. Failed POSTs are
+        retried with exponential backoff, and an endpoint that keeps failing has
+        its circuit opened for `breaker_cooldown` seconds. enqueue() never blocks.
+
+        Args:
+            workers (int): Size of the worker pool shared by all endpoints.
+            batch_size (int): Default number of messages per POST (1 disables batching).
+            max_concurrency (int): Concurrent POSTs allowed per endpoint.
+            max_retries (int): Attempts per message before it is dropped.
+            backoff_base (float): First retry delay in seconds, doubled on every attempt.
+            backoff_max (float): Upper bound of the retry delay.
+            breaker_threshold (int): Consecutive failures that open the circuit.
+            breaker_cooldown (float): Seconds the circuit stays open.
+            timeout (float): HTTP timeout per POST.
+            queue_size (int): Messages buffered per endpoint before new ones are dropped.
+        """
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.timeout = timeout
+        self.queue_size = queue_size
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook")
+        self.endpoints = {}
+        self.sessions = {}                  # Destination (scheme://host:port) -> pooled Session
+        self.lock = threading.Lock()
+
+        # Timers for retries and circuit cooldowns: (due, seq, endpoint)
+        self.timers = []
+        self.timer_seq = itertools.count()
+        self.timer_cond = threading.Condition()
+        threading.Thread(target=self._timer_loop, daemon=True).start()
+
+    # --- Subscriber management ---
+    def register(self, url, batch_size=None):
+        """
+        Registers (or updates) a webhook endpoint.
+        """
+        with self.lock:
+            endpoint = self.endpoints.get(url)
+            if endpoint is None:
+                endpoint = self.endpoints[url] = WebhookEndpoint(
+                    url, batch_size or self.batch_size, self.max_concurrency
+                )
+            elif batch_size:
+                endpoint.batch_size = batch_size
+            return endpoint
+
+    def remove(self, url):
+        """
+        Forgets an endpoint and discards its queued messages.
+        """
+        with self.lock:
+            endpoint = self.endpoints.pop(url, None)
+        if endpoint:
+            with endpoint.lock:
+                endpoint.pending.clear()
+
+    def enqueue(self, url, message):
+        """
+        Queues a message for an endpoint and returns immediately.
+
+        Returns:
+            bool: False if the endpoint's queue was full and the message was dropped.
+        """
+        endpoint = self.endpoints.get(url) or self.register(url)
+        with endpoint.lock:
+            if len(endpoint.pending) >= self.queue_size:
+                endpoint.dropped += 1
+                return False
+            endpoint.pending.append([message, 1])
+            self._schedule(endpoint)
+        return True
+
+    def stats(self):
+        """
+        Returns delivery counters and latency per subscriber URL.
+        """
+        with self.lock:
+            endpoints = list(self.endpoints.values())
+        return {endpoint.url: endpoint.stats() for endpoint in endpoints}
+
+    # --- Delivery ---
+    def _session(self, url):
+        parts = urlsplit(url)
+        destination = f"{parts.scheme}://{parts.netloc}"
+        session = self.sessions.get(destination)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(destination)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self.sessions[destination] = session
+        return session
+
+    def _schedule(self, endpoint):
+        """
+        Starts as many POSTs as the endpoint's limits allow. Must be called with
+        the endpoint lock held.
+        """
+        now = time.time()
+        while endpoint.pending and endpoint.can_send(now):
+            count = min(endpoint.batch_size, len(endpoint.pending))
+            batch = [endpoint.pending.popleft() for _ in range(count)]
+            endpoint.inflight += 1
+            self.executor.submit(self._deliver, endpoint, batch)
+        if endpoint.pending and endpoint.circuit == OPEN and not endpoint.wakeup_scheduled:
+            endpoint.wakeup_scheduled = True
+            self._add_timer(endpoint.open_until, endpoint)
+
+    def _deliver(self, endpoint, batch):
+        """
+        POSTs one batch. A batch size of 1 sends the message itself; larger
+        batch sizes always send a JSON array.
+        """
+        messages = [message for message, _ in batch]
+        payload = messages if endpoint.batch_size > 1 else messages[0]
+        start = time.time()
+        error = None
+        try:
+            res = self._session(endpoint.url).post(endpoint.url, json=payload, timeout=self.timeout)
+            if not 200 <= res.status_code < 300:
+                error = f"HTTP {res.status_code}"
+        except Exception as e:
+            error = str(e)
+        latency = time.time() - start
+
+        with endpoint.lock:
+            endpoint.inflight -= 1
+            endpoint.requests += 1
+            endpoint.latency_total += latency
+            endpoint.latency_max = max(endpoint.latency_max, latency)
+            if error is None:
+                endpoint.delivered += len(batch)
+                endpoint.consecutive_failures = 0
+                endpoint.circuit = CLOSED
+            else:
+                self._handle_failure(endpoint, batch, error)
+            self._schedule(endpoint)
+
+    def _handle_failure(self, endpoint, batch, error):
+        """
+        Records a failed POST, opens the circuit if needed and schedules retries.
+        Must be called with the endpoint lock held.
+        """
+        endpoint.failed_attempts += 1
+        endpoint.consecutive_failures += 1
+        endpoint.last_error = error
+        log.warning("⚠️ Webhook delivery to %s failed: %s", endpoint.url, error, rate=5)
+
+        if endpoint.circuit == HALF_OPEN or endpoint.consecutive_failures >= self.breaker_threshold:
+            if endpoint.circuit != OPEN:
+                log.warning("🔌 Circuit opened for webhook %s", endpoint.url)
+            endpoint.circuit = OPEN
+            endpoint.open_until = time.time() + self.breaker_cooldown
+
+        retry = [entry for entry in batch if entry[1] < self.max_retries]
+        endpoint.dropped += len(batch) - len(retry)
+        if not retry:
+            return
+        attempt = max(entry[1] for entry in retry)
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        delay *= random.uniform(0.5, 1.0)  # Jitter so retries from many brokers spread out
+        for entry in retry:
+            entry[1] += 1
+        endpoint.retried += len(retry)
+        self._add_timer(time.time() + delay, endpoint, retry)
+
+    # --- Timers ---
+    def _add_timer(self, due, endpoint, entries=None):
+        with self.timer_cond:
+            heapq.heappush(self.timers, (due, next(self.timer_seq), endpoint, entries))
+            self.timer_cond.notify()
+
+    def _timer_loop(self):
+        """
+        Requeues retried batches (at the front, keeping their order) once their
+        backoff expires, and restarts delivery when a circuit cooldown ends.
+        """
+        while True:
+            with self.timer_cond:
+                while not self.timers or self.timers[0][0] > time.time():
+                    self.timer_cond.wait(self.timers[0][0] - time.time() if self.timers else None)
+                _, _, endpoint, entries = heapq.heappop(self.timers)
+            if self.endpoints.get(endpoint.url) is not endpoint:
+                continue  # Unsubscribed while waiting
+            with endpoint.lock:
+                if entries:
+                    endpoint.pending.extendleft(reversed(entries))
+                else:
+                    endpoint.wakeup_scheduled = False
+                self._schedule(endpoint)
@@ -0,0 +1,56 @@
+try:
+    import msgpack
+except ImportError:  # Optional: without it only JSON is offered
+    msgpack = None
+
+# Media types of the encodings offered on /publish and /stream
+SSE = "text/event-stream"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+
+def is_msgpack(mimetype):
+    return mimetype in MSGPACK_TYPES
+
+
+def msgpack_available():
+    return msgpack is not None
+
+
+def unpack(body):
+    """
+    Decodes a MessagePack body.
+
+    Raises:
+        RuntimeError: If the msgpack package is not installed.
+        ValueError: If the body is not valid MessagePack.
+    """
+    if msgpack is None:
+        raise RuntimeError("MessagePack support is not installed on this broker")
+    try:
+        return msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise ValueError(str(e) or type(e).__name__) from None
+
+
+def pack(value):
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def stream_encoding(accept):
+    """
+    Picks the stream encoding for an Accept header: MessagePack when the client
+    asks for it and it is available, SSE (JSON text) otherwise.
+    """
+    if msgpack is not None and any(media_type in (accept or "") for media_type in MSGPACK_TYPES):
+        return MSGPACK
+    return SSE
+
+
+def encode_msgpack_frame(message, event_id=None):
+    """
+    Serializes a message once into a binary stream frame: the MessagePack array
+    [offset, message]. Frames are self-delimiting, so a client feeds the
+    response body to a msgpack.Unpacker and reads them back one by one.
+    """
+    return msgpack.packb([event_id, message], use_bin_type=True)